@@ -1,119 +1,303 @@
-import sqlite3
-
-BANCO = "amigo.db"
-
-def criar_tabela():
-    conn = sqlite3.connect(BANCO)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS tarefas (
-            id INTEGER PRIMARY KEY,
-            animal_id INTEGER NOT NULL,
-            nome TEXT,
-            tarefa TEXT NOT NULL,
-            data TEXT,
-            responsavel TEXT,
-            FOREIGN KEY (animal_id) REFERENCES animais(id)
-        )
-    """)
-    conn.commit()
-
-    cur.execute("PRAGMA table_info(tarefas)")
-    colunas = [coluna[1] for coluna in cur.fetchall()]
-
-    if 'animal_id' not in colunas:
-        try:
-            cur.execute("ALTER TABLE tarefas ADD COLUMN animal_id INTEGER")
-            conn.commit()
-        except sqlite3.OperationalError:
-            pass
-
-    conn.close()
-
-
-def adicionar_tarefas(animal_id, tarefa, data, responsavel, nome=None):
-    conn = sqlite3.connect(BANCO)
-    conn.execute(
-        "INSERT INTO tarefas(animal_id, nome, tarefa, data, responsavel) VALUES (?, ?, ?, ?, ?)",
-        (animal_id, nome, tarefa, data, responsavel)
-    )
-    conn.commit()
-    conn.close()
-
-
-def ler_tarefas():
-    conn = sqlite3.connect(BANCO)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tarefas")
-    tarefas = []
-    linhas = cur.fetchall()
-    
-    for row in linhas:
-        tarefa_dict = dict(row)
-        tarefas.append(tarefa_dict)
-        
-    conn.close()
-    return tarefas
-
-
-def ler_tarefas_por_animal(animal_id):
-    conn = sqlite3.connect(BANCO)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    query = "SELECT * FROM tarefas WHERE animal_id = ?"
-    cur.execute(query, (animal_id,))
-    linhas = cur.fetchall()
-    tarefas = []
-
-    for row in linhas:
-        tarefa_dict = dict(row)
-        tarefas.append(tarefa_dict)
-
-    conn.close()
-    return tarefas
-
-def remover_tarefa(tarefa_id):
-    conn = sqlite3.connect(BANCO)
-    conn.execute("DELETE FROM tarefas WHERE id = ?", (tarefa_id,))
-    conn.commit()
-    conn.close()
-
-def editar_tarefa(tarefa_id, animal_id, tarefa, data, responsavel, nome=None):
-    conn = sqlite3.connect(BANCO)
-    conn.execute(
-        "UPDATE tarefas SET animal_id=?, nome=?, tarefa=?, data=?, responsavel=? WHERE id=?",
-        (animal_id, nome, tarefa, data, responsavel, tarefa_id)
-    )
-    conn.commit()
-    conn.close()
-
-def ler_tarefa_id(tarefa_id):
-    conn = sqlite3.connect(BANCO)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tarefas WHERE id = ?", (tarefa_id,))
-    tarefa = cur.fetchone()
-    conn.close()
-    return dict(tarefa) if tarefa else None
-
-def remover_tarefas_por_animal(animal_id):
-    try:
-        conn = sqlite3.connect(BANCO)
-        cur = conn.cursor()
-        query = "DELETE FROM tarefas WHERE animal_id = ?"
-        cur.execute(query, (animal_id,))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        mensagem_erro = f"Erro ao remover tarefas do animal {animal_id}: {e}"
-        raise Exception(mensagem_erro)
-
-def contar_tarefas_animal(animal_id):
-    conn = sqlite3.connect(BANCO)
-    cur = conn.cursor()
-    query = "SELECT COUNT(*) FROM tarefas WHERE animal_id = ?"
-    cur.execute(query, (animal_id,))
-    count = cur.fetchone()[0]
-    conn.close()
-    return count
+import sqlite3
+from datetime import datetime
+from conexao import obter_conexao
+from eventos import notificar
+from paginacao import montar_select
+from registros import Tarefa
+from versoes import versionar
+
+# Formatos aceitos na entrada; no banco a data fica sempre como AAAA-MM-DD
+FORMATOS_DATA = ('%Y-%m-%d', '%d/%m/%Y')
+
+# Data ISO válida: com um modificador, date() leva 2025-02-30 para 2025-03-02,
+# então só as datas reais voltam iguais
+DATA_VALIDA = "(data GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' AND date(data, '+0 days') = data)"
+
+# Sem data ou com data inválida (mesmo texto do índice parcial idx_tarefas_data_invalida);
+# DATA_VALIDA dá NULL sem data ou quando date() não entende o texto (ex.: 9999-99-99)
+DATA_INVALIDA = f"(NOT COALESCE({DATA_VALIDA}, 0))"
+
+
+def normalizar_data(valor):
+    """Converte a data para AAAA-MM-DD; valores que não são data voltam como vieram"""
+    if not isinstance(valor, str):
+        return valor
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato).date().isoformat()
+        except ValueError:
+            pass
+    return valor
+
+
+def _migrar_datas(conn):
+    # Tarefas antigas podem ter DD/MM/AAAA (ou dia/mês sem zero à esquerda)
+    cur = conn.execute(f"SELECT id, data FROM tarefas WHERE data IS NOT NULL AND NOT {DATA_VALIDA}")
+    alteracoes = []
+    for tarefa_id, data in cur.fetchall():
+        nova = normalizar_data(data)
+        if nova != data:
+            alteracoes.append((nova, tarefa_id))
+
+    if alteracoes:
+        with conn:
+            conn.executemany("UPDATE tarefas SET data = ? WHERE id = ?", alteracoes)
+
+
+def criar_tabela():
+    conn = obter_conexao()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS tarefas (
+            id INTEGER PRIMARY KEY,
+            animal_id INTEGER NOT NULL,
+            nome TEXT,
+            tarefa TEXT NOT NULL,
+            data TEXT,
+            responsavel TEXT,
+            FOREIGN KEY (animal_id) REFERENCES animais(id)
+        )
+    """)
+    conn.commit()
+
+    cur.execute("PRAGMA table_info(tarefas)")
+    colunas = [coluna[1] for coluna in cur.fetchall()]
+
+    if 'animal_id' not in colunas:
+        try:
+            cur.execute("ALTER TABLE tarefas ADD COLUMN animal_id INTEGER")
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass
+
+    _migrar_datas(conn)
+
+    # Versões anteriores indexavam uma expressão que aceitava os dois formatos
+    cur.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'idx_tarefas_data'")
+    indice = cur.fetchone()
+    if indice and 'CASE' in (indice[0] or ''):
+        cur.execute("DROP INDEX idx_tarefas_data")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_data ON tarefas (data)")
+    # Resumo por animal: as tarefas de cada animal já saem em ordem de data
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_animal_data ON tarefas (animal_id, data)")
+    # As poucas tarefas sem data válida, lidas à parte por ler_proximas_tarefas
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_tarefas_data_invalida ON tarefas (id) WHERE {DATA_INVALIDA}")
+    conn.commit()
+    versionar('tarefas')
+
+
+def adicionar_tarefas(animal_id, tarefa, data, responsavel, nome=None):
+    conn = obter_conexao()
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO tarefas(animal_id, nome, tarefa, data, responsavel) VALUES (?, ?, ?, ?, ?)",
+            (animal_id, nome, tarefa, normalizar_data(data), responsavel)
+        )
+    notificar('tarefas', 'inserido', cur.lastrowid)
+
+
+def ler_tarefas():
+    cur = obter_conexao().cursor()
+    cur.execute("SELECT * FROM tarefas")
+    tarefas = []
+    linhas = cur.fetchall()
+    
+    for row in linhas:
+        tarefa_dict = dict(row)
+        tarefas.append(tarefa_dict)
+        
+    return tarefas
+
+
+def ler_tarefas_registros(animal_id=None):
+    cur = obter_conexao().cursor()
+    if animal_id is not None:
+        cur.execute("SELECT * FROM tarefas WHERE animal_id = ?", (animal_id,))
+    else:
+        cur.execute("SELECT * FROM tarefas")
+    return list(Tarefa.do_cursor(cur))
+
+
+def ler_tarefas_pagina(limit=None, apos_id=None, colunas=None):
+    cur = obter_conexao().cursor()
+    sql = montar_select('tarefas', colunas)
+    params = []
+    if apos_id is not None:
+        sql += " WHERE id > ?"
+        params.append(apos_id)
+    sql += " ORDER BY id LIMIT ?"
+    params.append(-1 if limit is None else limit)
+
+    cur.execute(sql, params)
+    return [dict(row) for row in cur.fetchall()]
+
+
+def _selecionar_proximas(hoje, condicoes, params, ordem, limit):
+    # Tarefas com dias até o vencimento e faixa de urgência
+    sql = f"""
+        SELECT *,
+               CASE
+                   WHEN dias_faltando IS NULL THEN 'erro'
+                   WHEN dias_faltando < 0 THEN 'atrasado'
+                   WHEN dias_faltando = 0 THEN 'hoje'
+                   WHEN dias_faltando <= 7 THEN 'urgente'
+                   WHEN dias_faltando <= 30 THEN 'proximo'
+                   ELSE 'ok'
+               END AS urgencia
+        FROM (
+            SELECT *,
+                   CASE WHEN {DATA_VALIDA}
+                        THEN CAST(julianday(data) - julianday(?) AS INTEGER)
+                   END AS dias_faltando
+            FROM tarefas
+            {"WHERE " + " AND ".join(condicoes) if condicoes else ""}
+            ORDER BY {ordem}
+            LIMIT ?
+        )
+    """
+    cur = obter_conexao().cursor()
+    cur.execute(sql, [hoje, *params, -1 if limit is None else limit])
+    return [dict(row) for row in cur.fetchall()]
+
+
+def _distancia(tarefa):
+    # Ordem da lista: distância até hoje (atrasadas pelo atraso), datas inválidas como 999
+    dias = tarefa['dias_faltando']
+    return (999 if dias is None else abs(dias), tarefa['id'])
+
+
+def ler_proximas_tarefas(hoje, animal_id=None, limit=None, de=None, ate=None):
+    """Tarefas com dias até o vencimento e faixa de urgência calculados no SQL.
+
+    Ordena pela distância até `hoje` (atrasadas contam pelo atraso) e deixa
+    as datas inválidas no fim, com dias = NULL. `de`/`ate` (AAAA-MM-DD)
+    limitam a janela de datas. Com `limit`, as N mais próximas saem de duas
+    leituras em idx_tarefas_data a partir de hoje (para frente e para trás)
+    e das datas inválidas (índice parcial), intercaladas em Python.
+    """
+    condicoes = []
+    params = []
+    if animal_id is not None:
+        condicoes.append("animal_id = ?")
+        params.append(animal_id)
+    if de is not None:
+        condicoes.append("data >= ?")
+        params.append(de)
+    if ate is not None:
+        condicoes.append("data <= ?")
+        params.append(ate)
+
+    if limit is None:
+        tarefas = _selecionar_proximas(hoje, condicoes, params, "id", None)
+        return sorted(tarefas, key=_distancia)
+
+    partes = (
+        (f"data >= ? AND {DATA_VALIDA}", [hoje], "data, id"),
+        (f"data < ? AND {DATA_VALIDA}", [hoje], "data DESC, id"),
+        (DATA_INVALIDA, [], "id"),
+    )
+    tarefas = []
+    for condicao, extras, ordem in partes:
+        tarefas += _selecionar_proximas(hoje, condicoes + [condicao], params + extras, ordem, limit)
+    return sorted(tarefas, key=_distancia)[:limit]
+
+
+def ler_tarefas_por_animal(animal_id):
+    cur = obter_conexao().cursor()
+    query = "SELECT * FROM tarefas WHERE animal_id = ?"
+    cur.execute(query, (animal_id,))
+    linhas = cur.fetchall()
+    tarefas = []
+
+    for row in linhas:
+        tarefa_dict = dict(row)
+        tarefas.append(tarefa_dict)
+
+    return tarefas
+
+def remover_tarefa(tarefa_id):
+    conn = obter_conexao()
+    with conn:
+        conn.execute("DELETE FROM tarefas WHERE id = ?", (tarefa_id,))
+    notificar('tarefas', 'removido', tarefa_id)
+
+def editar_tarefa(tarefa_id, animal_id, tarefa, data, responsavel, nome=None):
+    conn = obter_conexao()
+    with conn:
+        conn.execute(
+            "UPDATE tarefas SET animal_id=?, nome=?, tarefa=?, data=?, responsavel=? WHERE id=?",
+            (animal_id, nome, tarefa, normalizar_data(data), responsavel, tarefa_id)
+        )
+    notificar('tarefas', 'atualizado', tarefa_id)
+
+def ler_tarefa_id(tarefa_id):
+    cur = obter_conexao().cursor()
+    cur.execute("SELECT * FROM tarefas WHERE id = ?", (tarefa_id,))
+    tarefa = cur.fetchone()
+    return dict(tarefa) if tarefa else None
+
+def remover_tarefas_por_animal(animal_id):
+    try:
+        conn = obter_conexao()
+        with conn:
+            ids = [row[0] for row in conn.execute("SELECT id FROM tarefas WHERE animal_id = ?", (animal_id,))]
+            query = "DELETE FROM tarefas WHERE animal_id = ?"
+            conn.execute(query, (animal_id,))
+    except Exception as e:
+        mensagem_erro = f"Erro ao remover tarefas do animal {animal_id}: {e}"
+        raise Exception(mensagem_erro)
+    if ids:
+        notificar('tarefas', 'removido', ids)
+
+def contar_tarefas_animal(animal_id):
+    cur = obter_conexao().cursor()
+    query = "SELECT COUNT(*) FROM tarefas WHERE animal_id = ?"
+    cur.execute(query, (animal_id,))
+    count = cur.fetchone()[0]
+    return count
+
+
+def resumir_tarefas_animais(hoje, animal_ids=None):
+    """{animal_id: {count, proxima_data, atrasadas}} numa consulta só.
+
+    `proxima_data` é a primeira data >= `hoje` e `atrasadas` conta as datas
+    anteriores (datas inválidas só entram no count). Sem `animal_ids`,
+    resume todos os animais; animais sem tarefas vêm com zero.
+    """
+    filtro_animais = filtro_tarefas = ''
+    params = [hoje, hoje]
+    if animal_ids is not None:
+        if not animal_ids:
+            return {}
+        marcadores = ', '.join('?' for _ in animal_ids)
+        filtro_tarefas = f"WHERE animal_id IN ({marcadores})"
+        filtro_animais = f"WHERE a.id IN ({marcadores})"
+        params += [*animal_ids, *animal_ids]
+
+    # A agregação percorre idx_tarefas_animal_data sem tocar na tabela
+    cur = obter_conexao().execute(f"""
+        SELECT a.id AS animal_id,
+               COALESCE(r.count, 0) AS count,
+               r.proxima_data,
+               COALESCE(r.atrasadas, 0) AS atrasadas
+        FROM animais a
+        LEFT JOIN (
+            SELECT animal_id,
+                   COUNT(*) AS count,
+                   MIN(CASE WHEN data >= ? AND {DATA_VALIDA} THEN data END) AS proxima_data,
+                   COUNT(CASE WHEN data < ? AND {DATA_VALIDA} THEN 1 END) AS atrasadas
+            FROM tarefas
+            {filtro_tarefas}
+            GROUP BY animal_id
+        ) r ON r.animal_id = a.id
+        {filtro_animais}
+        ORDER BY a.id
+    """, params)
+    return {
+        linha['animal_id']: {
+            'count': linha['count'],
+            'proxima_data': linha['proxima_data'],
+            'atrasadas': linha['atrasadas']
+        }
+        for linha in cur
+    }
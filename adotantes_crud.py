@@ -1,11 +1,25 @@
 import sqlite3
 import json
 from datetime import datetime
-
-BANCO = "amigo.db"
+from conexao import obter_conexao
+from eventos import notificar
+from paginacao import montar_select
+from registros import Adotante
+from cache import CacheLRU, registrar_invalidacao
+from versoes import versionar
+
+# Registros por id e leitura da tabela inteira (usada pelo matching)
+_cache_adotantes = CacheLRU('adotantes', tamanho_maximo=2048)
+_cache_listas_adotantes = CacheLRU('adotantes_listas', tamanho_maximo=2)
+registrar_invalidacao('adotantes', _cache_adotantes, _cache_listas_adotantes)
+
+# Campos calculados por preparar_adotante_para_api e as colunas de que dependem
+CAMPOS_DERIVADOS = {
+    'data_cadastro_formatada': ['data_cadastro']
+}
 
 def criar_tabela():
-    conn = sqlite3.connect(BANCO)
+    conn = obter_conexao()
     cur = conn.cursor()
     cur.execute("""
         CREATE TABLE IF NOT EXISTS adotantes (
@@ -77,9 +91,14 @@ def criar_tabela():
         except sqlite3.OperationalError:
             pass
 
+    # Ordem da listagem (mais recentes primeiro) e chave da paginação por cursor
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_adotantes_cadastro
+        ON adotantes (COALESCE(data_cadastro, '') DESC, id)
+    """)
 
     conn.commit()
-    conn.close()
+    versionar('adotantes')
 
 
 def adicionar_adotante(nome, email, telefone=None, idade=None, profissao=None, filhos=0,
@@ -108,9 +127,9 @@ def adicionar_adotante(nome, email, telefone=None, idade=None, profissao=None, f
     tipo_outros_json = json.dumps(tipo_outros_animais) if tipo_outros_animais and isinstance(tipo_outros_animais, list) else tipo_outros_animais
     tags_json = json.dumps(tags_ideais) if tags_ideais and isinstance(tags_ideais, list) else tags_ideais
 
-    conn = sqlite3.connect(BANCO)
-    try:
-        conn.execute("""
+    conn = obter_conexao()
+    with conn:
+        cur = conn.execute("""
             INSERT INTO adotantes (
                 nome, email, telefone, idade, profissao, filhos, filhos_faixa_etaria,
                 tipo_moradia, tamanho_moradia, tem_quintal, tamanho_quintal, localizacao, aluga_ou_possui,
@@ -131,37 +150,61 @@ def adicionar_adotante(nome, email, telefone=None, idade=None, profissao=None, f
             orcamento_mensal_min, orcamento_mensal_max, disponibilidade_tempo_diario, comprometimento_texto,
             tracos_preferidos, tags_json, tem_preferencia_tracos
         ))
-        conn.commit()
-    finally:
-        conn.close()
+    adotante_id = cur.lastrowid
+
+    notificar('adotantes', 'inserido', adotante_id)
+    return adotante_id
 
 
 def ler_adotantes():
-    conn = sqlite3.connect(BANCO)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM adotantes ORDER BY data_cadastro DESC")
-    linhas = cur.fetchall()
-    adotantes = []
-    for row in linhas:
-        adotante_dict = dict(row)
-        adotante_dict = preparar_adotante_dict(adotante_dict)
-        adotantes.append(adotante_dict)
-    conn.close()
-    return adotantes
+    return ler_adotantes_pagina()
+
+
+def ler_adotantes_pagina(limit=None, apos=None, colunas=None):
+    # Mais recentes primeiro; `apos` = (data_cadastro, id) do último item da página anterior
+    sql = montar_select('adotantes', colunas)
+    params = []
+    if apos is not None:
+        data_cadastro, adotante_id = apos
+        # Escrito assim (e não com OR puro) para o SQLite buscar direto no índice
+        sql += """
+            WHERE COALESCE(data_cadastro, '') <= ?
+              AND (COALESCE(data_cadastro, '') < ? OR id > ?)"""
+        params += [data_cadastro or '', data_cadastro or '', adotante_id]
+    sql += " ORDER BY COALESCE(data_cadastro, '') DESC, id LIMIT ?"
+    params.append(-1 if limit is None else limit)
+
+    cur = obter_conexao().cursor()
+    cur.execute(sql, params)
+    return [preparar_adotante_dict(dict(row)) for row in cur.fetchall()]
+
+
+def ler_adotantes_registros():
+    # Registros compactos (JSON decodificado uma vez), na mesma ordem de ler_adotantes
+    # A lista vem do cache e é compartilhada: não deve ser alterada
+    def carregar():
+        cur = obter_conexao().cursor()
+        cur.execute("SELECT * FROM adotantes ORDER BY COALESCE(data_cadastro, '') DESC, id")
+        return list(Adotante.do_cursor(cur))
+
+    return _cache_listas_adotantes.obter('todos', carregar)
+
+
+def ler_adotante_registro(adotante_id):
+    def carregar():
+        cur = obter_conexao().cursor()
+        cur.execute("SELECT * FROM adotantes WHERE id = ?", (adotante_id,))
+        linha = cur.fetchone()
+        return Adotante.da_linha(linha) if linha else None
+
+    return _cache_adotantes.obter(adotante_id, carregar)
 
 
 def ler_adotante_id(adotante_id):
-    conn = sqlite3.connect(BANCO)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM adotantes WHERE id = ?", (adotante_id,))
-    adotante = cur.fetchone()
-    conn.close()
+    # Cópia em dict do registro em cache
+    adotante = ler_adotante_registro(adotante_id)
     if adotante:
-        adotante_dict = dict(adotante)
-        adotante_dict = preparar_adotante_dict(adotante_dict)
-        return adotante_dict
+        return adotante.para_dict()
     return None
 
 
@@ -185,20 +228,20 @@ def atualizar_adotante(adotante_id, **kwargs):
 
     values.append(adotante_id)
 
-    conn = sqlite3.connect(BANCO)
-    try:
+    conn = obter_conexao()
+    with conn:
         sql = f"UPDATE adotantes SET {', '.join(set_clause)} WHERE id = ?"
         conn.execute(sql, values)
-        conn.commit()
-    finally:
-        conn.close()
+
+    notificar('adotantes', 'atualizado', adotante_id)
 
 
 def deletar_adotante(adotante_id):
-    conn = sqlite3.connect(BANCO)
-    conn.execute("DELETE FROM adotantes WHERE id = ?", (adotante_id,))
-    conn.commit()
-    conn.close()
+    conn = obter_conexao()
+    with conn:
+        conn.execute("DELETE FROM adotantes WHERE id = ?", (adotante_id,))
+
+    notificar('adotantes', 'removido', adotante_id)
 
 
 def preparar_adotante_dict(adotante_dict):
@@ -247,12 +290,9 @@ def preparar_adotante_para_api(adotante_dict):
 
 
 def buscar_adotante_por_email(email):
-    conn = sqlite3.connect(BANCO)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+    cur = obter_conexao().cursor()
     cur.execute("SELECT * FROM adotantes WHERE email = ?", (email,))
     adotante = cur.fetchone()
-    conn.close()
     if adotante:
         adotante_dict = dict(adotante)
         adotante_dict = preparar_adotante_dict(adotante_dict)
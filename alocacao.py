@@ -0,0 +1,292 @@
+"""
+alocacao.py - Alocação global de animais a adotantes (feiras de adoção)
+
+As listas de matches ordenam os animais para cada adotante isoladamente, e
+o mesmo animal pode liderar a lista de muitos. Aqui cada adotante recebe no
+máximo um animal, cada animal vai para no máximo um adotante e a soma dos
+scores é a maior possível dentro do grafo de candidatos:
+
+1. Para cada adotante, os K primeiros animais da sua lista de matches viram
+   arestas (score arredondado >= min_score), calculadas em lote sobre o
+   pacote de animais da prévia (previa_matching.obter_pacote).
+2. O grafo esparso é resolvido por leilão (Bertsekas) com escalonamento de
+   epsilon, em inteiros, com fases diretas (adotantes dão lances) e reversas
+   (animais sem dono baixam o preço). Com epsilon final pequeno o bastante a
+   alocação é ótima para o grafo (ver resolver), sem montar a matriz densa
+   de um algoritmo húngaro O(n³).
+
+    python alocacao.py [--k 10] [--min-score 50] [--especie cachorro]
+                       [--animais 1,2] [--adotantes 3,4] [--csv saida.csv]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from matching_lote import agrupar, chave_adotante, empacotar_adotantes, calcular_scores_lote
+from indice_compatibilidade import indice_pronto, ler_por_ids, ler_scores_adotante
+from previa_matching import obter_pacote, empacotar, melhores_animais
+from registros import Adotante
+
+# Candidatos por adotante no grafo
+K_PADRAO = 10
+
+# Adotantes (assinaturas distintas) pontuados por bloco
+TAMANHO_BLOCO = 256
+
+# Divisor do epsilon entre uma fase do leilão e a seguinte
+FATOR_EPSILON = 6
+
+
+# ==================== GRAFO DE CANDIDATOS ====================
+
+def _ler_adotantes(adotante_ids):
+    if adotante_ids is not None:
+        return ler_por_ids('adotantes', Adotante, adotante_ids)
+    from adotantes_crud import ler_adotantes_registros
+    return ler_adotantes_registros()
+
+
+def _arestas_do_indice(representantes, animais, k, min_score, especie):
+    # Os k primeiros de cada lista já estão ordenados na tabela de compatibilidade
+    posicao = {animal.id: j for j, animal in enumerate(animais)}
+    candidatos = []
+    for adotante in representantes:
+        linhas = ler_scores_adotante(adotante.id, min_score, k, especie)
+        candidatos.append([(posicao[a], score) for a, score in linhas if a in posicao])
+    return candidatos
+
+
+def _arestas_calculadas(representantes, pacote, k, min_score):
+    candidatos = []
+    for inicio in range(0, len(representantes), TAMANHO_BLOCO):
+        bloco = representantes[inicio:inicio + TAMANHO_BLOCO]
+        pd = empacotar_adotantes(bloco, pacote['pacote']['vocabulario'])
+        score = calcular_scores_lote(pacote['pacote'], pd, pacote['classes'])['score'][:, pacote['grupo']]
+        for linha, posicoes in zip(score, melhores_animais(score, k, min_score)):
+            candidatos.append([(j, round(float(linha[j]), 1)) for j in posicoes])
+    return candidatos
+
+
+def montar_grafo(adotantes, k=K_PADRAO, min_score=50, especie=None, animal_ids=None):
+    """(animais, arestas): arestas[i] = [(posição do animal, score arredondado), ...] do adotante i.
+
+    As arestas de cada adotante são os k primeiros animais disponíveis da sua
+    lista de matches, restrita à espécie e aos ids pedidos. Com a tabela de
+    compatibilidade pronta e sem filtro de ids, as listas vêm dela; senão são
+    calculadas em lote só sobre os animais que passam pelos filtros.
+    """
+    pacote = obter_pacote()
+    animais = pacote['animais']
+    if not animais or not adotantes or k <= 0:
+        return animais, [[] for _ in adotantes]
+
+    # Adotantes com a mesma assinatura têm a mesma lista de candidatos
+    representantes, grupo_adotante = agrupar(adotantes, chave_adotante)
+
+    if animal_ids is None and indice_pronto():
+        candidatos = _arestas_do_indice(representantes, animais, k, min_score, especie)
+    else:
+        if especie or animal_ids is not None:
+            pedidos = set(animal_ids) if animal_ids is not None else None
+            pacote = empacotar([
+                a for a in animais
+                if (pedidos is None or a.id in pedidos)
+                and (not especie or (a.get('especie') or '').lower() == especie.lower())
+            ])
+            animais = pacote['animais']
+            if not animais:
+                return animais, [[] for _ in adotantes]
+        candidatos = _arestas_calculadas(representantes, pacote, k, min_score)
+
+    return animais, [candidatos[r] for r in grupo_adotante.tolist()]
+
+
+# ==================== LEILÃO ====================
+
+def _leilao(objetos, valores, total_objetos):
+    """Leilão com escalonamento de epsilon em que cada pessoa pode ficar sem objeto (valor 0).
+
+    objetos[p]/valores[p]: objetos que a pessoa p aceita e quanto valem para
+    ela (inteiros positivos). Retorna o objeto de cada pessoa, ou -1.
+
+    Cada fase tem duas partes. Na direta, as pessoas sem objeto dão lances:
+    o preço do melhor objeto sobe até empatar com a segunda opção, mais
+    epsilon. Na reversa, objetos que ficaram sem dono com preço acima de 0
+    (sobras de fases anteriores) escolhem a pessoa que mais ganha com eles e
+    baixam o preço o necessário; sem ninguém interessado, o preço vai a 0.
+    Ao fim de cada fase todas as pessoas estão a epsilon do seu melhor lucro
+    e todo objeto sem dono custa 0, então a soma obtida fica a menos de
+    pessoas x epsilon do ótimo.
+    """
+    pessoas = len(objetos)
+    precos = [0] * total_objetos
+    interessados = [[] for _ in range(total_objetos)]
+    for p in range(pessoas):
+        for o, v in zip(objetos[p], valores[p]):
+            interessados[o].append((p, v))
+
+    maior = max((max(v) for v in valores), default=0)
+    epsilon = max(maior // FATOR_EPSILON, 1)
+    while True:
+        dono = [-1] * total_objetos
+        objeto_de = [-1] * pessoas
+        lucro = [0] * pessoas
+
+        # Direta: ficar sem objeto vale 0 e nunca é disputado
+        livres = deque(range(pessoas))
+        while livres:
+            p = livres.popleft()
+            melhor = segundo = 0
+            escolhido = -1
+            for o, v in zip(objetos[p], valores[p]):
+                ganho = v - precos[o]
+                if ganho > melhor:
+                    segundo = melhor
+                    melhor = ganho
+                    escolhido = o
+                elif ganho > segundo:
+                    segundo = ganho
+
+            objeto_de[p] = escolhido
+            if escolhido < 0:
+                lucro[p] = 0
+                continue
+            precos[escolhido] += melhor - segundo + epsilon
+            lucro[p] = segundo - epsilon
+            anterior = dono[escolhido]
+            dono[escolhido] = p
+            if anterior >= 0:
+                livres.append(anterior)
+
+        # Reversa: objetos sem dono com preço positivo
+        pendentes = [o for o in range(total_objetos) if dono[o] < 0 and precos[o] > 0]
+        while pendentes:
+            o = pendentes.pop()
+            melhor = segundo = None
+            for p, v in interessados[o]:
+                ganho = v - lucro[p]
+                if melhor is None or ganho > melhor:
+                    segundo = melhor
+                    melhor = ganho
+                    escolhido, valor = p, v
+                elif segundo is None or ganho > segundo:
+                    segundo = ganho
+
+            if melhor - epsilon <= 0:
+                precos[o] = 0
+                continue
+            precos[o] = max(segundo - epsilon, 0) if segundo is not None else 0
+            antigo = objeto_de[escolhido]
+            objeto_de[escolhido] = o
+            dono[o] = escolhido
+            lucro[escolhido] = valor - precos[o]
+            if antigo >= 0:
+                dono[antigo] = -1
+                if precos[antigo] > 0:
+                    pendentes.append(antigo)
+
+        if epsilon == 1:
+            return objeto_de
+        epsilon = max(epsilon // FATOR_EPSILON, 1)
+
+
+def resolver(arestas):
+    """Animal (posição) de cada adotante, ou -1, maximizando a soma dos scores.
+
+    arestas[i] = [(posição do animal, score), ...]. Os scores têm uma casa
+    decimal: viram inteiros (x10) e são multiplicados por (adotantes + 1),
+    de modo que a tolerância do leilão com epsilon final 1 (adotantes x 1)
+    fica abaixo de 0,1 ponto e a alocação é ótima para o grafo.
+    """
+    usados = sorted({j for lista in arestas for j, _ in lista})
+    posicao = {j: n for n, j in enumerate(usados)}
+    ativos = [i for i, lista in enumerate(arestas) if lista]
+    escala = len(ativos) + 1
+
+    objetos = [[posicao[j] for j, _ in arestas[i]] for i in ativos]
+    valores = [[round(score * 10) * escala for _, score in arestas[i]] for i in ativos]
+    objeto_de = _leilao(objetos, valores, len(usados))
+
+    resultado = [-1] * len(arestas)
+    for a, i in enumerate(ativos):
+        if objeto_de[a] >= 0:
+            resultado[i] = usados[objeto_de[a]]
+    return resultado
+
+
+# ==================== JOB ====================
+
+def alocar(k=K_PADRAO, min_score=50, especie=None, animal_ids=None, adotante_ids=None):
+    """Alocação global dos animais disponíveis aos adotantes.
+
+    Retorna {'pares': [{'adotante_id', 'animal_id', 'score'}], 'score_total',
+    'adotantes', 'animais', 'arestas', 'alocados', 'segundos'}; os pares vêm
+    em ordem de adotante_id.
+    """
+    inicio = time.perf_counter()
+    adotantes = _ler_adotantes(adotante_ids)
+    animais, arestas = montar_grafo(adotantes, k, min_score, especie, animal_ids)
+    escolhidos = resolver(arestas)
+
+    pares = []
+    for adotante, lista, j in zip(adotantes, arestas, escolhidos):
+        if j >= 0:
+            score = next(s for posicao, s in lista if posicao == j)
+            pares.append({'adotante_id': adotante.id, 'animal_id': animais[j].id, 'score': score})
+    pares.sort(key=lambda par: par['adotante_id'])
+
+    return {
+        'pares': pares,
+        'score_total': round(sum(par['score'] for par in pares), 1),
+        'adotantes': len(adotantes),
+        'animais': len({j for lista in arestas for j, _ in lista}),
+        'arestas': sum(len(lista) for lista in arestas),
+        'alocados': len(pares),
+        'segundos': round(time.perf_counter() - inicio, 3)
+    }
+
+
+def _ler_ids(texto):
+    return [int(x) for x in texto.split(',') if x.strip()] if texto else None
+
+
+def main(argv=None):
+    from animal_crud import criar_tabela as criar_tabela_animais
+    from adotantes_crud import criar_tabela as criar_tabela_adotantes
+    from indice_compatibilidade import criar_tabela as criar_tabela_compatibilidade, garantir_indice
+
+    parser = argparse.ArgumentParser(description='Alocação global de animais a adotantes do Amigo+')
+    parser.add_argument('--k', type=int, default=K_PADRAO, help=f'Candidatos por adotante (padrão: {K_PADRAO})')
+    parser.add_argument('--min-score', type=int, default=50, help='Score mínimo de um par (padrão: 50)')
+    parser.add_argument('--especie', help='Só animais desta espécie')
+    parser.add_argument('--animais', help='Ids dos animais, separados por vírgula (padrão: todos os disponíveis)')
+    parser.add_argument('--adotantes', help='Ids dos adotantes, separados por vírgula (padrão: todos)')
+    parser.add_argument('--csv', help='Grava os pares neste arquivo CSV em vez de imprimir o JSON')
+    args = parser.parse_args(argv)
+
+    criar_tabela_animais()
+    criar_tabela_adotantes()
+    criar_tabela_compatibilidade()
+    # Como no app: com AMIGO_CONSTRUIR_INDICE=0 os scores são calculados na hora
+    if os.environ.get('AMIGO_CONSTRUIR_INDICE', '1') != '0':
+        garantir_indice()
+
+    resultado = alocar(args.k, args.min_score, args.especie, _ler_ids(args.animais), _ler_ids(args.adotantes))
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as arquivo:
+            escritor = csv.DictWriter(arquivo, fieldnames=['adotante_id', 'animal_id', 'score'])
+            escritor.writeheader()
+            escritor.writerows(resultado['pares'])
+        resumo = {chave: valor for chave, valor in resultado.items() if chave != 'pares'}
+        print(json.dumps(resumo, ensure_ascii=False))
+    else:
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,26 @@
-import sqlite3
+import hashlib
 import json
+import sqlite3
 from datetime import datetime
+from conexao import obter_conexao
+from eventos import notificar
+from paginacao import montar_select
+from registros import Animal
+from cache import CacheLRU, registrar_invalidacao
+from versoes import versionar
+
+# Termos menores que isso não formam um trigrama; a busca cai para LIKE
+TAMANHO_MINIMO_FTS = 3
+
+_busca_fts = False
 
-BANCO = "amigo.db"
+# Animais em tratamento (mesmo texto do índice parcial idx_animais_em_tratamento)
+EM_TRATAMENTO = "saude LIKE '%tratamento%'"
+
+# Registros por id e leituras da tabela inteira (usadas pelo matching)
+_cache_animais = CacheLRU('animais', tamanho_maximo=2048)
+_cache_listas_animais = CacheLRU('animais_listas', tamanho_maximo=4)
+registrar_invalidacao('animais', _cache_animais, _cache_listas_animais)
 
 # Definição das combinações de personalidade (usando side names, não trait keys)
 PERSONALITY_COMBINATIONS = [
@@ -52,6 +70,15 @@ TRAIT_SIDES = {
     'sociavel': {'left': 'sociavel', 'right': 'solitario'}
 }
 
+# Campos calculados por preparar_animal_para_api e as colunas de que dependem
+CAMPOS_DERIVADOS = {
+    'personalidade': ['comportamento'],
+    'personalidade_descritiva': ['comportamento'],
+    'idade_formatada': ['idade'],
+    'data_formatada': ['data'],
+    'data_legivel': ['data']
+}
+
 # Helper functions para parsear comportamento/personalidade
 def parsear_comportamento(comportamento_str):
     """Converte string JSON em dicionário de personalidade"""
@@ -71,22 +98,8 @@ def determina_lado_traco(valor, trait_key):
         return TRAIT_SIDES[trait_key]['right']
     return None  # Valor neutro (50)
 
-def gerar_tags_personalidade(comportamento_str):
-    """Gera tags baseado nos traços de personalidade"""
-    personalidade = parsear_comportamento(comportamento_str)
-
-    if not personalidade:
-        return []
-
-    # Mapear cada traço para seu lado
-    lados_ativos = {}
-    for trait_key, valor in personalidade.items():
-        if trait_key in TRAIT_SIDES:
-            lado = determina_lado_traco(valor, trait_key)
-            if lado:
-                lados_ativos[trait_key] = lado
-
-    # Encontrar combinações que batem
+def _tags_por_regras(lados_ativos):
+    """Aplica PERSONALITY_COMBINATIONS a um dict traço -> lado ativo"""
     tags = []
     for combo in PERSONALITY_COMBINATIONS:
         side1, side2 = combo['traits']
@@ -105,17 +118,68 @@ def gerar_tags_personalidade(comportamento_str):
             # Verificar se os lados batem (qualquer ordem)
             if (norm_side1 == lado1 and norm_side2 == lado2) or \
                (norm_side1 == lado2 and norm_side2 == lado1):
-                tags.append({
-                    'name': combo['tag'],
-                    'emoji': combo['emoji']
-                })
+                tags.append((combo['tag'], combo['emoji']))
+
+    return tuple(tags)
+
+
+# Assinatura: um dígito na base 3 por traço (0 = neutro, 1 = lado 'left', 2 = lado 'right')
+PESO_TRACO = {trait_key: 3 ** i for i, trait_key in enumerate(TRAIT_SIDES)}
+
+
+def compilar_tabela_tags():
+    """Tags de cada uma das 3^6 = 729 assinaturas possíveis"""
+    tabela = []
+    for assinatura in range(3 ** len(TRAIT_SIDES)):
+        lados_ativos = {}
+        for trait_key, peso in PESO_TRACO.items():
+            digito = assinatura // peso % 3
+            if digito:
+                lados_ativos[trait_key] = TRAIT_SIDES[trait_key]['left' if digito == 1 else 'right']
+        tabela.append(_tags_por_regras(lados_ativos))
+    return tabela
+
+
+TABELA_TAGS = compilar_tabela_tags()
+
+# Muda quando as regras mudam; as tags gravadas são refeitas em criar_tabela
+VERSAO_REGRAS_TAGS = hashlib.sha1(
+    json.dumps([PERSONALITY_COMBINATIONS, TRAIT_SIDES], sort_keys=True).encode('utf-8')
+).hexdigest()[:12]
+
+
+def assinatura_personalidade(personalidade):
+    """Índice da personalidade em TABELA_TAGS"""
+    assinatura = 0
+    for trait_key, valor in personalidade.items():
+        peso = PESO_TRACO.get(trait_key)
+        if peso is not None:
+            if valor > 50:
+                assinatura += peso
+            elif valor < 50:
+                assinatura += 2 * peso
+    return assinatura
+
+
+def gerar_tags_de_personalidade(personalidade):
+    """Tags de uma personalidade já decodificada (dict traço -> 0-100)"""
+    if not personalidade:
+        return []
+    return [{'name': nome, 'emoji': emoji} for nome, emoji in TABELA_TAGS[assinatura_personalidade(personalidade)]]
+
+
+def gerar_tags_personalidade(comportamento_str):
+    """Gera tags baseado nos traços de personalidade"""
+    return gerar_tags_de_personalidade(parsear_comportamento(comportamento_str))
 
-    return tags
 
 def preparar_animal_dict(animal_dict):
     """Prepara dicionário de animal parseando comportamento e tags como JSON"""
     if isinstance(animal_dict, dict):
-        if 'comportamento' in animal_dict and animal_dict['comportamento']:
+        # Já preparado antes (ex.: preparar_animal_para_api depois de ler_animal_id)
+        if isinstance(animal_dict.get('personalidade'), dict):
+            pass
+        elif 'comportamento' in animal_dict and animal_dict['comportamento']:
             animal_dict['personalidade'] = parsear_comportamento(animal_dict['comportamento'])
         else:
             animal_dict['personalidade'] = {}
@@ -179,9 +243,9 @@ def preparar_animal_para_api(animal_dict):
 
 def criar_tabela():
     #Criar tabela de animais se não existir e adicionar coluna status e tags se necessário
-    conn = sqlite3.connect(BANCO)
-    cur = conn.cursor()
-    cur.execute("""
+    conn = obter_conexao()
+    with conn:
+        conn.execute("""
         CREATE TABLE IF NOT EXISTS animais
             (id INTEGER PRIMARY KEY,
             nome TEXT NOT NULL,
@@ -195,8 +259,101 @@ def criar_tabela():
             tags TEXT,
             porte TEXT)
                 """)
-    conn.commit()
-    conn.close()
+        # Índices para os filtros da listagem
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_animais_especie ON animais (especie COLLATE NOCASE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_animais_status ON animais (status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_animais_porte ON animais (porte COLLATE NOCASE)")
+        # Contagem do painel: só os animais em tratamento entram no índice
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_animais_em_tratamento ON animais (id) WHERE {EM_TRATAMENTO}")
+        conn.execute("CREATE TABLE IF NOT EXISTS metadados (chave TEXT PRIMARY KEY, valor TEXT)")
+
+    criar_indice_busca()
+    versionar('animais')
+
+    versao = conn.execute("SELECT valor FROM metadados WHERE chave = 'versao_regras_tags'").fetchone()
+    if versao is None or versao[0] != VERSAO_REGRAS_TAGS:
+        regerar_tags_animais()
+
+
+def regerar_tags_animais(tamanho_lote=1000):
+    """Refaz as tags de todos os animais numa passada (ex.: após mudar as combinações).
+
+    Só grava as linhas cujas tags mudaram e devolve quantas foram.
+    """
+    conn = obter_conexao()
+    cur = conn.cursor()
+    cur.execute("SELECT id, comportamento, tags FROM animais")
+
+    tags_por_comportamento = {}
+    alteracoes = []
+    while True:
+        linhas = cur.fetchmany(tamanho_lote)
+        if not linhas:
+            break
+        for animal_id, comportamento, tags in linhas:
+            if comportamento not in tags_por_comportamento:
+                try:
+                    tags_por_comportamento[comportamento] = json.dumps(gerar_tags_personalidade(comportamento))
+                except (AttributeError, TypeError):
+                    # Personalidade fora do formato: mantém as tags atuais
+                    tags_por_comportamento[comportamento] = None
+            novas = tags_por_comportamento[comportamento]
+            if novas is not None and novas != tags:
+                alteracoes.append((novas, animal_id))
+
+    with conn:
+        conn.executemany("UPDATE animais SET tags = ? WHERE id = ?", alteracoes)
+        conn.execute(
+            "INSERT OR REPLACE INTO metadados (chave, valor) VALUES ('versao_regras_tags', ?)",
+            (VERSAO_REGRAS_TAGS,)
+        )
+
+    if alteracoes:
+        notificar('animais', 'importado', [animal_id for _, animal_id in alteracoes])
+    return len(alteracoes)
+
+
+def criar_indice_busca():
+    """Tabela FTS5 (trigram) sobre nome/raça/espécie, mantida por triggers"""
+    global _busca_fts
+    conn = obter_conexao()
+    try:
+        with conn:
+            existia = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'animais_busca'"
+            ).fetchone()
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS animais_busca
+                USING fts5(nome, raca, especie, content='animais', content_rowid='id', tokenize='trigram')
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS animais_busca_ai AFTER INSERT ON animais BEGIN
+                    INSERT INTO animais_busca(rowid, nome, raca, especie)
+                    VALUES (new.id, new.nome, new.raca, new.especie);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS animais_busca_ad AFTER DELETE ON animais BEGIN
+                    INSERT INTO animais_busca(animais_busca, rowid, nome, raca, especie)
+                    VALUES ('delete', old.id, old.nome, old.raca, old.especie);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS animais_busca_au AFTER UPDATE OF nome, raca, especie ON animais BEGIN
+                    INSERT INTO animais_busca(animais_busca, rowid, nome, raca, especie)
+                    VALUES ('delete', old.id, old.nome, old.raca, old.especie);
+                    INSERT INTO animais_busca(rowid, nome, raca, especie)
+                    VALUES (new.id, new.nome, new.raca, new.especie);
+                END
+            """)
+            if not existia:
+                # Primeira vez: indexa os animais já cadastrados
+                conn.execute("INSERT INTO animais_busca(animais_busca) VALUES ('rebuild')")
+        _busca_fts = True
+    except sqlite3.OperationalError as e:
+        # SQLite sem FTS5/trigram: a busca usa LIKE
+        print(f"Busca FTS5 indisponível, usando LIKE: {e}")
+        _busca_fts = False
 
 
 def adicionar_animal(nome, idade, raca, especie, saude, comportamento, data, status='Disponível', porte=None):
@@ -205,20 +362,21 @@ def adicionar_animal(nome, idade, raca, especie, saude, comportamento, data, sta
     tags = gerar_tags_personalidade(comportamento)
     tags_json = json.dumps(tags)
 
-    conn = sqlite3.connect(BANCO)
-    conn.execute(
-        "INSERT INTO animais(nome, idade, raca, especie, saude, comportamento, data, status, tags, porte) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (nome, idade, raca, especie, saude, comportamento, data, status, tags_json, porte)
-    )
-    conn.commit()
-    conn.close()
+    conn = obter_conexao()
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO animais(nome, idade, raca, especie, saude, comportamento, data, status, tags, porte) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (nome, idade, raca, especie, saude, comportamento, data, status, tags_json, porte)
+        )
+    animal_id = cur.lastrowid
+
+    notificar('animais', 'inserido', animal_id)
+    return animal_id
 
 
 def ler_animais():
     #Retorna lista com todos os animais
-    conn = sqlite3.connect(BANCO)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+    cur = obter_conexao().cursor()
     cur.execute("SELECT * FROM animais")
     linhas = cur.fetchall()
     animais = []
@@ -226,16 +384,112 @@ def ler_animais():
         animal_dict = dict(row)
         animal_dict = preparar_animal_dict(animal_dict)
         animais.append(animal_dict)
-    conn.close()
     return animais
 
 
+def ler_animais_registros(status=None):
+    #Retorna animais como registros compactos (JSON decodificado uma vez), para o matching
+    #A lista vem do cache e é compartilhada: não deve ser alterada
+    def carregar():
+        cur = obter_conexao().cursor()
+        if status:
+            cur.execute("SELECT * FROM animais WHERE status = ? ORDER BY id", (status,))
+        else:
+            cur.execute("SELECT * FROM animais ORDER BY id")
+        return list(Animal.do_cursor(cur))
+
+    return _cache_listas_animais.obter(status, carregar)
+
+
+def ler_animal_registro(animal_id):
+    def carregar():
+        cur = obter_conexao().cursor()
+        cur.execute("SELECT * FROM animais WHERE id = ?", (animal_id,))
+        linha = cur.fetchone()
+        return Animal.da_linha(linha) if linha else None
+
+    return _cache_animais.obter(animal_id, carregar)
+
+
+def ler_animais_pagina(limit=None, apos_id=None, colunas=None):
+    #Retorna animais em ordem de id a partir de apos_id (keyset), só com as colunas pedidas
+    sql = montar_select('animais', colunas)
+    params = []
+    if apos_id is not None:
+        sql += " WHERE id > ?"
+        params.append(apos_id)
+    sql += " ORDER BY id LIMIT ?"
+    params.append(-1 if limit is None else limit)
+
+    cur = obter_conexao().cursor()
+    cur.execute(sql, params)
+    return [preparar_animal_dict(dict(row)) for row in cur.fetchall()]
+
+
+def _padrao_like(texto):
+    # Escapa curingas do LIKE para buscar o texto literalmente
+    texto = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{texto}%"
+
+
+def buscar_animais(termo, limit=None, offset=0):
+    #Busca animais cujo nome, raça ou espécie contenha o termo (sem diferenciar maiúsculas)
+    cur = obter_conexao().cursor()
+    if _busca_fts and len(termo) >= TAMANHO_MINIMO_FTS:
+        frase = '"' + termo.replace('"', '""') + '"'
+        cur.execute("""
+            SELECT a.* FROM animais_busca b
+            JOIN animais a ON a.id = b.rowid
+            WHERE animais_busca MATCH ?
+            ORDER BY b.rowid
+            LIMIT ? OFFSET ?
+        """, (frase, -1 if limit is None else limit, offset))
+    else:
+        padrao = _padrao_like(termo)
+        cur.execute("""
+            SELECT * FROM animais
+            WHERE nome LIKE ? ESCAPE '\\' OR raca LIKE ? ESCAPE '\\' OR especie LIKE ? ESCAPE '\\'
+            ORDER BY id
+            LIMIT ? OFFSET ?
+        """, (padrao, padrao, padrao, -1 if limit is None else limit, offset))
+    return [preparar_animal_dict(dict(row)) for row in cur.fetchall()]
+
+
+def filtrar_animais(especie=None, status=None, saude=None, porte=None, limit=None, offset=0):
+    #Filtra animais no próprio SQL; critérios vazios são ignorados
+    condicoes = []
+    params = []
+    if especie:
+        condicoes.append("especie = ? COLLATE NOCASE")
+        params.append(especie)
+    if status:
+        condicoes.append("status = ?")
+        params.append(status)
+    if porte:
+        condicoes.append("porte = ? COLLATE NOCASE")
+        params.append(porte)
+    if saude:
+        condicoes.append("saude LIKE ? ESCAPE '\\'")
+        params.append(_padrao_like(saude))
+
+    sql = "SELECT * FROM animais"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    sql += " ORDER BY id LIMIT ? OFFSET ?"
+    params += [-1 if limit is None else limit, offset]
+
+    cur = obter_conexao().cursor()
+    cur.execute(sql, params)
+    return [preparar_animal_dict(dict(row)) for row in cur.fetchall()]
+
+
 def remover_animal(animal_id):
     #Remove animal por ID
-    conn = sqlite3.connect(BANCO)
-    conn.execute("DELETE FROM animais WHERE id = ?", (animal_id,))
-    conn.commit()
-    conn.close()
+    conn = obter_conexao()
+    with conn:
+        conn.execute("DELETE FROM animais WHERE id = ?", (animal_id,))
+
+    notificar('animais', 'removido', animal_id)
 
 
 def editar_animal(animal_id, nome, idade, raca, especie, saude, comportamento, data, status='Disponível', porte=None):
@@ -244,25 +498,19 @@ def editar_animal(animal_id, nome, idade, raca, especie, saude, comportamento, d
     tags = gerar_tags_personalidade(comportamento)
     tags_json = json.dumps(tags)
 
-    conn = sqlite3.connect(BANCO)
-    conn.execute(
-        "UPDATE animais SET nome=?, idade=?, raca=?, especie=?, saude=?, comportamento=?, data=?, status=?, tags=?, porte=? WHERE id=?",
-        (nome, idade, raca, especie, saude, comportamento, data, status, tags_json, porte, animal_id)
-    )
-    conn.commit()
-    conn.close()
+    conn = obter_conexao()
+    with conn:
+        conn.execute(
+            "UPDATE animais SET nome=?, idade=?, raca=?, especie=?, saude=?, comportamento=?, data=?, status=?, tags=?, porte=? WHERE id=?",
+            (nome, idade, raca, especie, saude, comportamento, data, status, tags_json, porte, animal_id)
+        )
+
+    notificar('animais', 'atualizado', animal_id)
 
 
 def ler_animal_id(animal_id):
-    #Retorna um animal específico por ID
-    conn = sqlite3.connect(BANCO)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM animais WHERE id = ?", (animal_id,))
-    animal = cur.fetchone()
-    conn.close()
+    #Retorna um animal específico por ID (cópia em dict do registro em cache)
+    animal = ler_animal_registro(animal_id)
     if animal:
-        animal_dict = dict(animal)
-        animal_dict = preparar_animal_dict(animal_dict)
-        return animal_dict
-    return None
\ No newline at end of file
+        return animal.para_dict()
+    return None
@@ -0,0 +1,126 @@
+"""
+arvore_kd.py - Árvore KD estática com distância L1 (NumPy)
+
+Usada sobre os vetores de 6 traços de personalidade: o score de traços é
+100 menos a distância L1 média entre dois vetores, então "score de traços
+>= X" é uma consulta de raio e "mais parecidos" é uma busca de vizinhos.
+Cada nó guarda a caixa (mínimos e máximos) dos seus pontos; as folhas são
+fatias contíguas dos arrays, calculadas de uma vez com NumPy.
+"""
+
+import heapq
+import numpy as np
+
+# Folhas grandes: cada nó visitado custa algumas operações NumPy, e uma
+# folha inteira sai numa só
+TAMANHO_FOLHA = 256
+
+
+class ArvoreKD:
+    def __init__(self, ids, pontos, tamanho_folha=TAMANHO_FOLHA):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.pontos = np.asarray(pontos, dtype=np.float64).reshape(len(self.ids), -1)
+        self.tamanho_folha = tamanho_folha
+        # Nós: (mínimos, máximos, início, fim, esquerdo, direito); folhas sem filhos
+        self._nos = []
+
+        if len(self.ids):
+            ordem = np.arange(len(self.ids))
+            self._montar(ordem, 0, len(ordem))
+            self.ids = self.ids[ordem]
+            self.pontos = self.pontos[ordem]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _montar(self, ordem, inicio, fim):
+        bloco = self.pontos[ordem[inicio:fim]]
+        minimos, maximos = bloco.min(axis=0), bloco.max(axis=0)
+
+        no = len(self._nos)
+        self._nos.append(None)
+        esquerdo = direito = None
+
+        # Divide pela dimensão mais espalhada, na mediana
+        dimensao = int(np.argmax(maximos - minimos))
+        if fim - inicio > self.tamanho_folha and maximos[dimensao] > minimos[dimensao]:
+            meio = (fim - inicio) // 2
+            particao = np.argpartition(bloco[:, dimensao], meio)
+            ordem[inicio:fim] = ordem[inicio:fim][particao]
+            esquerdo = self._montar(ordem, inicio, inicio + meio)
+            direito = self._montar(ordem, inicio + meio, fim)
+
+        self._nos[no] = (minimos, maximos, inicio, fim, esquerdo, direito)
+        return no
+
+    @staticmethod
+    def _distancia_caixa(ponto, minimos, maximos):
+        # Menor distância L1 possível entre o ponto e qualquer ponto da caixa
+        return float((np.maximum(minimos - ponto, 0) + np.maximum(ponto - maximos, 0)).sum())
+
+    def _distancias(self, ponto, inicio, fim):
+        return np.abs(self.pontos[inicio:fim] - ponto).sum(axis=1)
+
+    def no_raio(self, ponto, raio):
+        """(ids, distâncias) dos pontos a distância L1 <= raio, sem ordem definida"""
+        ponto = np.asarray(ponto, dtype=np.float64)
+        ids, distancias = [], []
+
+        pilha = [0] if self._nos else []
+        while pilha:
+            minimos, maximos, inicio, fim, esquerdo, direito = self._nos[pilha.pop()]
+            if self._distancia_caixa(ponto, minimos, maximos) > raio:
+                continue
+            # Caixa inteira dentro do raio: a folha não precisa ser dividida
+            longe = float(np.maximum(np.abs(ponto - minimos), np.abs(maximos - ponto)).sum())
+            if esquerdo is None or longe <= raio:
+                d = self._distancias(ponto, inicio, fim)
+                dentro = d <= raio
+                ids.append(self.ids[inicio:fim][dentro])
+                distancias.append(d[dentro])
+            else:
+                pilha.extend((direito, esquerdo))
+
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(ids), np.concatenate(distancias)
+
+    def mais_proximos(self, ponto, k, excluir=()):
+        """Até k pares (distância, id) mais próximos, por distância e depois id.
+
+        Os nós são visitados pela distância da caixa; a busca para quando a
+        caixa mais próxima ainda não visitada já está mais longe que o k-ésimo.
+        """
+        ponto = np.asarray(ponto, dtype=np.float64)
+        if k <= 0 or not self._nos:
+            return []
+
+        # Heap dos k melhores com o pior no topo: (-distância, -id)
+        melhores = []
+        fila = [(0.0, 0)]
+        while fila:
+            distancia_caixa, no = heapq.heappop(fila)
+            if len(melhores) == k and distancia_caixa > -melhores[0][0]:
+                break
+
+            minimos, maximos, inicio, fim, esquerdo, direito = self._nos[no]
+            if esquerdo is None:
+                d = self._distancias(ponto, inicio, fim)
+                ids = self.ids[inicio:fim]
+                if len(melhores) == k:
+                    perto = d <= -melhores[0][0]
+                    d, ids = d[perto], ids[perto]
+                for distancia, ponto_id in zip(d.tolist(), ids.tolist()):
+                    if ponto_id in excluir:
+                        continue
+                    item = (-distancia, -ponto_id)
+                    if len(melhores) < k:
+                        heapq.heappush(melhores, item)
+                    elif item > melhores[0]:
+                        heapq.heapreplace(melhores, item)
+            else:
+                for filho in (esquerdo, direito):
+                    filho_minimos, filho_maximos = self._nos[filho][:2]
+                    heapq.heappush(fila, (self._distancia_caixa(ponto, filho_minimos, filho_maximos), filho))
+
+        return sorted((-distancia, -ponto_id) for distancia, ponto_id in melhores)
@@ -0,0 +1,394 @@
+"""
+benchmark.py - Bases sintéticas e medição dos caminhos críticos
+
+Gera bancos amigo.db de teste (1k/10k/100k animais e adotantes) com o mesmo
+vocabulário de personalidade do cadastro (PERSONALITY_COMBINATIONS /
+TRAIT_SIDES) e o esquema real das tabelas, mede o matching, as leituras e
+as rotas principais da API (pelo test client do Flask) e grava os tempos
+em JSON para comparar entre commits.
+
+    python benchmark.py gerar 10k -o bench_10k.db
+    python benchmark.py executar bench_10k.db -o resultados.json
+    python benchmark.py comparar antes.json depois.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import conexao
+from registros import TRACOS
+from animal_crud import (
+    criar_tabela as criar_tabela_animais,
+    gerar_tags_personalidade,
+    PERSONALITY_COMBINATIONS
+)
+from TAREFAS_CRUD import criar_tabela as criar_tabela_tarefas
+from adotantes_crud import criar_tabela as criar_tabela_adotantes
+from indice_compatibilidade import criar_tabela as criar_tabela_compatibilidade
+from importacao import SQL_INSERCAO, COLUNAS_ADOTANTE, TIPOS_TAREFA
+
+TAMANHOS = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+# Acima disso o índice de compatibilidade não é gerado (o matching calcula na hora)
+PARES_INDICE_MAXIMO = 2000000
+
+ESPECIES = [('Cachorro', 0.55), ('Gato', 0.35), ('Coelho', 0.05), ('Pássaro', 0.03), ('Outro', 0.02)]
+RACAS = {
+    'Cachorro': ['SRD', 'Labrador', 'Poodle', 'Shih Tzu', 'Vira-lata', 'Golden Retriever', 'Beagle', 'Pinscher'],
+    'Gato': ['SRD', 'Siamês', 'Persa', 'Maine Coon', 'Angorá'],
+    'Coelho': ['Mini Lop', 'Lionhead', 'SRD'],
+    'Pássaro': ['Calopsita', 'Periquito', 'Canário'],
+    'Outro': ['Hamster', 'Porquinho-da-índia', 'Tartaruga'],
+}
+NOMES_ANIMAIS = ['Mel', 'Thor', 'Luna', 'Bob', 'Nina', 'Max', 'Amora', 'Pipoca', 'Fred', 'Lola',
+                 'Toby', 'Belinha', 'Simba', 'Maya', 'Paçoca', 'Zeus', 'Frida', 'Bidu', 'Chico', 'Jade']
+SAUDES = ['Saudável, vacinado', 'Saudável', 'Vacinado e castrado', 'Em tratamento de pele',
+          'Em tratamento dentário', 'Recuperando de cirurgia', 'Vermifugado']
+STATUS = [('Disponível', 0.7), ('Em Processo', 0.15), ('Em Tratamento', 0.15)]
+PORTES = ['pequeno', 'médio', 'grande']
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Hugo', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vanessa', 'Yuri']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Lima', 'Costa', 'Pereira', 'Almeida', 'Ribeiro', 'Gomes']
+PROFISSOES = ['Desenvolvedora', 'Professor', 'Enfermeira', 'Engenheiro', 'Designer', 'Advogada', 'Estudante', 'Aposentado']
+CIDADES = ['São Paulo - SP', 'Rio de Janeiro - RJ', 'Belo Horizonte - MG', 'Curitiba - PR', 'Recife - PE', 'Porto Alegre - RS']
+HOBBIES = ['leitura', 'corrida', 'trilhas', 'netflix', 'yoga', 'ciclismo', 'jogos', 'culinária', 'viagens', 'música']
+RESPONSAVEIS = ['Ana', 'Carlos', 'Beatriz', 'Diego', 'Fernanda']
+
+
+# ==================== GERAÇÃO DOS DADOS ====================
+
+def _sortear(rnd, opcoes):
+    valores, pesos = zip(*opcoes)
+    return rnd.choices(valores, pesos)[0]
+
+
+def _personalidade(rnd):
+    # Valores de 5 em 5 como no formulário, puxados para os extremos
+    return {trait: 5 * round(rnd.betavariate(0.8, 0.8) * 20) for trait in TRACOS}
+
+
+def _animal(rnd, hoje, tags_por_comportamento):
+    especie = _sortear(rnd, ESPECIES)
+    comportamento = json.dumps(_personalidade(rnd))
+    if comportamento not in tags_por_comportamento:
+        tags_por_comportamento[comportamento] = json.dumps(gerar_tags_personalidade(comportamento))
+
+    return (
+        rnd.choice(NOMES_ANIMAIS),
+        rnd.choice([0, 1, 1, 2, 3, 4, 5, 6, 8, 10, 12]),
+        rnd.choice(RACAS[especie]),
+        especie,
+        rnd.choice(SAUDES),
+        comportamento,
+        (hoje - timedelta(days=rnd.randint(0, 720))).isoformat(),
+        _sortear(rnd, STATUS),
+        tags_por_comportamento[comportamento],
+        rnd.choice(PORTES),
+    )
+
+
+def _adotante(rnd, numero, hoje, nomes_tags):
+    nome = f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}"
+    tem_preferencia = rnd.random() < 0.6
+    tem_quintal = rnd.random() < 0.4
+    tem_outros = rnd.random() < 0.3
+    orcamento_min = rnd.choice([100, 150, 200, 300])
+
+    valores = {
+        'nome': nome,
+        'email': f"adotante{numero}@exemplo.com",
+        'telefone': f"119{rnd.randint(10000000, 99999999)}",
+        'idade': rnd.randint(18, 75),
+        'profissao': rnd.choice(PROFISSOES),
+        'filhos': rnd.choice([0, 0, 1, 2, 3]),
+        'filhos_faixa_etaria': None,
+        'tipo_moradia': rnd.choice(['apartamento', 'casa', 'chácara']),
+        'tamanho_moradia': rnd.choice(PORTES),
+        'tem_quintal': int(tem_quintal),
+        'tamanho_quintal': rnd.choice(PORTES) if tem_quintal else None,
+        'localizacao': rnd.choice(CIDADES),
+        'aluga_ou_possui': rnd.choice(['aluga', 'possui']),
+        'horas_trabalho_dia': rnd.choice([0, 4, 6, 8, 8, 9, 10]),
+        'horas_sozinho_dia': rnd.randint(0, 12),
+        'viagens_frequentes': int(rnd.random() < 0.2),
+        'dias_viagem_ano': rnd.choice([None, 5, 15, 30]),
+        'nivel_atividade': rnd.choice(['sedentário', 'moderado', 'ativo', 'muito_ativo']),
+        'hobbies': json.dumps(rnd.sample(HOBBIES, rnd.randint(0, 3))),
+        'experiencia_previa': rnd.choice(['nenhuma', 'pouca', 'média', 'muita']),
+        'animais_tidos': json.dumps(rnd.sample(['Cachorro', 'Gato', 'Coelho'], rnd.randint(0, 2))),
+        'problemas_passados': None,
+        'tamanho_preferido': rnd.choice(PORTES + [None]),
+        'idade_preferida': rnd.choice(['filhote', 'jovem', 'adulto', 'idoso', None]),
+        'genero_preferido': rnd.choice(['sem_preferência', 'macho', 'fêmea', None]),
+        'tem_outros_animais': int(tem_outros),
+        'quantidade_outros_animais': rnd.randint(1, 3) if tem_outros else None,
+        'tipo_outros_animais': json.dumps(rnd.sample(['Cachorro', 'Gato'], rnd.randint(1, 2))) if tem_outros else None,
+        'orcamento_mensal_min': float(orcamento_min),
+        'orcamento_mensal_max': float(orcamento_min + rnd.choice([200, 300, 500])),
+        'disponibilidade_tempo_diario': rnd.choice(['menos de 1 hora', '1-2 horas', '2-3 horas', 'mais de 3 horas']),
+        'comprometimento_texto': None,
+        'tracos_preferidos': json.dumps(_personalidade(rnd)) if tem_preferencia else None,
+        'tags_ideais': json.dumps(rnd.sample(nomes_tags, rnd.randint(0, 4))),
+        'tem_preferencia_tracos': int(tem_preferencia),
+    }
+    data_cadastro = (hoje - timedelta(days=rnd.randint(0, 365))).isoformat()
+    return tuple(valores[c] for c in COLUNAS_ADOTANTE) + (data_cadastro,)
+
+
+def _tarefa(rnd, total_animais, hoje):
+    return (
+        rnd.randint(1, total_animais),
+        rnd.choice(NOMES_ANIMAIS),
+        rnd.choice(TIPOS_TAREFA),
+        (hoje + timedelta(days=rnd.randint(-60, 120))).isoformat(),
+        rnd.choice(RESPONSAVEIS),
+    )
+
+
+def _inserir(conn, sql, gerar_linha, quantidade, lote=5000):
+    for inicio in range(0, quantidade, lote):
+        linhas = [gerar_linha(i) for i in range(inicio, min(inicio + lote, quantidade))]
+        with conn:
+            conn.executemany(sql, linhas)
+
+
+def gerar_banco(caminho, animais, adotantes, tarefas=None, semente=42, indice=None):
+    """Cria um banco sintético novo em `caminho` (o arquivo não pode existir)"""
+    if os.path.exists(caminho):
+        raise FileExistsError(f'{caminho} já existe')
+
+    rnd = random.Random(semente)
+    hoje = date.today()
+    tarefas = animais * 2 if tarefas is None else tarefas
+    nomes_tags = [combo['tag'] for combo in PERSONALITY_COMBINATIONS]
+    tags_por_comportamento = {}
+
+    conexao.configurar(banco=caminho)
+    criar_tabela_animais()
+    criar_tabela_tarefas()
+    criar_tabela_adotantes()
+    criar_tabela_compatibilidade()
+
+    conn = conexao.obter_conexao()
+    _inserir(conn, SQL_INSERCAO['animais'], lambda i: _animal(rnd, hoje, tags_por_comportamento), animais)
+    _inserir(conn, SQL_INSERCAO['adotantes'], lambda i: _adotante(rnd, i + 1, hoje, nomes_tags), adotantes)
+    if animais:
+        _inserir(conn, SQL_INSERCAO['tarefas'], lambda i: _tarefa(rnd, animais, hoje), tarefas)
+    conn.execute("ANALYZE")
+
+    if indice is None:
+        indice = animais * adotantes <= PARES_INDICE_MAXIMO
+    if indice:
+        from reprocessamento import reprocessar
+        reprocessar()
+
+    conexao.fechar_pool()
+    return {'animais': animais, 'adotantes': adotantes, 'tarefas': tarefas, 'indice': indice}
+
+
+# ==================== MEDIÇÃO ====================
+
+def _resumo(tempos):
+    ordenados = sorted(tempos)
+    return {
+        'repeticoes': len(tempos),
+        'min_ms': round(ordenados[0] * 1000, 4),
+        'mediana_ms': round(statistics.median(ordenados) * 1000, 4),
+        'media_ms': round(statistics.fmean(ordenados) * 1000, 4),
+        'p95_ms': round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1000, 4),
+    }
+
+
+def medir(funcao, repeticoes, preparar=None):
+    """Tempos de `funcao(i)`; `preparar(i)` roda antes de cada chamada, fora da medição"""
+    tempos = []
+    for i in range(repeticoes):
+        if preparar:
+            preparar(i)
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append(time.perf_counter() - inicio)
+    return _resumo(tempos)
+
+
+def _commit_atual():
+    try:
+        saida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+        return saida.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _contar(cur, tabela):
+    cur.execute(f"SELECT COUNT(*) FROM {tabela}")
+    return cur.fetchone()[0]
+
+
+def executar(caminho, repeticoes=20, semente=7, filtro=None):
+    """Mede os caminhos críticos sobre o banco em `caminho` e devolve o relatório"""
+    conexao.configurar(banco=caminho)
+    cur = conexao.obter_conexao().cursor()
+    totais = {t: _contar(cur, t) for t in ('animais', 'adotantes', 'tarefas', 'compatibilidade')}
+
+    # Sem índice completo o app não deve reconstruí-lo na importação
+    if totais['compatibilidade'] != totais['animais'] * totais['adotantes']:
+        os.environ['AMIGO_CONSTRUIR_INDICE'] = '0'
+
+    import cache
+    import main
+    from matching_engine import calcular_compatibilidade, obter_matches_adotante, obter_matches_animal
+    from animal_crud import ler_animais
+
+    rnd = random.Random(semente)
+    cur.execute("SELECT id FROM animais")
+    animal_ids = [row[0] for row in cur.fetchall()] or [1]
+    cur.execute("SELECT id FROM adotantes")
+    adotante_ids = [row[0] for row in cur.fetchall()] or [1]
+    sorteio_animais = [rnd.choice(animal_ids) for _ in range(repeticoes)]
+    sorteio_adotantes = [rnd.choice(adotante_ids) for _ in range(repeticoes)]
+
+    cliente = main.app.test_client()
+
+    def rota(url):
+        def chamar(i):
+            resposta = cliente.get(url(i))
+            resposta.get_data()
+            if resposta.status_code != 200:
+                raise RuntimeError(f'{url(i)} respondeu {resposta.status_code}')
+        return chamar
+
+    # (nome, função, preparar): caches limpos antes de cada chamada onde indicado
+    frio = lambda i: cache.limpar_caches()
+    casos = [
+        ('calcular_compatibilidade', lambda i: calcular_compatibilidade(sorteio_animais[i], sorteio_adotantes[i]), None),
+        ('obter_matches_adotante', lambda i: obter_matches_adotante(sorteio_adotantes[i], limit=20), None),
+        ('obter_matches_animal', lambda i: obter_matches_animal(sorteio_animais[i], limit=20), None),
+        ('ler_animais', lambda i: ler_animais(), None),
+        ('get_dashboard_stats', lambda i: main.get_dashboard_stats(), frio),
+        ('GET /', rota(lambda i: '/'), frio),
+        ('GET /api/animals', rota(lambda i: '/api/animals'), None),
+        ('GET /api/animals?limit=50', rota(lambda i: '/api/animals?limit=50'), None),
+        ('GET /api/adotantes?limit=50', rota(lambda i: '/api/adotantes?limit=50'), None),
+        ('GET /api/tasks?limit=50', rota(lambda i: '/api/tasks?limit=50'), None),
+        ('GET /api/stats', rota(lambda i: '/api/stats'), frio),
+        ('GET /api/proximas-tarefas?limit=20', rota(lambda i: '/api/proximas-tarefas?limit=20'), None),
+        ('GET /api/animals/search', rota(lambda i: '/api/animals/search?q=mel&limit=50'), None),
+        ('GET /api/animals/filter', rota(lambda i: '/api/animals/filter?especie=Gato&status=Disponível&limit=50'), None),
+        ('GET /api/adotantes/<id>/matches', rota(lambda i: f'/api/adotantes/{sorteio_adotantes[i]}/matches?limit=20'), None),
+        ('GET /api/matching/animal/<id>', rota(lambda i: f'/api/matching/animal/{sorteio_animais[i]}?limit=20'), None),
+        ('GET /api/matching/score', rota(
+            lambda i: f'/api/matching/score?animal_id={sorteio_animais[i]}&adotante_id={sorteio_adotantes[i]}'), None),
+    ]
+
+    resultados = {}
+    for nome, funcao, preparar in casos:
+        if filtro and filtro not in nome:
+            continue
+        resultados[nome] = medir(funcao, repeticoes, preparar)
+        print(f"{nome:<40} mediana {resultados[nome]['mediana_ms']:>10.3f} ms", file=sys.stderr)
+
+    return {
+        'commit': _commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'banco': os.path.basename(caminho),
+        'totais': totais,
+        'repeticoes': repeticoes,
+        'resultados': resultados,
+    }
+
+
+def comparar(base, novo, limite=0.10):
+    """Linhas (nome, mediana base, mediana nova, variação) e se houve regressão acima de `limite`"""
+    linhas = []
+    regressao = False
+    for nome, medida in novo['resultados'].items():
+        anterior = base['resultados'].get(nome)
+        if anterior is None or not anterior['mediana_ms']:
+            continue
+        variacao = medida['mediana_ms'] / anterior['mediana_ms'] - 1
+        regressao = regressao or variacao > limite
+        linhas.append((nome, anterior['mediana_ms'], medida['mediana_ms'], variacao))
+    return linhas, regressao
+
+
+# ==================== LINHA DE COMANDO ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks do Amigo+')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    ger = sub.add_parser('gerar', help='Gera um banco sintético')
+    ger.add_argument('tamanho', choices=sorted(TAMANHOS), help='Quantidade de animais e de adotantes')
+    ger.add_argument('-o', '--saida', required=True, help='Arquivo do banco a criar')
+    ger.add_argument('--animais', type=int, help='Sobrescreve a quantidade de animais')
+    ger.add_argument('--adotantes', type=int, help='Sobrescreve a quantidade de adotantes')
+    ger.add_argument('--tarefas', type=int, help='Quantidade de tarefas (padrão: 2 por animal)')
+    ger.add_argument('--semente', type=int, default=42)
+    ger.add_argument('--indice', choices=['sim', 'nao'], help='Gera a tabela de compatibilidade (padrão: automático)')
+
+    exe = sub.add_parser('executar', help='Mede os caminhos críticos sobre um banco')
+    exe.add_argument('banco')
+    exe.add_argument('-o', '--saida', help='Arquivo JSON de resultados (padrão: stdout)')
+    exe.add_argument('--repeticoes', type=int, default=20)
+    exe.add_argument('--filtro', help='Só mede os casos cujo nome contém este texto')
+
+    cmp = sub.add_parser('comparar', help='Compara dois arquivos de resultados')
+    cmp.add_argument('base')
+    cmp.add_argument('novo')
+    cmp.add_argument('--limite', type=float, default=0.10, help='Piora tolerada na mediana (padrão: 0.10)')
+
+    args = parser.parse_args(argv)
+
+    if args.comando == 'gerar':
+        quantidade = TAMANHOS[args.tamanho]
+        indice = None if args.indice is None else args.indice == 'sim'
+        inicio = time.perf_counter()
+        resumo = gerar_banco(
+            args.saida,
+            args.animais if args.animais is not None else quantidade,
+            args.adotantes if args.adotantes is not None else quantidade,
+            args.tarefas,
+            args.semente,
+            indice
+        )
+        resumo['segundos'] = round(time.perf_counter() - inicio, 1)
+        print(json.dumps(resumo, ensure_ascii=False))
+        return 0
+
+    if args.comando == 'executar':
+        relatorio = executar(args.banco, args.repeticoes, filtro=args.filtro)
+        texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+        if args.saida:
+            with open(args.saida, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto + '\n')
+        else:
+            print(texto)
+        return 0
+
+    with open(args.base, encoding='utf-8') as arquivo:
+        base = json.load(arquivo)
+    with open(args.novo, encoding='utf-8') as arquivo:
+        novo = json.load(arquivo)
+
+    linhas, regressao = comparar(base, novo, args.limite)
+    print(f"{'caso':<40} {'base (ms)':>12} {'novo (ms)':>12} {'variação':>10}")
+    for nome, anterior, atual, variacao in linhas:
+        marca = '  <-- piorou' if variacao > args.limite else ''
+        print(f"{nome:<40} {anterior:>12.3f} {atual:>12.3f} {variacao:>+9.1%}{marca}")
+    return 1 if regressao else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+cache.py - Cache LRU com expiração (TTL) para leituras frequentes
+
+Cada cache tem tamanho máximo, tempo de vida por entrada e contadores de
+acertos/falhas. Os módulos CRUD invalidam as entradas afetadas a cada
+escrita (ver registrar_invalidacao), antes dos demais ouvintes de eventos.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from eventos import registrar_ouvinte
+
+# Segundos que uma entrada vale; limita a defasagem entre processos (workers)
+TTL_PADRAO = float(os.environ.get('AMIGO_CACHE_TTL', '60'))
+
+_caches = {}
+# Caches derivados de cada tabela (ver vincular)
+_caches_por_tabela = {}
+
+
+class CacheLRU:
+    def __init__(self, nome, tamanho_maximo=1024, ttl=TTL_PADRAO):
+        self.nome = nome
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        _caches[nome] = self
+
+    def obter(self, chave, carregar):
+        """Devolve o valor em cache ou chama carregar() e guarda o resultado"""
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] > agora:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada[1]
+            self.falhas += 1
+            geracao = self.invalidacoes
+
+        valor = carregar()
+
+        with self._lock:
+            # Uma escrita durante o carregamento pode ter deixado o valor velho
+            if geracao == self.invalidacoes:
+                self._entradas[chave] = (agora + self.ttl, valor)
+                self._entradas.move_to_end(chave)
+                while len(self._entradas) > self.tamanho_maximo:
+                    self._entradas.popitem(last=False)
+        return valor
+
+    def invalidar(self, *chaves):
+        """Remove as chaves indicadas (ou tudo, se nenhuma for passada)"""
+        with self._lock:
+            self.invalidacoes += 1
+            if not chaves:
+                self._entradas.clear()
+            for chave in chaves:
+                self._entradas.pop(chave, None)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'tamanho': len(self._entradas),
+                'tamanho_maximo': self.tamanho_maximo,
+                'ttl': self.ttl,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'invalidacoes': self.invalidacoes
+            }
+
+
+def registrar_invalidacao(tabela, por_id, listas=None):
+    """Liga as escritas em `tabela` à invalidação dos caches.
+
+    `por_id` é o cache indexado por id do registro; `listas` guarda leituras
+    da tabela inteira e é esvaziado a cada escrita.
+    """
+    def invalidar(acao, registro_id):
+        ids = registro_id if isinstance(registro_id, list) else [registro_id]
+        por_id.invalidar(*ids)
+        if listas is not None:
+            listas.invalidar()
+
+    registrar_ouvinte(tabela, invalidar, primeiro=True)
+    vincular(tabela, por_id, *([listas] if listas is not None else []))
+
+
+def vincular(tabela, *caches):
+    """Marca caches como derivados de `tabela`: são esvaziados quando outro
+    processo escreve nela (ver versoes.ler_versoes)"""
+    _caches_por_tabela.setdefault(tabela, []).extend(caches)
+
+
+def estatisticas():
+    """Contadores de todos os caches, por nome"""
+    return {nome: cache.estatisticas() for nome, cache in _caches.items()}
+
+
+def limpar_caches(tabela=None):
+    """Esvazia os caches derivados de `tabela` (todos, se nenhuma for indicada)"""
+    caches = _caches.values() if tabela is None else _caches_por_tabela.get(tabela, [])
+    for cache in caches:
+        cache.invalidar()
@@ -0,0 +1,119 @@
+"""
+conexao.py - Camada compartilhada de conexões SQLite
+
+Cada thread pega uma conexão do pool na primeira consulta e a devolve no
+fim da requisição (teardown do Flask). As PRAGMAs de desempenho são
+aplicadas uma única vez, quando a conexão é aberta.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+
+BANCO = os.environ.get('AMIGO_BANCO', 'amigo.db')
+
+# Máximo de conexões ociosas mantidas no pool
+TAMANHO_POOL = int(os.environ.get('AMIGO_POOL_TAMANHO', '8'))
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",   # 256 MB
+    "PRAGMA cache_size=-16000",     # ~16 MB
+]
+
+_pool = queue.LifoQueue()
+_local = threading.local()
+
+# Classe das conexões novas (a instrumentação em metricas.py troca por uma subclasse)
+_fabrica = sqlite3.Connection
+
+
+def _minusculas(valor):
+    # lower() do SQLite só converte ASCII; esta segue o str.lower() dos índices em memória
+    return valor.lower() if isinstance(valor, str) else valor
+
+
+def _abrir_conexao():
+    # check_same_thread=False: a conexão pode voltar ao pool e ser usada
+    # por outra thread, mas nunca por duas ao mesmo tempo
+    conn = sqlite3.connect(BANCO, timeout=10, check_same_thread=False, factory=_fabrica)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.create_function('minusculas', 1, _minusculas, deterministic=True)
+    return conn
+
+
+def obter_conexao():
+    """Retorna a conexão da thread atual, pegando uma do pool se necessário"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            conn = _abrir_conexao()
+        _local.conn = conn
+    return conn
+
+
+def liberar_conexao(exc=None):
+    """Devolve a conexão da thread atual ao pool (ou fecha, se cheio)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+
+    if conn.in_transaction:
+        conn.rollback()
+
+    if _pool.qsize() < TAMANHO_POOL:
+        _pool.put(conn)
+    else:
+        conn.close()
+
+
+def fechar_pool():
+    """Fecha todas as conexões ociosas e a da thread atual"""
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None:
+        conn.close()
+
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+def descartar_herdadas():
+    """Esquece as conexões herdadas num processo filho (após fork).
+
+    Uma conexão SQLite não pode ser usada nem fechada em dois processos; o
+    filho só solta as referências e abre as suas na próxima consulta.
+    """
+    global _pool, _local
+    _pool = queue.LifoQueue()
+    _local = threading.local()
+
+
+def configurar(banco=None, tamanho_pool=None, fabrica=None):
+    """Troca o arquivo do banco, o tamanho do pool e/ou a classe das conexões"""
+    global BANCO, TAMANHO_POOL, _fabrica
+
+    if banco is not None and banco != BANCO:
+        fechar_pool()
+        BANCO = banco
+    if fabrica is not None and fabrica is not _fabrica:
+        fechar_pool()
+        _fabrica = fabrica
+    if tamanho_pool is not None:
+        TAMANHO_POOL = int(tamanho_pool)
+
+
+def init_app(app):
+    """Liga o pool ao ciclo de vida das requisições do Flask"""
+    configurar(tamanho_pool=app.config.get('POOL_CONEXOES', TAMANHO_POOL))
+    app.teardown_appcontext(liberar_conexao)
@@ -0,0 +1,55 @@
+"""
+estatisticas.py - Contadores do painel (animais, tarefas, urgentes, em tratamento)
+
+Tudo sai de uma única consulta com agregados SQL: a contagem de tarefas
+urgentes é uma faixa no índice de datas ISO (idx_tarefas_data), a de animais
+em tratamento conta as entradas de um índice parcial (idx_animais_em_tratamento)
+e nenhuma linha é carregada em Python. O resultado fica num cache curto, invalidado a cada
+escrita em animais ou tarefas.
+"""
+
+import os
+from datetime import date, timedelta
+from conexao import obter_conexao
+from cache import CacheLRU, vincular
+from eventos import registrar_ouvinte
+from TAREFAS_CRUD import DATA_VALIDA
+from animal_crud import EM_TRATAMENTO
+
+# Tarefas com vencimento em até tantos dias (ou atrasadas) contam como urgentes
+DIAS_URGENTE = 7
+
+TTL_ESTATISTICAS = float(os.environ.get('AMIGO_STATS_TTL', '5'))
+
+_cache_estatisticas = CacheLRU('estatisticas', tamanho_maximo=2, ttl=TTL_ESTATISTICAS)
+
+SQL_ESTATISTICAS = f"""
+    SELECT
+        (SELECT COUNT(*) FROM animais) AS total_animals,
+        (SELECT COUNT(*) FROM tarefas) AS pending_tasks,
+        (SELECT COUNT(*) FROM tarefas WHERE data <= ? AND {DATA_VALIDA}) AS urgent_tasks,
+        (SELECT COUNT(*) FROM animais WHERE {EM_TRATAMENTO}) AS in_treatment
+"""
+
+
+def _calcular(limite_urgente):
+    cur = obter_conexao().cursor()
+    cur.execute(SQL_ESTATISTICAS, (limite_urgente,))
+    return dict(cur.fetchone())
+
+
+def calcular_estatisticas(hoje=None):
+    """Totais do painel; a chave do cache é o dia, para virar à meia-noite"""
+    hoje = hoje or date.today()
+    limite_urgente = (hoje + timedelta(days=DIAS_URGENTE)).isoformat()
+    return dict(_cache_estatisticas.obter(limite_urgente, lambda: _calcular(limite_urgente)))
+
+
+def _invalidar(acao, registro_id):
+    _cache_estatisticas.invalidar()
+
+
+registrar_ouvinte('animais', _invalidar, primeiro=True)
+registrar_ouvinte('tarefas', _invalidar, primeiro=True)
+vincular('animais', _cache_estatisticas)
+vincular('tarefas', _cache_estatisticas)
@@ -0,0 +1,31 @@
+"""
+eventos.py - Notificação de escritas nas tabelas para os índices em memória/disco
+
+Os módulos CRUD chamam notificar() depois de cada escrita confirmada; os
+índices derivados (compatibilidade, caches, etc.) se registram como ouvintes.
+"""
+
+_ouvintes = {}
+
+
+def registrar_ouvinte(tabela, funcao, primeiro=False):
+    """Registra funcao(acao, registro_id) para escritas em `tabela`.
+
+    `primeiro=True` coloca o ouvinte à frente dos demais (usado pelos caches,
+    que precisam ser invalidados antes de os índices relerem os dados).
+    """
+    ouvintes = _ouvintes.setdefault(tabela, [])
+    if primeiro:
+        ouvintes.insert(0, funcao)
+    else:
+        ouvintes.append(funcao)
+
+
+def notificar(tabela, acao, registro_id):
+    # acao: 'inserido', 'atualizado', 'removido' ou 'importado'; registro_id pode ser
+    # uma lista de ids (importação e remoção em lote)
+    for funcao in _ouvintes.get(tabela, []):
+        try:
+            funcao(acao, registro_id)
+        except Exception as e:
+            print(f"Erro ao processar evento {acao} em {tabela} ({registro_id}): {e}")
@@ -0,0 +1,31 @@
+"""
+gunicorn.conf.py - Configuração do Gunicorn para produção
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Variáveis: AMIGO_BIND (padrão 0.0.0.0:8000), AMIGO_WORKERS (padrão: núcleos
+da máquina) e AMIGO_THREADS (padrão 4 por worker).
+"""
+
+import os
+
+import conexao
+
+bind = os.environ.get('AMIGO_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('AMIGO_WORKERS', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('AMIGO_THREADS', '4'))
+
+# Importa wsgi.py (tabelas, índice e caches) uma vez no mestre, antes do fork
+preload_app = True
+
+timeout = 60
+accesslog = '-'
+
+# Cada thread do worker prende uma conexão durante a requisição
+conexao.configurar(tamanho_pool=max(conexao.TAMANHO_POOL, threads))
+
+
+def post_fork(server, worker):
+    # O worker não reaproveita nada do pool do mestre; abre as próprias conexões
+    conexao.descartar_herdadas()
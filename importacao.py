@@ -0,0 +1,382 @@
+"""
+importacao.py - Importação e exportação em massa (CSV / NDJSON)
+
+Lê o arquivo de forma incremental, valida cada linha e insere em blocos
+com executemany, um bloco por transação. Linhas inválidas são reportadas
+sem interromper a importação. A exportação é um gerador que percorre a
+tabela com fetchmany, sem carregar tudo em memória.
+
+Uso pela linha de comando:
+    python importacao.py importar animais parceiro.csv
+    python importacao.py exportar adotantes --formato ndjson -o adotantes.ndjson
+"""
+
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+from conexao import obter_conexao
+from eventos import notificar
+from animal_crud import gerar_tags_personalidade
+from TAREFAS_CRUD import normalizar_data
+
+# Linhas por transação
+TAMANHO_LOTE = 500
+
+TIPOS_TAREFA = ["Banho", "Tosa", "Vacinação", "Check-Up", "Treinamento", "Castração"]
+
+COLUNAS_ADOTANTE = [
+    'nome', 'email', 'telefone', 'idade', 'profissao', 'filhos', 'filhos_faixa_etaria',
+    'tipo_moradia', 'tamanho_moradia', 'tem_quintal', 'tamanho_quintal', 'localizacao', 'aluga_ou_possui',
+    'horas_trabalho_dia', 'horas_sozinho_dia', 'viagens_frequentes', 'dias_viagem_ano',
+    'nivel_atividade', 'hobbies', 'experiencia_previa', 'animais_tidos', 'problemas_passados',
+    'tamanho_preferido', 'idade_preferida', 'genero_preferido',
+    'tem_outros_animais', 'quantidade_outros_animais', 'tipo_outros_animais',
+    'orcamento_mensal_min', 'orcamento_mensal_max', 'disponibilidade_tempo_diario', 'comprometimento_texto',
+    'tracos_preferidos', 'tags_ideais', 'tem_preferencia_tracos'
+]
+
+CAMPOS_INTEIROS = {
+    'idade', 'filhos', 'horas_trabalho_dia', 'horas_sozinho_dia', 'dias_viagem_ano',
+    'quantidade_outros_animais', 'animal_id'
+}
+CAMPOS_REAIS = {'orcamento_mensal_min', 'orcamento_mensal_max'}
+CAMPOS_BOOLEANOS = {'tem_quintal', 'viagens_frequentes', 'tem_outros_animais', 'tem_preferencia_tracos'}
+CAMPOS_JSON = {'hobbies', 'animais_tidos', 'tipo_outros_animais', 'tags_ideais', 'tracos_preferidos', 'comportamento'}
+
+SQL_INSERCAO = {
+    'animais': (
+        "INSERT INTO animais(nome, idade, raca, especie, saude, comportamento, data, status, tags, porte) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    ),
+    'adotantes': (
+        f"INSERT INTO adotantes({', '.join(COLUNAS_ADOTANTE)}, data_cadastro) "
+        f"VALUES ({', '.join('?' for _ in COLUNAS_ADOTANTE)}, COALESCE(?, CURRENT_DATE))"
+    ),
+    'tarefas': (
+        "INSERT INTO tarefas(animal_id, nome, tarefa, data, responsavel) VALUES (?, ?, ?, ?, ?)"
+    ),
+}
+
+
+# ==================== LEITURA DOS ARQUIVOS ====================
+
+def ler_registros(arquivo, formato):
+    """Gera (numero_linha, dict) a partir de um arquivo texto CSV ou NDJSON"""
+    if formato == 'csv':
+        for numero, linha in enumerate(csv.DictReader(arquivo), start=1):
+            yield numero, linha
+    elif formato == 'ndjson':
+        for numero, linha in enumerate(arquivo, start=1):
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError as e:
+                yield numero, ValueError(f'JSON inválido: {e}')
+                continue
+            if not isinstance(registro, dict):
+                registro = ValueError('Cada linha deve ser um objeto JSON')
+            yield numero, registro
+    else:
+        raise ValueError(f'Formato desconhecido: {formato}')
+
+
+def _valor(registro, campo):
+    # Converte o texto cru do CSV/NDJSON para o tipo da coluna
+    valor = registro.get(campo)
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if valor == '':
+            return None
+
+    if valor is None:
+        return None
+
+    if campo in CAMPOS_BOOLEANOS:
+        if isinstance(valor, str):
+            return 1 if valor.lower() in ('1', 'true', 'sim', 'yes', 'on') else 0
+        return 1 if valor else 0
+
+    if campo in CAMPOS_INTEIROS:
+        try:
+            return int(valor)
+        except (ValueError, TypeError):
+            raise ValueError(f'{campo} deve ser um número inteiro')
+
+    if campo in CAMPOS_REAIS:
+        try:
+            return float(valor)
+        except (ValueError, TypeError):
+            raise ValueError(f'{campo} deve ser um número')
+
+    if campo in CAMPOS_JSON and isinstance(valor, (list, dict)):
+        return json.dumps(valor)
+
+    return valor
+
+
+def _obrigatorios(registro, campos):
+    faltando = [c for c in campos if _valor(registro, c) is None]
+    if faltando:
+        raise ValueError(f'Campos obrigatórios faltando: {", ".join(faltando)}')
+
+
+# ==================== PREPARAÇÃO DAS LINHAS ====================
+
+def _contexto_lote(entidade, lote, conn):
+    # Dados compartilhados pelas linhas de um mesmo lote
+    contexto = {'tags': {}, 'nomes_animais': {}}
+
+    if entidade == 'tarefas':
+        # Busca de uma vez os animais referenciados pelo lote
+        ids = set()
+        for _, registro in lote:
+            if isinstance(registro, dict):
+                try:
+                    ids.add(_valor(registro, 'animal_id'))
+                except ValueError:
+                    pass
+        ids.discard(None)
+
+        if ids:
+            marcadores = ', '.join('?' for _ in ids)
+            cur = conn.execute(f"SELECT id, nome FROM animais WHERE id IN ({marcadores})", list(ids))
+            contexto['nomes_animais'] = {row[0]: row[1] for row in cur.fetchall()}
+
+    return contexto
+
+
+def _preparar_animal(registro, contexto):
+    _obrigatorios(registro, ['nome', 'idade', 'raca', 'especie', 'data'])
+    comportamento = _valor(registro, 'comportamento') or ''
+
+    # Personalidades repetidas são comuns em importações: gera as tags uma vez por lote
+    tags = contexto['tags']
+    if comportamento not in tags:
+        try:
+            # No NDJSON um número chega como número; uma lista chega como texto JSON
+            if not isinstance(comportamento, str):
+                raise TypeError(comportamento)
+            tags[comportamento] = json.dumps(gerar_tags_personalidade(comportamento))
+        except (AttributeError, TypeError):
+            # JSON válido que não é um objeto (lista, número...)
+            raise ValueError('comportamento inválido')
+
+    return (
+        _valor(registro, 'nome'),
+        _valor(registro, 'idade'),
+        _valor(registro, 'raca'),
+        _valor(registro, 'especie'),
+        _valor(registro, 'saude') or '',
+        comportamento,
+        _valor(registro, 'data'),
+        _valor(registro, 'status') or 'Disponível',
+        tags[comportamento],
+        _valor(registro, 'porte'),
+    )
+
+
+def _preparar_adotante(registro, contexto):
+    _obrigatorios(registro, ['nome', 'email'])
+    valores = tuple(_valor(registro, c) for c in COLUNAS_ADOTANTE)
+    return valores + (_valor(registro, 'data_cadastro'),)
+
+
+def _preparar_tarefa(registro, contexto):
+    _obrigatorios(registro, ['animal_id', 'tarefa', 'data', 'responsavel'])
+    animal_id = _valor(registro, 'animal_id')
+    tarefa = _valor(registro, 'tarefa')
+    nomes = contexto['nomes_animais']
+
+    if tarefa not in TIPOS_TAREFA:
+        raise ValueError(f'Tipo de tarefa inválido. Válidos: {", ".join(TIPOS_TAREFA)}')
+    if animal_id not in nomes:
+        raise ValueError(f'Animal com ID {animal_id} não encontrado')
+
+    return (
+        animal_id,
+        _valor(registro, 'nome') or nomes[animal_id],
+        tarefa,
+        normalizar_data(_valor(registro, 'data')),
+        _valor(registro, 'responsavel'),
+    )
+
+
+PREPARADORES = {
+    'animais': _preparar_animal,
+    'adotantes': _preparar_adotante,
+    'tarefas': _preparar_tarefa,
+}
+
+
+# ==================== IMPORTAÇÃO ====================
+
+def _preparar_lote(entidade, lote, conn, erros):
+    # Valida linha a linha para que um erro não derrube o lote inteiro
+    preparador = PREPARADORES[entidade]
+    contexto = _contexto_lote(entidade, lote, conn)
+    validas = []
+
+    for numero, registro in lote:
+        if isinstance(registro, Exception):
+            erros.append({'linha': numero, 'erro': str(registro)})
+            continue
+        try:
+            validas.append((numero, preparador(registro, contexto)))
+        except ValueError as e:
+            erros.append({'linha': numero, 'erro': str(e)})
+    return validas
+
+
+def _inserir_lote(conn, sql, linhas, erros):
+    """Insere o lote numa transação; se falhar, tenta linha a linha"""
+    try:
+        with conn:
+            conn.executemany(sql, [valores for _, valores in linhas])
+            ultimo = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        # Dentro da mesma transação os ids são consecutivos
+        return list(range(ultimo - len(linhas) + 1, ultimo + 1))
+    except sqlite3.DatabaseError:
+        pass
+
+    ids = []
+    for numero, valores in linhas:
+        try:
+            with conn:
+                cur = conn.execute(sql, valores)
+            ids.append(cur.lastrowid)
+        except sqlite3.DatabaseError as e:
+            erros.append({'linha': numero, 'erro': str(e)})
+    return ids
+
+
+def importar_registros(entidade, registros, tamanho_lote=TAMANHO_LOTE):
+    """Importa um iterável de (numero_linha, dict) em transações por lote.
+
+    Retorna {'total', 'inseridos', 'erros': [{'linha', 'erro'}]}.
+    """
+    if entidade not in SQL_INSERCAO:
+        raise ValueError(f'Entidade desconhecida: {entidade}')
+
+    conn = obter_conexao()
+    sql = SQL_INSERCAO[entidade]
+    relatorio = {'total': 0, 'inseridos': 0, 'erros': []}
+
+    def processar(lote):
+        linhas = _preparar_lote(entidade, lote, conn, relatorio['erros'])
+        if not linhas:
+            return
+        ids = _inserir_lote(conn, sql, linhas, relatorio['erros'])
+        relatorio['inseridos'] += len(ids)
+        if ids:
+            notificar(entidade, 'importado', ids)
+
+    lote = []
+    for numero, registro in registros:
+        relatorio['total'] += 1
+        lote.append((numero, registro))
+        if len(lote) >= tamanho_lote:
+            processar(lote)
+            lote = []
+    if lote:
+        processar(lote)
+
+    relatorio['erros'].sort(key=lambda e: e['linha'])
+    return relatorio
+
+
+def importar_arquivo(entidade, arquivo, formato, tamanho_lote=TAMANHO_LOTE):
+    return importar_registros(entidade, ler_registros(arquivo, formato), tamanho_lote)
+
+
+# ==================== EXPORTAÇÃO ====================
+
+def exportar(entidade, formato='ndjson', tamanho_lote=TAMANHO_LOTE):
+    """Gera o conteúdo da tabela em pedaços de texto (CSV ou NDJSON)"""
+    if entidade not in SQL_INSERCAO:
+        raise ValueError(f'Entidade desconhecida: {entidade}')
+    if formato not in ('csv', 'ndjson'):
+        raise ValueError(f'Formato desconhecido: {formato}')
+
+    cur = obter_conexao().cursor()
+    cur.execute(f"SELECT * FROM {entidade} ORDER BY id")
+    colunas = [d[0] for d in cur.description]
+
+    if formato == 'csv':
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(colunas)
+        yield buffer.getvalue()
+
+    while True:
+        linhas = cur.fetchmany(tamanho_lote)
+        if not linhas:
+            break
+
+        if formato == 'ndjson':
+            yield ''.join(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + '\n' for linha in linhas)
+        else:
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            escritor.writerows(tuple(linha) for linha in linhas)
+            yield buffer.getvalue()
+
+
+# ==================== LINHA DE COMANDO ====================
+
+def _formato_do_arquivo(caminho, formato):
+    if formato:
+        return formato
+    return 'csv' if caminho.lower().endswith('.csv') else 'ndjson'
+
+
+def main(argv=None):
+    from animal_crud import criar_tabela as criar_tabela_animais
+    from TAREFAS_CRUD import criar_tabela as criar_tabela_tarefas
+    from adotantes_crud import criar_tabela as criar_tabela_adotantes
+    from indice_compatibilidade import criar_tabela as criar_tabela_compatibilidade
+
+    parser = argparse.ArgumentParser(description='Importação/exportação em massa do Amigo+')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    imp = sub.add_parser('importar', help='Importa registros de um arquivo CSV/NDJSON')
+    imp.add_argument('entidade', choices=sorted(SQL_INSERCAO))
+    imp.add_argument('arquivo')
+    imp.add_argument('--formato', choices=['csv', 'ndjson'])
+    imp.add_argument('--lote', type=int, default=TAMANHO_LOTE)
+
+    exp = sub.add_parser('exportar', help='Exporta uma tabela em CSV/NDJSON')
+    exp.add_argument('entidade', choices=sorted(SQL_INSERCAO))
+    exp.add_argument('--formato', choices=['csv', 'ndjson'], default='ndjson')
+    exp.add_argument('-o', '--saida', help='Arquivo de saída (padrão: stdout)')
+
+    args = parser.parse_args(argv)
+
+    criar_tabela_animais()
+    criar_tabela_tarefas()
+    criar_tabela_adotantes()
+    criar_tabela_compatibilidade()
+
+    if args.comando == 'importar':
+        formato = _formato_do_arquivo(args.arquivo, args.formato)
+        with open(args.arquivo, encoding='utf-8', newline='') as arquivo:
+            relatorio = importar_arquivo(args.entidade, arquivo, formato, args.lote)
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+        return 0 if not relatorio['erros'] else 1
+
+    saida = open(args.saida, 'w', encoding='utf-8', newline='') if args.saida else sys.stdout
+    try:
+        for pedaco in exportar(args.entidade, args.formato):
+            saida.write(pedaco)
+    finally:
+        if args.saida:
+            saida.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
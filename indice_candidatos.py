@@ -0,0 +1,279 @@
+"""
+indice_candidatos.py - Índice invertido dos animais disponíveis, para o matching
+
+Para cada porte, faixa de idade, espécie e tag de personalidade o índice
+guarda os ids dos animais disponíveis que a têm. Com ele o matching agrupa
+os candidatos pelas preferências do adotante (porte, idade e tags ideais)
+que eles deixam de atender: quem atende a todas é pontuado primeiro, os
+outros grupos só enquanto ainda puderem entrar no resultado e, no modo
+estrito, nenhum outro.
+
+Junto com as listas fica uma árvore KD dos vetores de traços (arvore_kd.py),
+para filtrar por score de traços e achar os animais mais parecidos. A árvore
+é estática: escritas posteriores ficam num buffer varrido a cada consulta e
+ela é refeita quando o buffer passa de LIMITE_PENDENTES.
+
+O índice é montado na primeira consulta, atualizado pelos eventos de escrita
+em animais e remontado depois de TTL_PADRAO segundos (escritas feitas por
+outros processos).
+"""
+
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from arvore_kd import ArvoreKD
+from cache import TTL_PADRAO
+from conexao import obter_conexao
+from eventos import registrar_ouvinte
+from registros import Animal, TRACOS
+
+STATUS_DISPONIVEL = 'Disponível'
+
+# Faixas de idade, com os mesmos limites de calcular_score_preferencias
+FAIXAS_IDADE = ('filhote', 'jovem', 'adulto', 'idoso')
+
+# Acima disso uma escrita em lote remonta o índice em vez de atualizar id a id
+LIMITE_ATUALIZACAO = 500
+
+# Chave das listas para animais sem porte e sem tags
+SEM_VALOR = ''
+
+# Escritas acumuladas fora da árvore de traços antes de ela ser refeita
+LIMITE_PENDENTES = 256
+
+_lock = threading.Lock()
+_animais = {}
+_listas = {
+    'porte': defaultdict(set),
+    'faixa': defaultdict(set),
+    'especie': defaultdict(set),
+    'tag': defaultdict(set)
+}
+_montado_em = None
+# Muda a cada montagem ou escrita aplicada (ver animais_disponiveis)
+_geracao = 0
+
+# Árvore dos traços e o que mudou desde que ela foi montada
+_arvore = None
+_pendentes = {}
+_fora_da_arvore = set()
+
+
+def faixa_idade(idade):
+    try:
+        idade = float(idade or 0)
+    except (TypeError, ValueError):
+        return None
+    if idade <= 1:
+        return 'filhote'
+    if idade <= 3:
+        return 'jovem'
+    if idade <= 7:
+        return 'adulto'
+    return 'idoso'
+
+
+def _chaves(animal):
+    porte = (animal.get('porte') or '').lower()
+    nomes_tags = [t.get('name') for t in animal.get('tags') or []]
+    chaves = [
+        ('porte', porte or SEM_VALOR),
+        ('faixa', faixa_idade(animal.get('idade'))),
+        ('especie', (animal.get('especie') or '').lower())
+    ]
+    chaves.extend(('tag', nome) for nome in nomes_tags or [SEM_VALOR])
+    return chaves
+
+
+def _remover(animal_id):
+    animal = _animais.pop(animal_id, None)
+    if animal is None:
+        return
+    _pendentes.pop(animal_id, None)
+    _fora_da_arvore.add(animal_id)
+    for campo, valor in _chaves(animal):
+        ids = _listas[campo].get(valor)
+        if ids is not None:
+            ids.discard(animal_id)
+            if not ids:
+                del _listas[campo][valor]
+
+
+def _adicionar(animal):
+    _animais[animal.id] = animal
+    for campo, valor in _chaves(animal):
+        _listas[campo][valor].add(animal.id)
+
+
+def _ler_disponiveis(ids=None):
+    cur = obter_conexao().cursor()
+    if ids is None:
+        cur.execute("SELECT * FROM animais WHERE status = ? ORDER BY id", (STATUS_DISPONIVEL,))
+    else:
+        marcadores = ', '.join('?' for _ in ids)
+        cur.execute(
+            f"SELECT * FROM animais WHERE status = ? AND id IN ({marcadores})",
+            [STATUS_DISPONIVEL, *ids]
+        )
+    return list(Animal.do_cursor(cur))
+
+
+def _montar_arvore():
+    # Chamado com _lock
+    global _arvore
+    _arvore = ArvoreKD(list(_animais), [_animais[i].tracos for i in _animais])
+    _pendentes.clear()
+    _fora_da_arvore.clear()
+
+
+def montar_indice():
+    """(Re)lê todos os animais disponíveis e refaz as listas e a árvore de traços"""
+    global _montado_em, _geracao
+    animais = _ler_disponiveis()
+    with _lock:
+        _animais.clear()
+        for listas in _listas.values():
+            listas.clear()
+        for animal in animais:
+            _adicionar(animal)
+        _montar_arvore()
+        _montado_em = time.monotonic()
+        _geracao += 1
+
+
+def _garantir_indice():
+    if _montado_em is None or time.monotonic() - _montado_em > TTL_PADRAO:
+        montar_indice()
+
+
+def descartar_indice():
+    global _montado_em
+    with _lock:
+        _montado_em = None
+
+
+def _ao_escrever_animal(acao, animal_id):
+    global _geracao
+    if _montado_em is None:
+        return
+
+    ids = animal_id if isinstance(animal_id, list) else [animal_id]
+    if len(ids) > LIMITE_ATUALIZACAO:
+        descartar_indice()
+        return
+
+    # Animal que deixou de estar disponível simplesmente não volta ao índice
+    animais = [] if acao == 'removido' else _ler_disponiveis(ids)
+    with _lock:
+        for registro_id in ids:
+            _remover(registro_id)
+        for animal in animais:
+            _adicionar(animal)
+            _pendentes[animal.id] = animal.tracos
+        _geracao += 1
+
+
+registrar_ouvinte('animais', _ao_escrever_animal)
+
+
+# ==================== CONSULTA ====================
+
+def geracao_indice():
+    """Geração atual do índice (montado, se preciso); igual enquanto os animais não mudarem"""
+    _garantir_indice()
+    return _geracao
+
+
+def animais_disponiveis():
+    """(geração, animais disponíveis em ordem de id), lidos do índice"""
+    _garantir_indice()
+    with _lock:
+        return _geracao, [_animais[animal_id] for animal_id in sorted(_animais)]
+
+
+def _criterios(adotante):
+    """Ids que atendem cada preferência declarada: {'porte'|'idade'|'tags': ids}.
+
+    Animal sem porte ou sem tags não perde pontos nesses critérios, por isso
+    conta como atendendo.
+    """
+    criterios = {}
+
+    tamanho = str(adotante.get('tamanho_preferido') or '').lower()
+    if tamanho:
+        criterios['porte'] = _listas['porte'].get(tamanho, set()) | _listas['porte'].get(SEM_VALOR, set())
+
+    idade = str(adotante.get('idade_preferida') or '').lower()
+    if idade in FAIXAS_IDADE:
+        criterios['idade'] = _listas['faixa'].get(idade, set())
+
+    tags_ideais = adotante.get('tags_ideais') or []
+    if tags_ideais:
+        ids = set(_listas['tag'].get(SEM_VALOR, set()))
+        for nome in tags_ideais:
+            ids |= _listas['tag'].get(nome, set())
+        criterios['tags'] = ids
+
+    return criterios
+
+
+def separar_candidatos(adotante, especie=None):
+    """Animais disponíveis agrupados pelos critérios do adotante em que falham.
+
+    Devolve [(falhas, animais)], com `falhas` uma tupla ordenada de nomes
+    ('idade', 'porte', 'tags') e os animais de cada grupo em ordem de id. O
+    grupo sem falhas (os preferidos) vem primeiro. `especie` restringe todos
+    os grupos à espécie informada.
+    """
+    _garantir_indice()
+    with _lock:
+        if especie:
+            ids = sorted(_listas['especie'].get(especie.lower(), set()))
+        else:
+            ids = sorted(_animais)
+
+        criterios = sorted(_criterios(adotante).items())
+        grupos = {(): []}
+        for animal_id in ids:
+            falhas = tuple(nome for nome, atendem in criterios if animal_id not in atendem)
+            grupos.setdefault(falhas, []).append(_animais[animal_id])
+
+    return sorted(grupos.items(), key=lambda grupo: len(grupo[0]))
+
+
+def _consultar_arvore():
+    # Chamado com _lock; refaz a árvore se o buffer de escritas cresceu demais
+    if len(_pendentes) + len(_fora_da_arvore) > LIMITE_PENDENTES:
+        _montar_arvore()
+    return _arvore
+
+
+def filtrar_por_tracos(vetor, minimo):
+    """Ids dos animais disponíveis com score de traços >= minimo para o vetor de preferências"""
+    _garantir_indice()
+    raio = len(TRACOS) * (100 - minimo)
+    with _lock:
+        ids, _ = _consultar_arvore().no_raio(vetor, raio)
+        aceitos = set(ids.tolist()) - _fora_da_arvore
+        for animal_id, tracos in _pendentes.items():
+            if np.abs(np.subtract(tracos, vetor)).sum() <= raio:
+                aceitos.add(animal_id)
+    return aceitos
+
+
+def animais_similares(vetor, k, excluir=None):
+    """Os k animais disponíveis de traços mais próximos do vetor: [(animal, score de traços)].
+
+    O score é o mesmo de calcular_score_tracos (100 menos a distância L1
+    média); empates vão para o menor id. `excluir` tira um id do resultado.
+    """
+    _garantir_indice()
+    with _lock:
+        fora = _fora_da_arvore | {excluir}
+        proximos = _consultar_arvore().mais_proximos(vetor, k, fora)
+        for animal_id, tracos in _pendentes.items():
+            if animal_id != excluir:
+                proximos.append((float(np.abs(np.subtract(tracos, vetor)).sum()), animal_id))
+        proximos = sorted(proximos)[:k]
+        return [(_animais[animal_id], 100 - distancia / len(TRACOS)) for distancia, animal_id in proximos]
@@ -0,0 +1,300 @@
+"""
+indice_compatibilidade.py - Tabela persistente de scores animal x adotante
+
+Guarda o resultado de calcular_compatibilidade para todos os pares em
+amigo.db. As rotas de matches apenas leem e ordenam linhas prontas; cada
+escrita em animais/adotantes recalcula somente a linha ou coluna afetada.
+"""
+
+import json
+from conexao import obter_conexao
+from eventos import registrar_ouvinte
+from matching_lote import compatibilidades_lote
+from registros import Animal, Adotante
+import versoes
+
+# Quantos adotantes pontuar por bloco na reconstrução completa
+TAMANHO_BLOCO = 256
+
+_indice_verificado = False
+
+
+def criar_tabela():
+    conn = obter_conexao()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS compatibilidade (
+            animal_id INTEGER NOT NULL,
+            adotante_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            detalhes TEXT NOT NULL,
+            PRIMARY KEY (animal_id, adotante_id)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_compatibilidade_adotante
+        ON compatibilidade (adotante_id, score DESC)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_compatibilidade_animal
+        ON compatibilidade (animal_id, score DESC)
+    """)
+    conn.commit()
+    versoes.criar_tabela()
+
+
+def _linha(animal, adotante, compat):
+    # O score vai para coluna própria (filtro/ordenação); o resto em JSON
+    detalhes = {
+        'level': compat['level'],
+        'trait_scores': compat['trait_scores'],
+        'moradia_score': compat['moradia_score'],
+        'rotina_score': compat['rotina_score'],
+        'preferencias_score': compat['preferencias_score']
+    }
+    return (animal['id'], adotante['id'], compat['score'], json.dumps(detalhes, ensure_ascii=False))
+
+
+def linhas_compatibilidade(animais, adotantes):
+    """Linhas (animal_id, adotante_id, score, detalhes) de todos os pares"""
+    return [_linha(a, d, c) for a, d, c in compatibilidades_lote(animais, adotantes)]
+
+
+def gravar_linhas(conn, linhas):
+    conn.executemany(
+        "INSERT OR REPLACE INTO compatibilidade(animal_id, adotante_id, score, detalhes) VALUES (?, ?, ?, ?)",
+        linhas
+    )
+    versoes.incrementar(conn, 'compatibilidade')
+    return len(linhas)
+
+
+def _gravar(conn, animais, adotantes):
+    return gravar_linhas(conn, linhas_compatibilidade(animais, adotantes))
+
+
+def reconstruir_indice():
+    """Recalcula todos os pares animal x adotante"""
+    from animal_crud import ler_animais_registros
+    from adotantes_crud import ler_adotantes_registros
+
+    global _indice_verificado
+
+    animais = ler_animais_registros()
+    adotantes = ler_adotantes_registros()
+
+    conn = obter_conexao()
+    with conn:
+        conn.execute("DELETE FROM compatibilidade")
+        total = 0
+        for inicio in range(0, len(adotantes), TAMANHO_BLOCO):
+            total += _gravar(conn, animais, adotantes[inicio:inicio + TAMANHO_BLOCO])
+
+    _indice_verificado = True
+    return total
+
+
+def garantir_indice():
+    """Reconstrói o índice se ele não cobrir todos os pares atuais"""
+    global _indice_verificado
+
+    if _indice_verificado:
+        return
+
+    cur = obter_conexao().cursor()
+    cur.execute("SELECT (SELECT COUNT(*) FROM animais) * (SELECT COUNT(*) FROM adotantes)")
+    esperado = cur.fetchone()[0]
+    cur.execute("SELECT COUNT(*) FROM compatibilidade")
+    existente = cur.fetchone()[0]
+
+    if esperado != existente:
+        reconstruir_indice()
+    _indice_verificado = True
+
+
+def indice_pronto():
+    """Indica se o índice já foi verificado/reconstruído neste processo"""
+    return _indice_verificado
+
+
+# ==================== MANUTENÇÃO INCREMENTAL ====================
+
+def recalcular_animal(animal_id):
+    from animal_crud import ler_animal_registro
+    from adotantes_crud import ler_adotantes_registros
+
+    animal = ler_animal_registro(animal_id)
+    if not animal:
+        return remover_animal_indice(animal_id)
+
+    conn = obter_conexao()
+    with conn:
+        _gravar(conn, [animal], ler_adotantes_registros())
+
+
+def recalcular_adotante(adotante_id):
+    from animal_crud import ler_animais_registros
+    from adotantes_crud import ler_adotante_registro
+
+    adotante = ler_adotante_registro(adotante_id)
+    if not adotante:
+        return remover_adotante_indice(adotante_id)
+
+    conn = obter_conexao()
+    with conn:
+        _gravar(conn, ler_animais_registros(), [adotante])
+
+
+def ler_por_ids(tabela, tipo, ids):
+    """Registros (Animal/Adotante) dos ids informados"""
+    cur = obter_conexao().cursor()
+    marcadores = ', '.join('?' for _ in ids)
+    cur.execute(f"SELECT * FROM {tabela} WHERE id IN ({marcadores})", list(ids))
+    return list(tipo.do_cursor(cur))
+
+
+def recalcular_animais(animal_ids):
+    """Pontua de uma vez um lote de animais (ex.: importação em massa)"""
+    from adotantes_crud import ler_adotantes_registros
+
+    animais = ler_por_ids('animais', Animal, animal_ids)
+    if not animais:
+        return
+
+    conn = obter_conexao()
+    with conn:
+        _gravar(conn, animais, ler_adotantes_registros())
+
+
+def recalcular_adotantes(adotante_ids):
+    """Pontua de uma vez um lote de adotantes (ex.: importação em massa)"""
+    from animal_crud import ler_animais_registros
+
+    adotantes = ler_por_ids('adotantes', Adotante, adotante_ids)
+    if not adotantes:
+        return
+
+    conn = obter_conexao()
+    with conn:
+        _gravar(conn, ler_animais_registros(), adotantes)
+
+
+def remover_animal_indice(animal_id):
+    conn = obter_conexao()
+    with conn:
+        conn.execute("DELETE FROM compatibilidade WHERE animal_id = ?", (animal_id,))
+        versoes.incrementar(conn, 'compatibilidade')
+
+
+def remover_adotante_indice(adotante_id):
+    conn = obter_conexao()
+    with conn:
+        conn.execute("DELETE FROM compatibilidade WHERE adotante_id = ?", (adotante_id,))
+        versoes.incrementar(conn, 'compatibilidade')
+
+
+def _ao_escrever_animal(acao, animal_id):
+    global _indice_verificado
+    try:
+        if acao == 'removido':
+            remover_animal_indice(animal_id)
+        elif acao == 'importado':
+            recalcular_animais(animal_id)
+        else:
+            recalcular_animal(animal_id)
+    except Exception:
+        # Força verificação completa na próxima leitura
+        _indice_verificado = False
+        raise
+
+
+def _ao_escrever_adotante(acao, adotante_id):
+    global _indice_verificado
+    try:
+        if acao == 'removido':
+            remover_adotante_indice(adotante_id)
+        elif acao == 'importado':
+            recalcular_adotantes(adotante_id)
+        else:
+            recalcular_adotante(adotante_id)
+    except Exception:
+        _indice_verificado = False
+        raise
+
+
+registrar_ouvinte('animais', _ao_escrever_animal)
+registrar_ouvinte('adotantes', _ao_escrever_adotante)
+
+
+# ==================== LEITURA ====================
+
+def _separar_compatibilidade(linha):
+    registro = dict(linha)
+    compat = {'score': registro.pop('c_score')}
+    compat.update(json.loads(registro.pop('c_detalhes')))
+    return registro, compat
+
+
+def iterar_matches_adotante(adotante_id, min_score=50, limit=None, offset=0, especie=None):
+    """Animais disponíveis compatíveis (da espécie, se informada), já ordenados por score"""
+    from animal_crud import preparar_animal_dict
+
+    # Espécie comparada em minúsculas do Python, como no índice de candidatos e na prévia
+    especie = especie.lower() if especie else None
+
+    cur = obter_conexao().cursor()
+    cur.execute("""
+        SELECT a.*, c.score AS c_score, c.detalhes AS c_detalhes
+        FROM compatibilidade c
+        JOIN animais a ON a.id = c.animal_id
+        WHERE c.adotante_id = ? AND c.score >= ? AND a.status = 'Disponível'
+          AND (? IS NULL OR minusculas(a.especie) = ?)
+        ORDER BY c.score DESC, a.id
+        LIMIT ? OFFSET ?
+    """, (adotante_id, min_score, especie, especie, -1 if limit is None else limit, offset))
+
+    for linha in cur:
+        animal, compat = _separar_compatibilidade(linha)
+        yield preparar_animal_dict(animal), compat
+
+
+def ler_scores_adotante(adotante_id, min_score=50, limit=None, especie=None):
+    """Pares (animal_id, score) de iterar_matches_adotante, sem montar os animais"""
+    especie = especie.lower() if especie else None
+    cur = obter_conexao().execute("""
+        SELECT c.animal_id, c.score
+        FROM compatibilidade c
+        JOIN animais a ON a.id = c.animal_id
+        WHERE c.adotante_id = ? AND c.score >= ? AND a.status = 'Disponível'
+          AND (? IS NULL OR minusculas(a.especie) = ?)
+        ORDER BY c.score DESC, a.id
+        LIMIT ?
+    """, (adotante_id, min_score, especie, especie, -1 if limit is None else limit))
+    return cur.fetchall()
+
+
+def iterar_matches_animal(animal_id, min_score=50, limit=None, offset=0):
+    """Adotantes compatíveis com o animal, já ordenados por score (gerados sob demanda)"""
+    from adotantes_crud import preparar_adotante_dict
+
+    cur = obter_conexao().cursor()
+    cur.execute("""
+        SELECT d.*, c.score AS c_score, c.detalhes AS c_detalhes
+        FROM compatibilidade c
+        JOIN adotantes d ON d.id = c.adotante_id
+        WHERE c.animal_id = ? AND c.score >= ?
+        ORDER BY c.score DESC, d.data_cadastro DESC, d.id
+        LIMIT ? OFFSET ?
+    """, (animal_id, min_score, -1 if limit is None else limit, offset))
+
+    for linha in cur:
+        adotante, compat = _separar_compatibilidade(linha)
+        yield preparar_adotante_dict(adotante), compat
+
+
+def ler_matches_adotante(adotante_id, min_score=50, limit=None, offset=0):
+    return list(iterar_matches_adotante(adotante_id, min_score, limit, offset))
+
+
+def ler_matches_animal(animal_id, min_score=50, limit=None, offset=0):
+    return list(iterar_matches_animal(animal_id, min_score, limit, offset))
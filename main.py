@@ -1,5 +1,9 @@
-from flask import Flask, render_template, request, jsonify
-from datetime import datetime
+import io
+import os
+import time
+from functools import wraps
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from datetime import date, datetime
 from animal_crud import (
     criar_tabela as criar_tabela_animais,
     ler_animais,
@@ -7,18 +11,25 @@ from animal_crud import (
     remover_animal,
     editar_animal,
     ler_animal_id,
-    preparar_animal_para_api
+    ler_animais_pagina,
+    buscar_animais,
+    filtrar_animais,
+    preparar_animal_para_api,
+    CAMPOS_DERIVADOS as CAMPOS_DERIVADOS_ANIMAL
 )
 from TAREFAS_CRUD import (
     criar_tabela as criar_tabela_tarefas,
     ler_tarefas,
-    ler_tarefas_por_animal,
+    ler_tarefas_pagina,
+    ler_proximas_tarefas,
+    normalizar_data,
     adicionar_tarefas,
     remover_tarefa,
     editar_tarefa,
     ler_tarefa_id,
     remover_tarefas_por_animal,
-    contar_tarefas_animal
+    contar_tarefas_animal,
+    resumir_tarefas_animais
 )
 from adotantes_crud import (
     criar_tabela as criar_tabela_adotantes,
@@ -27,106 +38,125 @@ from adotantes_crud import (
     adicionar_adotante,
     atualizar_adotante,
     deletar_adotante,
+    ler_adotantes_pagina,
     preparar_adotante_para_api,
-    buscar_adotante_por_email
+    buscar_adotante_por_email,
+    CAMPOS_DERIVADOS as CAMPOS_DERIVADOS_ADOTANTE
 )
 from matching_engine import (
     calcular_compatibilidade,
-    obter_matches_adotante,
-    obter_matches_animal
+    gerar_matches_adotante,
+    gerar_matches_animal
+)
+import conexao
+import cache
+import matching_lote
+import metricas
+import versoes
+from indice_compatibilidade import (
+    criar_tabela as criar_tabela_compatibilidade,
+    garantir_indice,
+    indice_pronto
+)
+from indice_candidatos import animais_similares
+from previa_matching import prever_matches
+from alocacao import alocar, K_PADRAO
+from registros import tracos_animal
+from importacao import importar_arquivo, exportar, SQL_INSERCAO
+from novos_matches import (
+    criar_tabela as criar_tabela_novos_matches,
+    ler_novos_matches,
+    ultimo_id as ultimo_novo_match
+)
+from estatisticas import calcular_estatisticas
+from paginacao import (
+    LIMITE_MAXIMO,
+    ler_campos,
+    resolver_colunas,
+    projetar,
+    codificar_cursor,
+    decodificar_cursor
 )
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 app.config['JSON_AS_ASCII'] = False
+app.config['POOL_CONEXOES'] = conexao.TAMANHO_POOL
+conexao.init_app(app)
 
-try:
-    criar_tabela_animais()
-    criar_tabela_tarefas()
-    criar_tabela_adotantes()
-except Exception as e:
-    print(f"Erro ao inicializar tabelas: {e}")
+# Instrumentação opcional (ver metricas.py): AMIGO_METRICAS=1
+if os.environ.get('AMIGO_METRICAS') == '1':
+    metricas.init_app(app)
 
+# AMIGO_CONSTRUIR_INDICE=0: bases grandes, índice gerado à parte (reprocessamento.py);
+# enquanto isso o matching calcula os scores na hora
+CONSTRUIR_INDICE = os.environ.get('AMIGO_CONSTRUIR_INDICE', '1') != '0'
 
-# ==================== FUNÇÕES AUXILIARES ====================
 
-def calcular_dias_ate_tarefa(data_tarefa_str):
+def inicializar_banco():
+    """Cria/migra as tabelas e verifica o índice de compatibilidade (idempotente)"""
     try:
-        data_tarefa = None
-        if isinstance(data_tarefa_str, str):
-            try:
-                data_tarefa = datetime.strptime(data_tarefa_str, '%Y-%m-%d').date()
-            except ValueError:
-                try:
-                    data_tarefa = datetime.strptime(data_tarefa_str, '%d/%m/%Y').date()
-                except ValueError:
-                    return {'dias': '?', 'status': 'erro', 'mensagem': 'Data inválida', 'urgente': False}
-
-        hoje = datetime.now().date()
-        dias_faltando = (data_tarefa - hoje).days
-
-        if dias_faltando < 0:
-            return {
-                'dias': abs(dias_faltando),
-                'status': 'atrasado',
-                'mensagem': f'⚠️ Atrasado por {abs(dias_faltando)} dias',
-                'urgente': True
-            }
-        elif dias_faltando == 0:
-            return {
-                'dias': 0,
-                'status': 'hoje',
-                'mensagem': '🔴 Vence HOJE',
-                'urgente': True
-            }
-        elif dias_faltando <= 7:
-            return {
-                'dias': dias_faltando,
-                'status': 'urgente',
-                'mensagem': f'🟡 {dias_faltando} dia{"s" if dias_faltando != 1 else ""}',
-                'urgente': True
-            }
-        elif dias_faltando <= 30:
-            return {
-                'dias': dias_faltando,
-                'status': 'proximo',
-                'mensagem': f'🟢 {dias_faltando} dias',
-                'urgente': False
-            }
-        else:
-            return {
-                'dias': dias_faltando,
-                'status': 'ok',
-                'mensagem': f'✓ {dias_faltando} dias',
-                'urgente': False
-            }
+        criar_tabela_animais()
+        criar_tabela_tarefas()
+        criar_tabela_adotantes()
+        criar_tabela_compatibilidade()
+        if CONSTRUIR_INDICE:
+            garantir_indice()
+        criar_tabela_novos_matches()
     except Exception as e:
-        return {'dias': '?', 'status': 'erro', 'mensagem': 'Erro ao calcular', 'urgente': False}
+        print(f"Erro ao inicializar tabelas: {e}")
+    finally:
+        conexao.liberar_conexao()
 
 
-def obter_proximas_tarefas(animal_id=None):
-    try:
-        # Definir quais tarefas buscar
-        if animal_id:
-            tarefas = ler_tarefas_por_animal(animal_id)
-        else:
-            tarefas = ler_tarefas()
+# Sob um servidor WSGI com preload (ver wsgi.py) isto roda uma vez, no processo mestre
+inicializar_banco()
 
-        # Adicionar contagem regressiva em cada tarefa
-        tarefas_com_contagem = []
 
-        for tarefa in tarefas:
-            contagem = calcular_dias_ate_tarefa(tarefa.get('data', ''))
-
-            # Copiar tarefa e adicionar contagem
-            tarefa_completa = tarefa.copy()
-            tarefa_completa['contagem'] = contagem
+# ==================== FUNÇÕES AUXILIARES ====================
 
-            tarefas_com_contagem.append(tarefa_completa)
+# Quantas tarefas mais urgentes o painel mostra
+TAREFAS_PAINEL = 10
+
+def montar_contagem(tarefa):
+    """Contagem regressiva da tarefa a partir dos dias/faixa calculados no SQL"""
+    dias = tarefa.pop('dias_faltando')
+    status = tarefa.pop('urgencia')
+
+    if status == 'erro':
+        mensagem = 'Erro ao calcular' if tarefa.get('data') is None else 'Data inválida'
+        return {'dias': '?', 'status': 'erro', 'mensagem': mensagem, 'urgente': False}
+
+    if status == 'atrasado':
+        mensagem = f'⚠️ Atrasado por {abs(dias)} dias'
+    elif status == 'hoje':
+        mensagem = '🔴 Vence HOJE'
+    elif status == 'urgente':
+        mensagem = f'🟡 {dias} dia{"s" if dias != 1 else ""}'
+    elif status == 'proximo':
+        mensagem = f'🟢 {dias} dias'
+    else:
+        mensagem = f'✓ {dias} dias'
+
+    return {
+        'dias': abs(dias),
+        'status': status,
+        'mensagem': mensagem,
+        'urgente': status in ('atrasado', 'hoje', 'urgente')
+    }
+
+
+def obter_proximas_tarefas(animal_id=None, limit=None, de=None, ate=None):
+    try:
+        # Dias até o vencimento, faixa de urgência e ordem já vêm do SQL
+        hoje = datetime.now().date().isoformat()
+        tarefas = ler_proximas_tarefas(hoje, animal_id, limit, de, ate)
 
-        # Ordenar tarefas por urgência
-        tarefas_com_contagem = ordenar_tarefas_por_urgencia(tarefas_com_contagem)
+        for tarefa in tarefas:
+            tarefa['contagem'] = montar_contagem(tarefa)
+            dias = tarefa['contagem']['dias']
+            tarefa['dias_numericos'] = dias if isinstance(dias, int) else 999
 
-        return tarefas_com_contagem
+        return tarefas
 
     except Exception as e:
         mensagem_erro = f"Erro ao obter próximas tarefas: {e}"
@@ -134,47 +164,123 @@ def obter_proximas_tarefas(animal_id=None):
         return []
 
 
-def ordenar_tarefas_por_urgencia(tarefas):
-    tarefas_ordenadas = []
-
-    tarefas_copia = tarefas.copy()
-
-    for tarefa in tarefas_copia:
-        dias = tarefa['contagem']['dias']
-
-        if isinstance(dias, int):
-            numero_dias = dias
-        else:
-            numero_dias = 999
-
-        tarefa['dias_numericos'] = numero_dias
-
-    def obter_dias_numericos(tarefa):
-        return tarefa['dias_numericos']
-
-    tarefas_ordenadas = sorted(tarefas_copia, key=obter_dias_numericos)
-
-    return tarefas_ordenadas
+def ler_paginacao():
+    # Lê limit/offset da query string (limit ausente = sem limite)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(limit, 0)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    return limit, offset
+
+
+def ler_parametros_lista():
+    # limit/cursor/fields das listas da API (limit ausente = lista completa)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), LIMITE_MAXIMO)
+    return limit, request.args.get('cursor'), ler_campos(request.args.get('fields'))
+
+
+def responder_lista(itens, campos, limit, chave_cursor):
+    """Lista JSON projetada; o cursor da próxima página vai no header X-Next-Cursor"""
+    resposta = jsonify([projetar(item, campos) for item in itens])
+    if limit is not None and len(itens) == limit:
+        resposta.headers['X-Next-Cursor'] = codificar_cursor(chave_cursor(itens[-1]))
+    return resposta, 200
+
+
+# Formatos das listas de matches: json (lista completa), json-stream (array
+# JSON enviado em partes) e ndjson (um match por linha)
+FORMATOS_MATCHES = {
+    'json': 'application/json',
+    'json-stream': 'application/json',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def ler_formato_matches():
+    # formato/compacto da query string; formato inválido = None
+    formato = request.args.get('formato', 'json')
+    compacto = request.args.get('compacto', '0') in ('1', 'true')
+    return (formato if formato in FORMATOS_MATCHES else None), compacto
+
+
+def _serializar_matches(primeiro, matches, formato):
+    def codificar(match):
+        return app.json.dumps(match, separators=(',', ':'))
+
+    if formato == 'ndjson':
+        yield codificar(primeiro) + '\n'
+        for match in matches:
+            yield codificar(match) + '\n'
+        return
+
+    yield '[' + codificar(primeiro)
+    for match in matches:
+        yield ',' + codificar(match)
+    yield ']'
+
+
+def responder_matches(matches, formato):
+    """Resposta de uma lista de matches gerada sob demanda.
+
+    Em json a lista é montada inteira; nos formatos de streaming cada match
+    é serializado e enviado assim que sai do gerador.
+    """
+    if formato == 'json':
+        return jsonify(list(matches)), 200
+
+    # O primeiro item é lido aqui para que um erro ainda vire resposta 500
+    primeiro = next(matches, None)
+    if primeiro is None:
+        corpo = '' if formato == 'ndjson' else '[]'
+        return Response(corpo, mimetype=FORMATOS_MATCHES[formato]), 200
+
+    return Response(
+        stream_with_context(_serializar_matches(primeiro, matches, formato)),
+        mimetype=FORMATOS_MATCHES[formato]
+    ), 200
+
+
+def ler_incluir():
+    # Dados extras pedidos em incluir=tarefas,... (nomes desconhecidos ficam para a rota)
+    return set(ler_campos(request.args.get('incluir')) or ())
+
+
+def condicional(*tabelas, por_dia=False, incluir=None):
+    """GET com ETag forte derivada das versões das tabelas (ver versoes.py).
+
+    If-None-Match com a ETag atual responde 304 antes de a rota ler qualquer
+    linha; `por_dia` acrescenta a data de hoje (respostas que dependem dela).
+    `incluir` mapeia cada valor aceito em incluir= para (tabelas, por_dia)
+    extras, que só entram na ETag quando o cliente pede aquele dado.
+    """
+    def decorar(rota):
+        @wraps(rota)
+        def envolver(*args, **kwargs):
+            todas, dia = list(tabelas), por_dia
+            for nome in sorted(ler_incluir() & (incluir or {}).keys()):
+                extras, extra_dia = incluir[nome]
+                todas += [tabela for tabela in extras if tabela not in todas]
+                dia = dia or extra_dia
+            etag = versoes.etag(todas, date.today().isoformat() if dia else None)
+            if request.if_none_match.contains(etag):
+                resposta = Response(status=304)
+            else:
+                resposta = app.make_response(rota(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+            resposta.set_etag(etag)
+            # O navegador revalida sempre; quem evita o download é o 304
+            resposta.headers['Cache-Control'] = 'no-cache'
+            return resposta
+        return envolver
+    return decorar
 
 
 def get_dashboard_stats():
     try:
-        animals = ler_animais()
-        tarefas = obter_proximas_tarefas()
-
-        total_animals = len(animals)
-        pending_tasks = len(tarefas)
-
-        urgent_tasks = len([t for t in tarefas if t['contagem']['urgente']])
-
-        in_treatment = len([a for a in animals if "tratamento" in a.get('saude', '').lower()])
-
-        return {
-            'total_animals': total_animals,
-            'pending_tasks': pending_tasks,
-            'urgent_tasks': urgent_tasks,
-            'in_treatment': in_treatment
-        }
+        return calcular_estatisticas()
     except Exception as e:
         print(f"Erro ao calcular estatísticas: {e}")
         return {
@@ -191,7 +297,7 @@ def get_dashboard_stats():
 def dashboard():
     animals = ler_animais()
     stats = get_dashboard_stats()
-    proximas_tarefas = obter_proximas_tarefas()
+    proximas_tarefas = obter_proximas_tarefas(limit=TAREFAS_PAINEL)
 
     return render_template(
         'dashboard.html',
@@ -209,11 +315,13 @@ def dashboard():
 def animals_page():
     animals = ler_animais()
     stats = get_dashboard_stats()
+    resumo_tarefas = resumir_tarefas_animais(date.today().isoformat())
 
     return render_template(
         'animals.html',
         page='animals',
         animals=animals,
+        resumo_tarefas=resumo_tarefas,
         total_animals=stats['total_animals'],
         pending_tasks=stats['pending_tasks'],
         in_treatment=stats['in_treatment']
@@ -268,12 +376,37 @@ def adotante_matches_page(id):
 # ==================== ROTAS DA API ====================
 
 @app.route('/api/animals', methods=['GET'])
+@condicional('animais', incluir={'tarefas': (('tarefas',), True)})
 def api_get_animals():
+    """Lista animais em ordem de id; aceita limit, cursor, fields e incluir=tarefas"""
     try:
-        animals = ler_animais()
+        limit, cursor, campos = ler_parametros_lista()
+        incluir = ler_incluir()
+        if incluir - {'tarefas'}:
+            return jsonify({'error': 'Valor inválido em incluir. Aceito: tarefas'}), 400
+
+        derivados = CAMPOS_DERIVADOS_ANIMAL
+        if 'tarefas' in incluir:
+            derivados = dict(CAMPOS_DERIVADOS_ANIMAL, tarefas=['id'])
+        try:
+            colunas = resolver_colunas('animais', campos, derivados)
+            apos = decodificar_cursor(cursor, 1)
+            apos_id = int(apos[0]) if apos else None
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        animals = ler_animais_pagina(limit, apos_id, colunas)
         # Aplicar formatação centralizada para cada animal
         animals_formatados = [preparar_animal_para_api(animal) for animal in animals]
-        return jsonify(animals_formatados), 200
+
+        if 'tarefas' in incluir and animals_formatados:
+            # Resumo de tarefas só dos animais da página, numa consulta agrupada
+            ids = None if limit is None and apos_id is None else [a['id'] for a in animals_formatados]
+            resumos = resumir_tarefas_animais(date.today().isoformat(), ids)
+            for animal in animals_formatados:
+                animal['tarefas'] = resumos[animal['id']]
+
+        return responder_lista(animals_formatados, campos, limit, lambda a: [a['id']])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -293,6 +426,26 @@ def api_get_animal(animal_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/animals/<int:animal_id>/similar', methods=['GET'])
+@condicional('animais')
+def api_animais_similares(animal_id):
+    """Animais disponíveis de personalidade mais parecida (score de traços do matching)"""
+    try:
+        animal = ler_animal_id(animal_id)
+        if not animal:
+            return jsonify({'error': 'Animal não encontrado'}), 404
+
+        limit = min(max(request.args.get('limit', 10, type=int), 1), LIMITE_MAXIMO)
+        similares = animais_similares(tracos_animal(animal), limit, excluir=animal_id)
+
+        return jsonify([
+            {'animal': preparar_animal_para_api(similar.para_dict()), 'score': round(score, 1)}
+            for similar, score in similares
+        ]), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/animals/add', methods=['POST'])
 def api_add_animal():
     try:
@@ -383,9 +536,18 @@ def api_edit_animal(animal_id):
 
 @app.route('/api/tasks', methods=['GET'])
 def api_get_tasks():
+    """Lista tarefas em ordem de id; aceita limit, cursor e fields"""
     try:
-        tasks = ler_tarefas()
-        return jsonify(tasks), 200
+        limit, cursor, campos = ler_parametros_lista()
+        try:
+            colunas = resolver_colunas('tarefas', campos)
+            apos = decodificar_cursor(cursor, 1)
+            apos_id = int(apos[0]) if apos else None
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        tasks = ler_tarefas_pagina(limit, apos_id, colunas)
+        return responder_lista(tasks, campos, limit, lambda t: [t['id']])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -517,6 +679,7 @@ def api_edit_task(task_id):
 
 
 @app.route('/api/stats', methods=['GET'])
+@condicional('animais', 'tarefas', por_dia=True)
 def api_get_stats():
     try:
         stats = get_dashboard_stats()
@@ -529,12 +692,51 @@ def api_get_stats():
 def api_proximas_tarefas():
     try:
         animal_id = request.args.get('animal_id', type=int)
-        tarefas = obter_proximas_tarefas(animal_id)
+        limit, _ = ler_paginacao()
+
+        # Janela de datas opcional: de/ate em AAAA-MM-DD ou DD/MM/AAAA
+        janela = {}
+        for parametro in ('de', 'ate'):
+            valor = request.args.get(parametro)
+            if valor:
+                valor = normalizar_data(valor)
+                try:
+                    datetime.strptime(valor, '%Y-%m-%d')
+                except ValueError:
+                    return jsonify({'error': f'Data inválida em {parametro}'}), 400
+            janela[parametro] = valor or None
+
+        tarefas = obter_proximas_tarefas(animal_id, limit, janela['de'], janela['ate'])
         return jsonify(tarefas), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/animals/tarefas-count', methods=['GET'])
+@condicional('animais', 'tarefas', por_dia=True)
+def api_resumir_tarefas_animais():
+    """Resumo de tarefas (count, proxima_data, atrasadas) de vários animais.
+
+    ids=1,2,3 limita aos animais informados; sem ids, vêm todos. Substitui
+    uma chamada a /api/animals/<id>/tarefas-count por card.
+    """
+    try:
+        ids = None
+        if request.args.get('ids'):
+            try:
+                ids = [int(valor) for valor in ler_campos(request.args['ids'])]
+            except ValueError:
+                return jsonify({'error': 'ids deve ser uma lista de inteiros separados por vírgula'}), 400
+            if len(ids) > LIMITE_MAXIMO:
+                return jsonify({'error': f'No máximo {LIMITE_MAXIMO} ids por requisição'}), 400
+
+        resumos = resumir_tarefas_animais(date.today().isoformat(), ids)
+        return jsonify([{'animal_id': animal_id, **resumo} for animal_id, resumo in resumos.items()]), 200
+    except Exception as e:
+        mensagem_erro = f'Erro ao contar tarefas: {str(e)}'
+        return jsonify({'error': mensagem_erro}), 500
+
+
 @app.route('/api/animals/<int:animal_id>/tarefas-count', methods=['GET'])
 def api_contar_tarefas_animal(animal_id):
     try:
@@ -557,20 +759,15 @@ def api_contar_tarefas_animal(animal_id):
 
 @app.route('/api/animals/search', methods=['GET'])
 def api_search_animals():
-    """Busca animais por nome, raça ou espécie"""
+    """Busca animais por nome, raça ou espécie (paginação opcional com limit/offset)"""
     try:
-        query = request.args.get('q', '').lower().strip()
+        query = request.args.get('q', '').strip()
 
         if not query:
             return jsonify([]), 200
 
-        animals = ler_animais()
-
-        # Busca em múltiplos campos
-        filtered = [a for a in animals if
-            query in a['nome'].lower() or
-            query in a['raca'].lower() or
-            query in a['especie'].lower()]
+        limit, offset = ler_paginacao()
+        filtered = buscar_animais(query, limit=limit, offset=offset)
 
         # Aplicar formatação centralizada
         filtered_formatados = [preparar_animal_para_api(animal) for animal in filtered]
@@ -582,23 +779,16 @@ def api_search_animals():
 
 @app.route('/api/animals/filter', methods=['GET'])
 def api_filter_animals():
-    """Filtra animais por espécie, status ou saúde"""
+    """Filtra animais por espécie, status, porte ou saúde (paginação opcional com limit/offset)"""
     try:
         especie = request.args.get('especie', '').strip()
         status = request.args.get('status', '').strip()
         saude = request.args.get('saude', '').strip()
+        porte = request.args.get('porte', '').strip()
 
-        animals = ler_animais()
-
-        # Aplicar filtros sequencialmente
-        if especie:
-            animals = [a for a in animals if a['especie'].lower() == especie.lower()]
-
-        if status:
-            animals = [a for a in animals if a['status'] == status]
-
-        if saude:
-            animals = [a for a in animals if saude.lower() in a['saude'].lower()]
+        limit, offset = ler_paginacao()
+        animals = filtrar_animais(especie=especie, status=status, saude=saude, porte=porte,
+                                  limit=limit, offset=offset)
 
         # Aplicar formatação centralizada
         animals_formatados = [preparar_animal_para_api(animal) for animal in animals]
@@ -612,15 +802,13 @@ def api_filter_animals():
 def api_generate_personality_tags():
     """Gera tags de personalidade baseado em valores de traços (0-100)"""
     try:
-        from animal_crud import gerar_tags_personalidade
-        import json
+        from animal_crud import gerar_tags_de_personalidade
 
         data = request.get_json()
         personalidade = data.get('personalidade', {})
 
-        # Converter para JSON string como esperado pela função
-        comportamento_json = json.dumps(personalidade)
-        tags = gerar_tags_personalidade(comportamento_json)
+        # Consulta direta na tabela de assinaturas, sem ida e volta por JSON
+        tags = gerar_tags_de_personalidade(personalidade)
 
         return jsonify({
             'tags': tags,
@@ -777,12 +965,24 @@ def api_validate_task():
         return jsonify({'error': f'Erro na validação: {str(e)}'}), 500
 
 @app.route('/api/adotantes', methods=['GET'])
+@condicional('adotantes')
 def api_listar_adotantes():
-    """Lista todos os adotantes"""
+    """Lista adotantes (mais recentes primeiro); aceita limit, cursor e fields"""
     try:
-        adotantes = ler_adotantes()
+        limit, cursor, campos = ler_parametros_lista()
+        try:
+            colunas = resolver_colunas('adotantes', campos, CAMPOS_DERIVADOS_ADOTANTE,
+                                       obrigatorias=('id', 'data_cadastro'))
+            apos = decodificar_cursor(cursor, 2)
+            if apos:
+                apos = (apos[0], int(apos[1]))
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        adotantes = ler_adotantes_pagina(limit, apos, colunas)
         adotantes_formatados = [preparar_adotante_para_api(a) for a in adotantes]
-        return jsonify(adotantes_formatados), 200
+        return responder_lista(adotantes_formatados, campos, limit,
+                               lambda a: [a['data_cadastro'], a['id']])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -906,37 +1106,268 @@ def api_score_matching():
 
 
 @app.route('/api/adotantes/<int:adotante_id>/matches', methods=['GET'])
+@condicional('animais', 'adotantes', 'compatibilidade')
 def api_matches_adotante(adotante_id):
-    """Obtém animais compatíveis para um adotante (score >= 50%)"""
+    """Obtém animais compatíveis para um adotante (score >= 50%), com paginação opcional.
+
+    ?formato=json-stream|ndjson envia os matches em streaming; ?compacto=1
+    troca o animal/adotante repetido na compatibilidade pelos ids.
+    ?especie= filtra pela espécie e ?estrito=1 devolve só os animais que
+    atendem porte, idade e tags ideais do adotante.
+    """
     try:
         adotante = ler_adotante_id(adotante_id)
         if not adotante:
             return jsonify({'error': 'Adotante não encontrado'}), 404
 
+        formato, compacto = ler_formato_matches()
+        if formato is None:
+            return jsonify({'error': 'Formato inválido (use json, json-stream ou ndjson)'}), 400
+
         min_score = request.args.get('min_score', 50, type=int)
-        matches = obter_matches_adotante(adotante_id, min_score=min_score)
+        limit, offset = ler_paginacao()
+        especie = request.args.get('especie', '').strip() or None
+        estrito = request.args.get('estrito', '0') in ('1', 'true')
+        matches = gerar_matches_adotante(
+            adotante_id, min_score=min_score, limit=limit, offset=offset, compacto=compacto,
+            especie=especie, estrito=estrito
+        )
 
-        return jsonify(matches), 200
+        return responder_matches(matches, formato)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/matching/animal/<int:animal_id>', methods=['GET'])
+@condicional('animais', 'adotantes', 'compatibilidade')
 def api_matches_animal(animal_id):
-    """Obtém adotantes compatíveis para um animal (score >= 50%)"""
+    """Obtém adotantes compatíveis para um animal (score >= 50%); aceita formato/compacto"""
     try:
         animal = ler_animal_id(animal_id)
         if not animal:
             return jsonify({'error': 'Animal não encontrado'}), 404
 
+        formato, compacto = ler_formato_matches()
+        if formato is None:
+            return jsonify({'error': 'Formato inválido (use json, json-stream ou ndjson)'}), 400
+
         min_score = request.args.get('min_score', 50, type=int)
-        matches = obter_matches_animal(animal_id, min_score=min_score)
+        limit, offset = ler_paginacao()
+        matches = gerar_matches_animal(
+            animal_id, min_score=min_score, limit=limit, offset=offset, compacto=compacto
+        )
 
-        return jsonify(matches), 200
+        return responder_matches(matches, formato)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/matching/preview', methods=['POST'])
+def api_previa_matching():
+    """Top-K de matches para um perfil de adotante ainda não salvo (corpo: campos do adotante).
+
+    Calculado sobre o pacote em memória dos animais disponíveis, sem ler nem
+    gravar no banco; aceita limit, min_score e especie.
+    """
+    try:
+        dados = request.get_json(silent=True)
+        if not isinstance(dados, dict):
+            return jsonify({'error': 'Envie os campos do adotante em JSON'}), 400
+
+        limit = min(max(request.args.get('limit', 10, type=int), 1), LIMITE_MAXIMO)
+        min_score = request.args.get('min_score', 50, type=int)
+        especie = request.args.get('especie', '').strip() or None
+
+        return jsonify(prever_matches(dados, limit, min_score, especie)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/matching/alocacao', methods=['POST'])
+def api_alocacao():
+    """Alocação global (um animal por adotante, no máximo) para feiras de adoção.
+
+    Aceita k, min_score e especie na query e, no corpo JSON opcional, as
+    listas 'animais' e 'adotantes' (ids) que participam.
+    """
+    try:
+        dados = request.get_json(silent=True) or {}
+        if not isinstance(dados, dict):
+            return jsonify({'error': 'O corpo deve ser um objeto JSON'}), 400
+
+        ids = {}
+        for campo in ('animais', 'adotantes'):
+            valor = dados.get(campo)
+            if valor is not None and not (isinstance(valor, list) and all(isinstance(x, int) for x in valor)):
+                return jsonify({'error': f"'{campo}' deve ser uma lista de ids"}), 400
+            ids[campo] = valor
+
+        k = min(max(request.args.get('k', K_PADRAO, type=int), 1), LIMITE_MAXIMO)
+        min_score = request.args.get('min_score', 50, type=int)
+        especie = request.args.get('especie', '').strip() or None
+
+        return jsonify(alocar(k, min_score, especie, ids['animais'], ids['adotantes'])), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# SSE de novos matches: intervalo entre consultas ao feed e duração máxima da
+# conexão (o navegador reconecta sozinho, a partir do último id recebido)
+INTERVALO_SSE = float(os.environ.get('AMIGO_SSE_INTERVALO', '2'))
+DURACAO_SSE = float(os.environ.get('AMIGO_SSE_DURACAO', '300'))
+
+
+@app.route('/api/adotantes/<int:adotante_id>/novos-matches', methods=['GET'])
+@condicional('animais', 'novos_matches')
+def api_novos_matches(adotante_id):
+    """Novos matches do adotante com id > desde (polling).
+
+    Sem ?desde devolve só o cursor atual (ultimo_id), para começar a
+    acompanhar o feed a partir de agora.
+    """
+    try:
+        if not ler_adotante_id(adotante_id):
+            return jsonify({'error': 'Adotante não encontrado'}), 404
+
+        desde = request.args.get('desde', type=int)
+        if desde is None:
+            return jsonify({'matches': [], 'ultimo_id': ultimo_novo_match(adotante_id)}), 200
+
+        limit = min(max(request.args.get('limit', 50, type=int), 1), LIMITE_MAXIMO)
+        matches = ler_novos_matches(adotante_id, desde, limit)
+        return jsonify({
+            'matches': matches,
+            'ultimo_id': matches[-1]['id'] if matches else desde
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _eventos_novos_matches(adotante_id, desde):
+    yield 'retry: 5000\n\n'
+    fim = time.monotonic() + DURACAO_SSE
+    while True:
+        for match in ler_novos_matches(adotante_id, desde):
+            desde = match['id']
+            yield f"id: {desde}\nevent: match\ndata: {app.json.dumps(match, separators=(',', ':'))}\n\n"
+        # Devolve a conexão ao pool enquanto espera
+        conexao.liberar_conexao()
+        if time.monotonic() >= fim:
+            return
+        time.sleep(INTERVALO_SSE)
+        yield ': ping\n\n'
+
+
+@app.route('/api/adotantes/<int:adotante_id>/novos-matches/stream', methods=['GET'])
+def api_novos_matches_stream(adotante_id):
+    """Novos matches do adotante via Server-Sent Events (retoma do Last-Event-ID)"""
+    try:
+        if not ler_adotante_id(adotante_id):
+            return jsonify({'error': 'Adotante não encontrado'}), 404
+
+        desde = request.headers.get('Last-Event-ID', type=int)
+        if desde is None:
+            desde = request.args.get('desde', type=int)
+        if desde is None:
+            desde = ultimo_novo_match(adotante_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    resposta = Response(
+        stream_with_context(_eventos_novos_matches(adotante_id, desde)),
+        mimetype='text/event-stream'
+    )
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
+
+@app.route('/api/_ready', methods=['GET'])
+def api_pronto():
+    """Prontidão para o balanceador: banco acessível e índice de compatibilidade verificado"""
+    try:
+        conexao.obter_conexao().execute("SELECT 1 FROM versoes LIMIT 1").fetchone()
+    except Exception as e:
+        return jsonify({'status': 'indisponivel', 'error': str(e)}), 503
+
+    if CONSTRUIR_INDICE and not indice_pronto():
+        return jsonify({'status': 'aquecendo', 'pid': os.getpid()}), 503
+    return jsonify({'status': 'pronto', 'pid': os.getpid()}), 200
+
+
+@app.route('/api/_cache', methods=['GET'])
+def api_estatisticas_cache():
+    """Acertos, falhas e tamanho de cada cache de leitura"""
+    return jsonify(cache.estatisticas()), 200
+
+
+@app.route('/api/_matching', methods=['GET'])
+def api_estatisticas_matching():
+    """Contadores da deduplicação do cálculo em lote (pares pontuados x pares atendidos)"""
+    return jsonify(matching_lote.estatisticas()), 200
+
+
+@app.route('/api/_metrics', methods=['GET'])
+def api_metricas():
+    """Métricas por rota no formato texto do Prometheus (requer AMIGO_METRICAS=1)"""
+    if not metricas.ativo():
+        return jsonify({'error': 'Métricas desativadas. Inicie com AMIGO_METRICAS=1'}), 404
+    return Response(metricas.exportar_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/_metrics/perfil', methods=['GET'])
+@app.route('/api/_metrics/perfil/<endpoint>', methods=['GET'])
+def api_perfil(endpoint=None):
+    """Pilhas amostradas de um endpoint (requer AMIGO_METRICAS=1 e AMIGO_PERFIL)"""
+    if not metricas.ativo():
+        return jsonify({'error': 'Métricas desativadas. Inicie com AMIGO_METRICAS=1'}), 404
+    if endpoint is None:
+        return jsonify(metricas.endpoints_perfilados()), 200
+    return Response(metricas.exportar_perfil(endpoint), mimetype='text/plain')
+
+
+# ==================== IMPORTAÇÃO / EXPORTAÇÃO EM MASSA ====================
+
+FORMATOS_BULK = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+@app.route('/api/bulk/<entidade>/import', methods=['POST'])
+def api_importar(entidade):
+    """Importa animais, adotantes ou tarefas a partir de CSV/NDJSON no corpo da requisição"""
+    try:
+        if entidade not in SQL_INSERCAO:
+            return jsonify({'error': 'Entidade inválida. Válidas: animais, adotantes, tarefas'}), 400
+
+        formato = request.args.get('formato', 'ndjson')
+        if formato not in FORMATOS_BULK:
+            return jsonify({'error': 'Formato inválido. Válidos: csv, ndjson'}), 400
+
+        # Lê o corpo em fluxo, sem carregar o arquivo inteiro em memória
+        arquivo = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+        relatorio = importar_arquivo(entidade, arquivo, formato)
+
+        return jsonify(relatorio), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/bulk/<entidade>/export', methods=['GET'])
+def api_exportar(entidade):
+    """Exporta uma tabela inteira em CSV/NDJSON, em streaming"""
+    if entidade not in SQL_INSERCAO:
+        return jsonify({'error': 'Entidade inválida. Válidas: animais, adotantes, tarefas'}), 400
+
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in FORMATOS_BULK:
+        return jsonify({'error': 'Formato inválido. Válidos: csv, ndjson'}), 400
+
+    return Response(
+        stream_with_context(exportar(entidade, formato)),
+        mimetype=FORMATOS_BULK[formato],
+        headers={'Content-Disposition': f'attachment; filename={entidade}.{formato}'}
+    )
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Página 404"""
@@ -2,9 +2,27 @@
 matching_engine.py - Algoritmo de compatibilidade entre adotantes e animais
 """
 
-import json
+import heapq
 from adotantes_crud import ler_adotante_id, preparar_adotante_para_api
 from animal_crud import ler_animal_id, preparar_animal_para_api
+from registros import Registro, TRACOS, tracos_animal, tracos_adotante, como_dict
+from indice_candidatos import separar_candidatos, filtrar_por_tracos
+from indice_compatibilidade import (
+    indice_pronto,
+    iterar_matches_adotante as iterar_matches_indice_adotante,
+    iterar_matches_animal as iterar_matches_indice_animal
+)
+
+# Pesos (traços, moradia, rotina, preferências)
+PESOS_COM_TRACOS = (0.10, 0.30, 0.20, 0.40)
+PESOS_SEM_TRACOS = (0.0, 0.50, 0.30, 0.20)
+
+
+def pesos_compatibilidade(adotante):
+    if adotante.get('tem_preferencia_tracos'):
+        return PESOS_COM_TRACOS
+    return PESOS_SEM_TRACOS
+
 
 def calcular_compatibilidade(animal_id, adotante_id):
 
@@ -22,6 +40,14 @@ def calcular_compatibilidade(animal_id, adotante_id):
     if not animal or not adotante:
         return None
 
+    return calcular_compatibilidade_registros(animal, adotante)
+
+
+def normalizar_animal(animal):
+    # Registros já saem do banco normalizados
+    if isinstance(animal, Registro):
+        return animal
+
     # Validar dados essenciais do animal
     if not isinstance(animal.get('personalidade'), dict):
         animal['personalidade'] = {
@@ -33,22 +59,20 @@ def calcular_compatibilidade(animal_id, adotante_id):
     if not isinstance(animal.get('tags'), list):
         animal['tags'] = []
 
+    return animal
+
+
+def calcular_compatibilidade_registros(animal, adotante):
+    """Calcula a compatibilidade a partir de registros já carregados"""
+    normalizar_animal(animal)
 
     trait_score_avg, trait_scores_individual = calcular_score_tracos(animal, adotante)
     moradia_score = calcular_score_moradia(animal, adotante)
     rotina_score = calcular_score_rotina(animal, adotante)
     preferencias_score = calcular_score_preferencias(animal, adotante)
 
-    if adotante.get('tem_preferencia_tracos'):
-        W_TRACOS = 0.10
-        W_MORADIA = 0.30
-        W_ROTINA = 0.20
-        W_PREFERENCIAS = 0.40
-    else:
-        W_TRACOS = 0.0
-        W_MORADIA = 0.50
-        W_ROTINA = 0.30
-        W_PREFERENCIAS = 0.20
+    W_TRACOS, W_MORADIA, W_ROTINA, W_PREFERENCIAS = pesos_compatibilidade(adotante)
+    if not adotante.get('tem_preferencia_tracos'):
         trait_score_avg = 0
         trait_scores_individual = {t: 0 for t in trait_scores_individual}
 
@@ -83,36 +107,21 @@ def calcular_compatibilidade(animal_id, adotante_id):
 
 
 def calcular_score_tracos(animal, adotante):
-    personalidade_animal = animal.get('personalidade', {})
-    tracos_preferidos_str = adotante.get('tracos_preferidos')
-
-    # Se adotante não definiu preferências, usar neutra (50 em tudo)
-    if tracos_preferidos_str:
-        try:
-            if isinstance(tracos_preferidos_str, str):
-                tracos_preferidos = json.loads(tracos_preferidos_str)
-            else:
-                tracos_preferidos = tracos_preferidos_str
-        except (json.JSONDecodeError, TypeError):
-            tracos_preferidos = {t: 50 for t in ['brincalhao', 'afetuoso', 'energetico', 'corajoso', 'obediente', 'sociavel']}
-    else:
-        tracos_preferidos = {t: 50 for t in ['brincalhao', 'afetuoso', 'energetico', 'corajoso', 'obediente', 'sociavel']}
+    # Vetores de 6 posições na ordem de TRACOS; traço não definido vale 50
+    valores_animal = tracos_animal(animal)
+    valores_adotante = tracos_adotante(adotante)
 
-    trait_list = ['brincalhao', 'afetuoso', 'energetico', 'corajoso', 'obediente', 'sociavel']
     total_score = 0
     individual_scores = {}
 
-    for trait in trait_list:
-        animal_value = personalidade_animal.get(trait, 50)
-        adotante_value = tracos_preferidos.get(trait, 50)
-
+    for trait, animal_value, adotante_value in zip(TRACOS, valores_animal, valores_adotante):
         diferenca = abs(animal_value - adotante_value)
         trait_score = 100 - diferenca
         total_score += trait_score
         individual_scores[trait] = trait_score
 
     # Média dos 6 traços
-    avg_score = total_score / len(trait_list)
+    avg_score = total_score / len(TRACOS)
     return avg_score, individual_scores
 
 
@@ -127,11 +136,9 @@ def calcular_score_moradia(animal, adotante):
     nivel_atividade = str(adotante.get('nivel_atividade', '')).lower()
 
     # Se adotante tem espaço pequeno e animal é muito ativo = menos compatível
-    personalidade_animal = animal.get('personalidade', {})
-    if not isinstance(personalidade_animal, dict):
-        personalidade_animal = {}
+    _, _, energetico, _, _, _ = tracos_animal(animal)
 
-    energetico = int(personalidade_animal.get('energetico', 50))
+    energetico = int(energetico)
     energetico = max(0, min(energetico, 100))
 
     if energetico >= 75:
@@ -164,12 +171,10 @@ def calcular_score_rotina(animal, adotante):
 
     viagens_frequentes = bool(adotante.get('viagens_frequentes', False))
 
-    personalidade_animal = animal.get('personalidade', {})
-    if not isinstance(personalidade_animal, dict):
-        personalidade_animal = {}
+    _, afetuoso, _, _, _, sociavel = tracos_animal(animal)
 
-    afetuoso = int(personalidade_animal.get('afetuoso', 50))
-    sociavel = int(personalidade_animal.get('sociavel', 50))
+    afetuoso = int(afetuoso)
+    sociavel = int(sociavel)
     afetuoso = max(0, min(afetuoso, 100))
     sociavel = max(0, min(sociavel, 100))
 
@@ -217,7 +222,7 @@ def calcular_score_preferencias(animal, adotante):
     genero_preferido = str(adotante.get('genero_preferido') or '').lower()
 
 
-    animal_porte = animal.get('porte', '').lower()
+    animal_porte = (animal.get('porte') or '').lower()
     if tamanho_preferido and animal_porte:
         max_possivel += 25
         if tamanho_preferido == animal_porte:
@@ -302,51 +307,323 @@ def classificar_compatibilidade(score):
         return "Baixa Compatibilidade ❌"
 
 
-def obter_matches_adotante(adotante_id, min_score=50):
-    from animal_crud import ler_animais
+def _limite_preferencias(animal, adotante):
+    # Mesmo cálculo de calcular_score_preferencias, mas supondo todas as
+    # tags ideais presentes e a melhor pontuação possível de experiência
+    score = 0
+    max_possivel = 0
 
-    adotante = ler_adotante_id(adotante_id)
-    if not adotante:
-        return []
+    tamanho_preferido = str(adotante.get('tamanho_preferido') or '').lower()
+    animal_porte = (animal.get('porte') or '').lower()
+    if tamanho_preferido and animal_porte:
+        max_possivel += 25
+        if tamanho_preferido == animal_porte:
+            score += 25
+        elif tamanho_preferido in ['pequeno', 'grande'] and animal_porte == 'médio':
+            score += 12
+
+    if adotante.get('idade_preferida'):
+        max_possivel += 15
+        score += 15
+
+    genero_preferido = str(adotante.get('genero_preferido') or '').lower()
+    if genero_preferido and genero_preferido != 'sem_preferência':
+        max_possivel += 10
+        score += 5
+
+    if adotante.get('tags_ideais', []) and animal.get('tags', []):
+        max_possivel += 30
+        score += 30
+
+    experiencia = adotante.get('experiencia_previa')
+    if experiencia:
+        max_possivel += 20
+        score += 20 if experiencia == 'muita' else 15
+
+    if max_possivel > 0:
+        return (score / max_possivel) * 100
+    return 50
+
+
+def limite_superior_score(animal, adotante):
+    """Limite superior barato do score final de um par.
+
+    Traços, moradia e rotina são baratos e entram exatos; só as preferências
+    (cruzamento de tags) são substituídas pelo seu valor máximo possível.
+    """
+    W_TRACOS, W_MORADIA, W_ROTINA, W_PREFERENCIAS = pesos_compatibilidade(adotante)
+
+    if adotante.get('tem_preferencia_tracos'):
+        tracos = calcular_score_tracos(animal, adotante)[0]
+    else:
+        tracos = 0
+
+    base = (
+        (tracos * W_TRACOS) +
+        (calcular_score_moradia(animal, adotante) * W_MORADIA) +
+        (calcular_score_rotina(animal, adotante) * W_ROTINA) +
+        (min(_limite_preferencias(animal, adotante), 100) * W_PREFERENCIAS)
+    )
+    return min(base, 100)
+
+
+def _limite_moradia(adotante):
+    # Maior calcular_score_moradia possível para o adotante, sobre qualquer animal
+    tamanho_moradia = str(adotante.get('tamanho_moradia', '')).lower()
+    quintal = 10 if adotante.get('tem_quintal', False) else 0
+    ativo = {'grande': 25, 'médio': 10, 'pequeno': -20}.get(tamanho_moradia, 0)
+    return max(0, min(max(50 + ativo + quintal, 50 + quintal, 65), 100))
+
+
+def _limite_rotina(adotante):
+    # Maior calcular_score_rotina possível para o adotante, sobre qualquer animal
+    try:
+        horas = max(0, min(int(adotante.get('horas_sozinho_dia', 0)), 24))
+    except (ValueError, TypeError):
+        horas = 0
+    viagens = bool(adotante.get('viagens_frequentes', False))
+
+    independente = 50 + (25 if horas >= 6 else 10) + (10 if viagens else 0)
+    moderado = 50 + (15 if horas <= 6 else -10 if horas >= 8 else 0) + (10 if viagens else 0)
+    if horas <= 2:
+        apegado = 75
+    elif horas <= 4:
+        apegado = 60
+    elif horas >= 8:
+        apegado = 20
+    else:
+        apegado = 50
+    apegado -= 20 if viagens else 0
+    return max(0, min(max(independente, moderado, apegado), 100))
 
-    animais = ler_animais()
-    matches = []
 
-    for animal in animais:
-        # Apenas animais disponíveis
-        if animal.get('status') != 'Disponível':
+def _limite_preferencias_grupo(adotante, falhas):
+    # Maior score de preferências de um animal que falha exatamente nos
+    # critérios `falhas` de separar_candidatos ('porte', 'idade', 'tags')
+    tamanho_preferido = str(adotante.get('tamanho_preferido') or '').lower()
+    genero_preferido = str(adotante.get('genero_preferido') or '').lower()
+    experiencia = adotante.get('experiencia_previa')
+
+    # (pontos, máximo) de cada critério presente
+    termos = []
+    if tamanho_preferido:
+        if 'porte' not in falhas:
+            termos.append((25, 25))
+        else:
+            termos.append((12 if tamanho_preferido in ['pequeno', 'grande'] else 0, 25))
+    if adotante.get('idade_preferida'):
+        termos.append((5, 15) if 'idade' in falhas else (15, 15))
+    if adotante.get('tags_ideais', []):
+        termos.append((0, 30) if 'tags' in falhas else (30, 30))
+    if genero_preferido and genero_preferido != 'sem_preferência':
+        termos.append((5, 10))
+    if experiencia:
+        termos.append((20 if experiencia == 'muita' else 15, 20))
+
+    if not termos:
+        return 50
+    return min(sum(p for p, _ in termos) / sum(m for _, m in termos) * 100, 100)
+
+
+def _limite_sem_tracos(adotante, falhas):
+    # Parte do score que não vem dos traços, no máximo, para o grupo `falhas`
+    _, W_MORADIA, W_ROTINA, W_PREFERENCIAS = pesos_compatibilidade(adotante)
+    return (
+        (_limite_moradia(adotante) * W_MORADIA) +
+        (_limite_rotina(adotante) * W_ROTINA) +
+        (_limite_preferencias_grupo(adotante, falhas) * W_PREFERENCIAS)
+    )
+
+
+def limite_superior_grupo(adotante, falhas):
+    """Limite superior do score de qualquer animal de um grupo de separar_candidatos"""
+    W_TRACOS = pesos_compatibilidade(adotante)[0]
+    tracos = 100 if adotante.get('tem_preferencia_tracos') else 0
+    return min((tracos * W_TRACOS) + _limite_sem_tracos(adotante, falhas), 100)
+
+
+def _filtrar_grupo_por_tracos(adotante, falhas, animais, minimo):
+    """Animais do grupo que ainda podem chegar a `minimo` pelo score de traços.
+
+    Só vale para quem tem preferência de traços: o resto do score do grupo
+    tem teto conhecido, o que falta para `minimo` tem de vir dos traços, e
+    a árvore de traços do índice de candidatos devolve quem alcança isso.
+    """
+    W_TRACOS = pesos_compatibilidade(adotante)[0]
+    if not adotante.get('tem_preferencia_tracos') or not W_TRACOS:
+        return animais
+
+    # Folga de 0.05: o score é comparado depois de arredondado
+    necessario = (minimo - 0.05 - _limite_sem_tracos(adotante, falhas)) / W_TRACOS
+    if necessario <= 0:
+        return animais
+
+    aceitos = filtrar_por_tracos(tracos_adotante(adotante), necessario)
+    return [a for a in animais if a.id in aceitos]
+
+
+def _preencher_heap(heap, candidatos, tamanho, min_score):
+    # candidatos: (posicao, animal, adotante); a posição desempata scores iguais
+    ordenados = []
+    for posicao, animal, adotante in candidatos:
+        normalizar_animal(animal)
+        ordenados.append((limite_superior_score(animal, adotante), posicao, animal, adotante))
+    ordenados.sort(key=lambda c: c[0], reverse=True)
+
+    for limite, posicao, animal, adotante in ordenados:
+        teto = round(limite, 1)
+        if teto < min_score:
+            break
+
+        if tamanho is not None and len(heap) == tamanho:
+            if teto < heap[0][0]:
+                break
+            if (teto, -posicao) < heap[0][:2]:
+                continue
+
+        compat = calcular_compatibilidade_registros(animal, adotante)
+        if compat['score'] < min_score:
             continue
 
-        compat = calcular_compatibilidade(animal['id'], adotante_id)
-        if compat and compat['score'] >= min_score:
-            matches.append({
-                'animal': animal,
-                'compatibility': compat
-            })
+        item = (compat['score'], -posicao, animal, adotante, compat)
+        if tamanho is None or len(heap) < tamanho:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+
+def _ordenar_heap(heap, offset):
+    ordenados = sorted(heap, key=lambda item: item[:2], reverse=True)
+    return [(animal, adotante, compat) for _, _, animal, adotante, compat in ordenados[offset:]]
+
+
+def selecionar_top_k(pares, k=None, offset=0, min_score=50):
+    """Seleciona os melhores pares (animal, adotante) com um heap limitado.
 
-    # Ordenar por score descendente
-    matches.sort(key=lambda x: x['compatibility']['score'], reverse=True)
-    return matches
+    Os candidatos são visitados em ordem decrescente de limite superior; quem
+    não consegue alcançar o menor score do heap nem é pontuado, e a busca
+    termina assim que nenhum candidato restante pode entrar no top-K.
+    Empates seguem a ordem original de `pares`, como no sort estável.
+    """
+    tamanho = None if k is None else offset + k
+    if tamanho == 0:
+        return []
+
+    heap = []
+    _preencher_heap(heap, [(i, a, d) for i, (a, d) in enumerate(pares)], tamanho, min_score)
+    return _ordenar_heap(heap, offset)
+
+
+def selecionar_top_k_adotante(adotante, k=None, offset=0, min_score=50, especie=None, estrito=False):
+    """Top-K dos animais disponíveis para o adotante, pelo índice de candidatos.
+
+    Os grupos de separar_candidatos são visitados em ordem decrescente de
+    limite superior, começando pelos preferidos (que atendem porte, idade e
+    tags ideais); um grupo que não alcança o heap nem é pontuado. O resultado
+    é o mesmo de selecionar_top_k sobre todos os animais (empates por id);
+    com estrito=True só os preferidos são considerados.
+    """
+    tamanho = None if k is None else offset + k
+    if tamanho == 0:
+        return []
+
+    grupos = separar_candidatos(adotante, especie)
+    if estrito:
+        grupos = grupos[:1]
+
+    # Os preferidos primeiro, os demais por limite decrescente
+    preferidos, demais = grupos[0], grupos[1:]
+    demais = sorted(
+        ((round(limite_superior_grupo(adotante, falhas), 1), falhas, animais) for falhas, animais in demais),
+        key=lambda grupo: grupo[0], reverse=True
+    )
+
+    heap = []
+    for teto, falhas, animais in [(None, *preferidos)] + demais:
+        cheio = tamanho is not None and len(heap) == tamanho
+        if teto is not None:
+            if teto < min_score:
+                break
+            if cheio and teto < heap[0][0]:
+                break
+        # Com o heap cheio, só entra quem empata ou supera o menor score dele
+        minimo = max(min_score, heap[0][0]) if cheio else min_score
+        animais = _filtrar_grupo_por_tracos(adotante, falhas, animais, minimo)
+        _preencher_heap(heap, [(a.id, a, adotante) for a in animais], tamanho, min_score)
+
+    return _ordenar_heap(heap, offset)
+
+
+def iterar_matches_adotante(adotante_id, min_score=50, limit=None, offset=0, especie=None, estrito=False):
+    """Gera (animal, adotante, compat) em ordem de score, sem montar a lista inteira.
+
+    `estrito` limita o resultado aos animais que atendem porte, idade e tags
+    ideais do adotante; `especie` filtra pela espécie.
+    """
+    adotante = ler_adotante_id(adotante_id)
+    if not adotante:
+        return
 
+    if indice_pronto() and not estrito:
+        # Scores pré-calculados; apenas animais disponíveis, já ordenados
+        for animal, compat in iterar_matches_indice_adotante(adotante_id, min_score, limit, offset, especie):
+            yield animal, adotante, compat
+    else:
+        yield from selecionar_top_k_adotante(adotante, limit, offset, min_score, especie, estrito)
 
-def obter_matches_animal(animal_id, min_score=50):
-    from adotantes_crud import ler_adotantes
 
+def iterar_matches_animal(animal_id, min_score=50, limit=None, offset=0):
+    """Gera (animal, adotante, compat) em ordem de score, sem montar a lista inteira"""
     animal = ler_animal_id(animal_id)
     if not animal:
-        return []
+        return
+
+    if indice_pronto():
+        for adotante, compat in iterar_matches_indice_animal(animal_id, min_score, limit, offset):
+            yield animal, adotante, compat
+    else:
+        from adotantes_crud import ler_adotantes_registros
+        pares = [(animal, d) for d in ler_adotantes_registros()]
+        yield from selecionar_top_k(pares, limit, offset, min_score)
+
+
+def montar_match(chave, animal, adotante, compat, compacto=False):
+    """Item da resposta: a entidade em `chave` ('animal' ou 'adotante') e a compatibilidade.
+
+    No modo compacto a compatibilidade leva só os ids do par, em vez de
+    repetir o animal e o adotante inteiros em cada item.
+    """
+    # Só os pares devolvidos viram dict
+    animal, adotante = como_dict(animal), como_dict(adotante)
+    if compacto:
+        compat.pop('animal', None)
+        compat.pop('adotante', None)
+        compat['animal_id'] = animal['id']
+        compat['adotante_id'] = adotante['id']
+    else:
+        compat['animal'] = animal
+        compat['adotante'] = adotante
+    return {
+        chave: animal if chave == 'animal' else adotante,
+        'compatibility': compat
+    }
+
+
+def gerar_matches_adotante(adotante_id, min_score=50, limit=None, offset=0, compacto=False,
+                           especie=None, estrito=False):
+    matches = iterar_matches_adotante(adotante_id, min_score, limit, offset, especie, estrito)
+    for animal, adotante, compat in matches:
+        yield montar_match('animal', animal, adotante, compat, compacto)
+
+
+def gerar_matches_animal(animal_id, min_score=50, limit=None, offset=0, compacto=False):
+    for animal, adotante, compat in iterar_matches_animal(animal_id, min_score, limit, offset):
+        yield montar_match('adotante', animal, adotante, compat, compacto)
+
 
-    adotantes = ler_adotantes()
-    matches = []
+def obter_matches_adotante(adotante_id, min_score=50, limit=None, offset=0):
+    return list(gerar_matches_adotante(adotante_id, min_score, limit, offset))
 
-    for adotante in adotantes:
-        compat = calcular_compatibilidade(animal_id, adotante['id'])
-        if compat and compat['score'] >= min_score:
-            matches.append({
-                'adotante': adotante,
-                'compatibility': compat
-            })
 
-    # Ordenar por score descendente
-    matches.sort(key=lambda x: x['compatibility']['score'], reverse=True)
-    return matches
+def obter_matches_animal(animal_id, min_score=50, limit=None, offset=0):
+    return list(gerar_matches_animal(animal_id, min_score, limit, offset))
@@ -0,0 +1,541 @@
+"""
+matching_lote.py - Cálculo vetorizado de compatibilidade em lote (NumPy)
+
+Empacota animais e adotantes já carregados em arrays e calcula os quatro
+componentes do score para um bloco inteiro (1xN ou MxN) de uma vez,
+reproduzindo exatamente os valores de matching_engine.calcular_compatibilidade.
+
+Antes do cálculo, animais e adotantes com a mesma assinatura (os campos que
+os scores de fato leem, ver chave_animal/chave_adotante) são agrupados: cada
+par de assinaturas é pontuado uma vez e o resultado é repassado a todos os
+pares do grupo.
+"""
+
+import threading
+import numpy as np
+from indice_candidatos import faixa_idade
+from registros import TRACOS, tracos_animal, tracos_adotante
+
+TAGS_DIFICEIS = {'Arredio', 'Rebelde', 'Medroso', 'Indomável'}
+
+# Contadores da deduplicação (ver estatisticas)
+_contadores = {
+    'lotes': 0,
+    'animais': 0,
+    'animais_distintos': 0,
+    'adotantes': 0,
+    'adotantes_distintos': 0,
+    'pares': 0,
+    'pares_calculados': 0,
+    'pares_retornados': 0,
+    'pares_montados': 0
+}
+_lock = threading.Lock()
+
+
+# ==================== EMPACOTAMENTO ====================
+
+def _limitar_int(valor, minimo, maximo):
+    return max(minimo, min(int(valor), maximo))
+
+
+def _nomes_tags(tags):
+    if not isinstance(tags, list):
+        return []
+    return [t.get('name') for t in tags]
+
+
+def empacotar_animais(animais):
+    """Converte animais (registros ou dicts) em arrays colunares"""
+    n = len(animais)
+    personalidade = np.full((n, len(TRACOS)), 50.0)
+    energetico = np.empty(n, dtype=np.int64)
+    afetuoso = np.empty(n, dtype=np.int64)
+    sociavel = np.empty(n, dtype=np.int64)
+    idade = np.empty(n, dtype=np.float64)
+    portes = []
+    tem_tags = np.zeros(n, dtype=bool)
+    dificil = np.zeros(n, dtype=bool)
+
+    vocabulario = {}
+    tags_por_animal = []
+
+    for i, animal in enumerate(animais):
+        tracos = tracos_animal(animal)
+        personalidade[i] = tracos
+
+        energetico[i] = _limitar_int(tracos[2], 0, 100)
+        afetuoso[i] = _limitar_int(tracos[1], 0, 100)
+        sociavel[i] = _limitar_int(tracos[5], 0, 100)
+
+        idade[i] = animal.get('idade') or 0
+        portes.append((animal.get('porte') or '').lower())
+
+        nomes = _nomes_tags(animal.get('tags'))
+        tem_tags[i] = bool(nomes)
+        dificil[i] = bool(TAGS_DIFICEIS.intersection(nomes))
+
+        indices = set()
+        for nome in nomes:
+            indices.add(vocabulario.setdefault(nome, len(vocabulario)))
+        tags_por_animal.append(indices)
+
+    # Matriz animal x tag (1 se o animal possui a tag)
+    matriz_tags = np.zeros((n, max(len(vocabulario), 1)), dtype=np.float64)
+    for i, indices in enumerate(tags_por_animal):
+        for k in indices:
+            matriz_tags[i, k] = 1.0
+
+    return {
+        'ids': [a.get('id') for a in animais],
+        'personalidade': personalidade,
+        'energetico': energetico,
+        'afetuoso': afetuoso,
+        'sociavel': sociavel,
+        'idade': idade,
+        'porte': np.array(portes, dtype=object),
+        'tem_tags': tem_tags,
+        'dificil': dificil,
+        'vocabulario': vocabulario,
+        'matriz_tags': matriz_tags,
+    }
+
+
+def _horas_sozinho(adotante):
+    try:
+        return _limitar_int(adotante.get('horas_sozinho_dia', 0), 0, 24)
+    except (ValueError, TypeError):
+        return 0
+
+
+def empacotar_adotantes(adotantes, vocabulario):
+    """Converte adotantes (registros ou dicts) em arrays colunares.
+
+    `vocabulario` é o mapa de tags do pacote de animais, usado para montar
+    a matriz de tags ideais na mesma base da matriz de tags dos animais.
+    """
+    m = len(adotantes)
+    tracos = np.empty((m, len(TRACOS)))
+    com_tracos = np.zeros(m, dtype=bool)
+    tamanho_moradia = []
+    tem_quintal = np.zeros(m, dtype=bool)
+    horas_sozinho = np.empty(m, dtype=np.int64)
+    viagens = np.zeros(m, dtype=bool)
+    tamanho_preferido = []
+    idade_preferida = []
+    tem_genero = np.zeros(m, dtype=bool)
+    total_tags_ideais = np.zeros(m, dtype=np.int64)
+    experiencia = []
+    ideais = np.zeros((m, max(len(vocabulario), 1)), dtype=np.float64)
+
+    for i, adotante in enumerate(adotantes):
+        tracos[i] = tracos_adotante(adotante)
+        com_tracos[i] = bool(adotante.get('tem_preferencia_tracos'))
+
+        tamanho_moradia.append(str(adotante.get('tamanho_moradia', '')).lower())
+        tem_quintal[i] = bool(adotante.get('tem_quintal', False))
+        horas_sozinho[i] = _horas_sozinho(adotante)
+        viagens[i] = bool(adotante.get('viagens_frequentes', False))
+
+        tamanho_preferido.append(str(adotante.get('tamanho_preferido') or '').lower())
+        idade_preferida.append(str(adotante.get('idade_preferida') or '').lower())
+        genero = str(adotante.get('genero_preferido') or '').lower()
+        tem_genero[i] = bool(genero) and genero != 'sem_preferência'
+
+        tags_ideais = adotante.get('tags_ideais', []) or []
+        total_tags_ideais[i] = len(tags_ideais)
+        for nome in set(tags_ideais):
+            k = vocabulario.get(nome)
+            if k is not None:
+                ideais[i, k] = 1.0
+
+        experiencia.append(adotante.get('experiencia_previa'))
+
+    return {
+        'ids': [a.get('id') for a in adotantes],
+        'tracos': tracos,
+        'com_tracos': com_tracos,
+        'tamanho_moradia': np.array(tamanho_moradia, dtype=object),
+        'tem_quintal': tem_quintal,
+        'horas_sozinho': horas_sozinho,
+        'viagens': viagens,
+        'tamanho_preferido': np.array(tamanho_preferido, dtype=object),
+        'idade_preferida': np.array(idade_preferida, dtype=object),
+        'tem_genero': tem_genero,
+        'total_tags_ideais': total_tags_ideais,
+        'ideais': ideais,
+        'experiencia': np.array(experiencia, dtype=object),
+    }
+
+
+# ==================== DEDUPLICAÇÃO ====================
+
+def chave_animal(animal):
+    """Assinatura do animal para o score: traços, porte, faixa de idade e nomes das tags"""
+    return (
+        tuple(tracos_animal(animal)),
+        (animal.get('porte') or '').lower(),
+        faixa_idade(animal.get('idade')),
+        frozenset(_nomes_tags(animal.get('tags')))
+    )
+
+
+def chave_adotante(adotante):
+    """Assinatura do adotante para o score (os traços só contam se ele tiver preferência)"""
+    com_tracos = bool(adotante.get('tem_preferencia_tracos'))
+    tamanho_moradia = str(adotante.get('tamanho_moradia', '')).lower()
+    genero = str(adotante.get('genero_preferido') or '').lower()
+    tags_ideais = adotante.get('tags_ideais', []) or []
+    experiencia = adotante.get('experiencia_previa')
+
+    return (
+        tuple(tracos_adotante(adotante)) if com_tracos else None,
+        tamanho_moradia if tamanho_moradia in ('grande', 'médio', 'pequeno') else '',
+        bool(adotante.get('tem_quintal', False)),
+        _horas_sozinho(adotante),
+        bool(adotante.get('viagens_frequentes', False)),
+        str(adotante.get('tamanho_preferido') or '').lower(),
+        str(adotante.get('idade_preferida') or '').lower(),
+        bool(genero) and genero != 'sem_preferência',
+        frozenset(tags_ideais),
+        len(tags_ideais),
+        # Só 'muita' e 'média' mudam a pontuação; o resto conta como ter ou não
+        experiencia if experiencia in ('muita', 'média') else bool(experiencia)
+    )
+
+
+def agrupar(registros, chave):
+    """Um representante por assinatura e, para cada registro, a posição do seu representante"""
+    posicoes = {}
+    representantes = []
+    inverso = np.empty(len(registros), dtype=np.int64)
+    for n, registro in enumerate(registros):
+        assinatura = chave(registro)
+        posicao = posicoes.get(assinatura)
+        if posicao is None:
+            posicao = posicoes[assinatura] = len(representantes)
+            representantes.append(registro)
+        inverso[n] = posicao
+    return representantes, inverso
+
+
+def estatisticas():
+    """Contadores acumulados da deduplicação, com as razões obtidas.
+
+    `razao_pares` é quantos pares cada par de assinaturas pontuado representou
+    em média; `razao_montagem`, o mesmo para a montagem dos detalhes.
+    """
+    with _lock:
+        dados = dict(_contadores)
+
+    def razao(total, distintos):
+        return round(total / distintos, 2) if distintos else None
+
+    dados['razao_pares'] = razao(dados['pares'], dados['pares_calculados'])
+    dados['razao_montagem'] = razao(dados['pares_retornados'], dados['pares_montados'])
+    return dados
+
+
+def _contar(**valores):
+    with _lock:
+        _contadores['lotes'] += 1
+        for nome, valor in valores.items():
+            _contadores[nome] += valor
+
+
+# ==================== SCORES VETORIZADOS ====================
+# Todas as funções recebem os pacotes e devolvem matrizes MxN
+# (linhas = adotantes, colunas = animais).
+
+def scores_tracos(pa, pd):
+    total = np.zeros((len(pd['ids']), len(pa['ids'])))
+    diferenca = np.empty_like(total)
+    for j in range(len(TRACOS)):
+        # Em place: as mesmas operações, sem alocar uma matriz por passo
+        np.subtract(pa['personalidade'][None, :, j], pd['tracos'][:, j, None], out=diferenca)
+        np.abs(diferenca, out=diferenca)
+        np.subtract(100, diferenca, out=diferenca)
+        total += diferenca
+    total /= len(TRACOS)
+    return total
+
+
+def scores_moradia(pa, pd):
+    energetico = pa['energetico'][None, :]
+    tamanho = pd['tamanho_moradia'][:, None]
+
+    ajuste_espaco = np.select(
+        [tamanho == 'grande', tamanho == 'médio', tamanho == 'pequeno'],
+        [25, 10, -20],
+        default=0
+    )
+
+    score = 50 + np.where(energetico >= 75, ajuste_espaco, 0)
+    score = score + np.where(energetico <= 25, 15, 0)
+    score = score + np.where(pd['tem_quintal'][:, None] & (energetico >= 60), 10, 0)
+    return np.clip(score, 0, 100)
+
+
+def scores_rotina(pa, pd):
+    independencia = ((100 - pa['afetuoso'] + 100 - pa['sociavel']) / 2)[None, :]
+    horas = pd['horas_sozinho'][:, None]
+
+    muito_independente = independencia >= 70
+    moderado = (independencia >= 50) & ~muito_independente
+    dependente = independencia < 50
+
+    ajuste = np.select(
+        [
+            muito_independente & (horas >= 6),
+            muito_independente,
+            moderado & (horas <= 6),
+            moderado & (horas >= 8),
+            dependente & (horas <= 2),
+            dependente & (horas <= 4),
+            dependente & (horas >= 8),
+        ],
+        [25, 10, 15, -10, 25, 10, -30],
+        default=0
+    )
+
+    ajuste_viagem = np.where(independencia >= 60, 10, -20)
+    score = 50 + ajuste + np.where(pd['viagens'][:, None], ajuste_viagem, 0)
+    return np.clip(score, 0, 100)
+
+
+def scores_preferencias(pa, pd):
+    """Retorna (scores, max_possivel) — max_possivel == 0 indica score neutro"""
+    porte = pa['porte'][None, :]
+    preferido = pd['tamanho_preferido'][:, None]
+
+    # 1. PORTE
+    avalia_porte = (preferido != '') & (porte != '')
+    pontos_porte = np.select(
+        [preferido == porte,
+         (preferido == 'pequeno') & (porte == 'médio'),
+         (preferido == 'grande') & (porte == 'médio')],
+        [25, 12, 12],
+        default=0
+    )
+    pontos = np.where(avalia_porte, pontos_porte, 0)
+    max_possivel = np.where(avalia_porte, 25, 0)
+
+    # 2. IDADE
+    idade = pa['idade'][None, :]
+    idade_pref = pd['idade_preferida'][:, None]
+    faixa_ok = (
+        ((idade_pref == 'filhote') & (idade <= 1)) |
+        ((idade_pref == 'jovem') & (idade > 1) & (idade <= 3)) |
+        ((idade_pref == 'adulto') & (idade > 3) & (idade <= 7)) |
+        ((idade_pref == 'idoso') & (idade > 7))
+    )
+    avalia_idade = idade_pref != ''
+    pontos = pontos + np.where(avalia_idade, np.where(faixa_ok, 15, 5), 0)
+    max_possivel = max_possivel + np.where(avalia_idade, 15, 0)
+
+    # 3. GÊNERO
+    tem_genero = pd['tem_genero'][:, None]
+    pontos = pontos + np.where(tem_genero, 5, 0)
+    max_possivel = max_possivel + np.where(tem_genero, 10, 0)
+
+    # 4. TAGS (somado em float, na mesma ordem do cálculo escalar)
+    total_ideais = pd['total_tags_ideais'][:, None]
+    avalia_tags = (total_ideais > 0) & pa['tem_tags'][None, :]
+    coincidentes = pd['ideais'] @ pa['matriz_tags'].T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        razao = coincidentes / total_ideais
+    score = pontos + np.where(avalia_tags, razao * 30, 0.0)
+    max_possivel = max_possivel + np.where(avalia_tags, 30, 0)
+
+    # 5. EXPERIÊNCIA
+    experiencia = pd['experiencia'][:, None]
+    tem_experiencia = np.array([bool(e) for e in pd['experiencia']])[:, None]
+    pontos_dificil = np.select(
+        [experiencia == 'muita', experiencia == 'média'],
+        [20, 10],
+        default=0
+    )
+    pontos_exp = np.where(pa['dificil'][None, :], pontos_dificil, 15)
+    score = score + np.where(tem_experiencia, pontos_exp, 0)
+    max_possivel = max_possivel + np.where(tem_experiencia, 20, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        final = np.where(max_possivel > 0, (score / max_possivel) * 100, 50.0)
+    return np.clip(final, 0, 100), max_possivel
+
+
+def _fatiar(pa, indices):
+    fatia = {chave: valor[indices] for chave, valor in pa.items() if isinstance(valor, np.ndarray)}
+    fatia['ids'] = [pa['ids'][i] for i in indices.tolist()]
+    fatia['vocabulario'] = pa['vocabulario']
+    return fatia
+
+
+def _classes(pa, colunas):
+    # (pacote só com um animal de cada combinação das colunas, posição da combinação de cada animal)
+    chaves = np.column_stack(colunas) if len(pa['ids']) else np.empty((0, len(colunas)))
+    _, primeiros, inverso = np.unique(chaves, axis=0, return_index=True, return_inverse=True)
+    return _fatiar(pa, primeiros), inverso.ravel()
+
+
+def classes_animais(pa):
+    """Animais equivalentes em cada componente sem traços, para calcular_scores_lote.
+
+    Moradia só olha os limiares de energia, rotina só a independência e
+    preferências só porte, faixa de idade e tags. Cada componente é calculado
+    uma vez por combinação distinta e copiado para as colunas dos animais.
+    """
+    energetico, idade = pa['energetico'], pa['idade']
+    _, porte = np.unique(pa['porte'], return_inverse=True)
+    return {
+        'moradia': _classes(pa, [energetico >= 75, energetico <= 25, energetico >= 60]),
+        'rotina': _classes(pa, [pa['afetuoso'] + pa['sociavel']]),
+        'preferencias': _classes(pa, [
+            porte.ravel(),
+            (idade > 1).astype(int) + (idade > 3) + (idade > 7),
+            pa['tem_tags'],
+            pa['dificil'],
+            pa['matriz_tags']
+        ])
+    }
+
+
+def calcular_scores_lote(pa, pd, classes=None):
+    """Calcula todos os componentes e o score final para o bloco MxN.
+
+    Com `classes` (de classes_animais(pa)), moradia, rotina e preferências
+    são calculadas só nas combinações distintas e expandidas; o resultado é
+    o mesmo, mais rápido quando o mesmo pacote de animais é usado em muitos
+    blocos.
+    """
+    tracos = scores_tracos(pa, pd)
+    if classes is None:
+        moradia = scores_moradia(pa, pd)
+        rotina = scores_rotina(pa, pd)
+        preferencias, max_possivel = scores_preferencias(pa, pd)
+    else:
+        sub, inverso = classes['moradia']
+        moradia = np.take(scores_moradia(sub, pd), inverso, axis=1)
+        sub, inverso = classes['rotina']
+        rotina = np.take(scores_rotina(sub, pd), inverso, axis=1)
+        sub, inverso = classes['preferencias']
+        preferencias, max_possivel = scores_preferencias(sub, pd)
+        preferencias = np.take(preferencias, inverso, axis=1)
+        max_possivel = np.take(max_possivel, inverso, axis=1)
+
+    com_tracos = pd['com_tracos'][:, None]
+    w_tracos = np.where(com_tracos, 0.10, 0.0)
+    w_moradia = np.where(com_tracos, 0.30, 0.50)
+    w_rotina = np.where(com_tracos, 0.20, 0.30)
+    w_preferencias = np.where(com_tracos, 0.40, 0.20)
+
+    base = (
+        (np.where(com_tracos, tracos, 0) * w_tracos) +
+        (moradia * w_moradia) +
+        (rotina * w_rotina) +
+        (preferencias * w_preferencias)
+    )
+
+    return {
+        'score': np.minimum(base, 100),
+        'tracos': tracos,
+        'moradia': moradia,
+        'rotina': rotina,
+        'preferencias': preferencias,
+        'max_possivel': max_possivel,
+    }
+
+
+# ==================== MONTAGEM DOS RESULTADOS ====================
+
+def montar_compatibilidade(animal, adotante, scores, i, j):
+    """Monta o dict de compatibilidade do par (i, j) no mesmo formato escalar"""
+    from matching_engine import calcular_score_tracos, classificar_compatibilidade
+
+    final_score = float(scores['score'][i, j])
+
+    # O detalhamento por traço só é necessário para os pares retornados
+    if adotante.get('tem_preferencia_tracos'):
+        _, trait_scores_individual = calcular_score_tracos(animal, adotante)
+    else:
+        trait_scores_individual = {t: 0 for t in TRACOS}
+
+    if scores['max_possivel'][i, j] > 0:
+        preferencias_score = max(0, min(float(scores['preferencias'][i, j]), 100))
+    else:
+        preferencias_score = 50
+
+    return {
+        'score': round(final_score, 1),
+        'level': classificar_compatibilidade(final_score),
+        'trait_scores': {
+            t: round(trait_scores_individual.get(t, 0), 1) for t in TRACOS
+        },
+        'moradia_score': round(int(scores['moradia'][i, j]), 1),
+        'rotina_score': round(int(scores['rotina'][i, j]), 1),
+        'preferencias_score': round(preferencias_score, 1),
+        'animal': animal,
+        'adotante': adotante
+    }
+
+
+def _indices_acima(score, min_score):
+    # Pré-filtro vetorizado com folga; a comparação final usa round() do Python
+    if min_score is None:
+        linhas, colunas = np.indices(score.shape)
+        return zip(linhas.ravel(), colunas.ravel())
+    return zip(*np.nonzero(score >= min_score - 0.05))
+
+
+def compatibilidades_lote(animais, adotantes, min_score=None):
+    """Calcula compatibilidades de todos os pares MxN.
+
+    Retorna lista de tuplas (animal, adotante, compatibilidade) para os pares
+    com score >= min_score (ou todos, se min_score for None). Só os pares de
+    assinaturas distintas são pontuados e montados; os demais recebem uma
+    cópia do resultado do seu grupo.
+    """
+    from matching_engine import normalizar_animal
+
+    if not animais or not adotantes:
+        return []
+
+    animais = [normalizar_animal(a) for a in animais]
+    rep_animais, grupo_animal = agrupar(animais, chave_animal)
+    rep_adotantes, grupo_adotante = agrupar(adotantes, chave_adotante)
+
+    pa = empacotar_animais(rep_animais)
+    pd = empacotar_adotantes(rep_adotantes, pa['vocabulario'])
+    scores = calcular_scores_lote(pa, pd)
+    repetidos = len(rep_animais) < len(animais) or len(rep_adotantes) < len(adotantes)
+    # Score de cada par original, na ordem original (a ordem do resultado não muda)
+    score = scores['score'][np.ix_(grupo_adotante, grupo_animal)] if repetidos else scores['score']
+    grupo_animal, grupo_adotante = grupo_animal.tolist(), grupo_adotante.tolist()
+
+    montados = {}
+    montagens = 0
+    resultados = []
+    for i, j in _indices_acima(score, min_score):
+        if min_score is not None and round(float(score[i, j]), 1) < min_score:
+            continue
+        if not repetidos:
+            compat = montar_compatibilidade(animais[j], adotantes[i], scores, i, j)
+            montagens += 1
+        else:
+            par = (grupo_adotante[i], grupo_animal[j])
+            modelo = montados.get(par)
+            if modelo is None:
+                modelo = montados[par] = montar_compatibilidade(
+                    rep_animais[par[1]], rep_adotantes[par[0]], scores, *par
+                )
+                montagens += 1
+            compat = dict(modelo, animal=animais[j], adotante=adotantes[i])
+        resultados.append((animais[j], adotantes[i], compat))
+
+    _contar(
+        animais=len(animais), animais_distintos=len(rep_animais),
+        adotantes=len(adotantes), adotantes_distintos=len(rep_adotantes),
+        pares=len(animais) * len(adotantes), pares_calculados=len(rep_animais) * len(rep_adotantes),
+        pares_retornados=len(resultados), pares_montados=montagens
+    )
+    return resultados
@@ -0,0 +1,442 @@
+"""
+metricas.py - Instrumentação opcional das requisições (AMIGO_METRICAS=1)
+
+Para cada requisição mede o tempo total, as consultas SQLite (quantidade,
+tempo e linhas lidas), os bytes de JSON gerados e o tempo gasto em cada
+calcular_score_* (e nos equivalentes em lote de matching_lote). Os totais
+por rota saem em /api/_metrics no formato texto do Prometheus, e cada
+resposta ganha um header Server-Timing com os números da própria requisição.
+
+Com AMIGO_PERFIL=1 (ou uma lista de endpoints separados por vírgula) uma
+thread amostra as pilhas das requisições em andamento; o resultado sai em
+/api/_metrics/perfil/<endpoint> no formato "pilha;colapsada contagem".
+"""
+
+import importlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+import conexao
+
+# Limites (segundos) do histograma de duração das requisições
+FAIXAS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Intervalo entre amostras do perfilador
+INTERVALO_PERFIL = float(os.environ.get('AMIGO_PERFIL_INTERVALO', '0.005'))
+
+# Funções de score medidas: módulo -> nomes
+FUNCOES_SCORE = {
+    'matching_engine': ('calcular_score_tracos', 'calcular_score_moradia',
+                        'calcular_score_rotina', 'calcular_score_preferencias'),
+    'matching_lote': ('scores_tracos', 'scores_moradia', 'scores_rotina', 'scores_preferencias'),
+}
+
+_ativo = False
+_local = threading.local()
+_lock = threading.Lock()
+_por_rota = {}
+
+
+class Medicao:
+    __slots__ = ('inicio', 'consultas', 'sqlite_segundos', 'linhas', 'json_bytes',
+                 'json_segundos', 'scores')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sqlite_segundos = 0.0
+        self.linhas = 0
+        self.json_bytes = 0
+        self.json_segundos = 0.0
+        self.scores = {}
+
+
+def medicao_atual():
+    return getattr(_local, 'medicao', None)
+
+
+# ==================== SQLITE ====================
+
+class CursorMedido(sqlite3.Cursor):
+    def _medir(self, metodo, *args):
+        medicao = medicao_atual()
+        if medicao is None:
+            return metodo(*args)
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            medicao.sqlite_segundos += time.perf_counter() - inicio
+
+    def execute(self, *args):
+        medicao = medicao_atual()
+        if medicao is not None:
+            medicao.consultas += 1
+        return self._medir(super().execute, *args)
+
+    def executemany(self, *args):
+        medicao = medicao_atual()
+        if medicao is not None:
+            medicao.consultas += 1
+        return self._medir(super().executemany, *args)
+
+    def _contar(self, linhas):
+        medicao = medicao_atual()
+        if medicao is not None:
+            medicao.linhas += len(linhas)
+        return linhas
+
+    def fetchone(self):
+        linha = self._medir(super().fetchone)
+        if linha is not None:
+            self._contar((linha,))
+        return linha
+
+    def fetchmany(self, *args):
+        return self._contar(self._medir(super().fetchmany, *args))
+
+    def fetchall(self):
+        return self._contar(self._medir(super().fetchall))
+
+    def __next__(self):
+        linha = self._medir(super().__next__)
+        self._contar((linha,))
+        return linha
+
+
+class ConexaoMedida(sqlite3.Connection):
+    # Connection.execute/executemany também passam por cursor()
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+
+# ==================== JSON ====================
+
+class JSONMedido(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        inicio = time.perf_counter()
+        texto = super().dumps(obj, **kwargs)
+        medicao = medicao_atual()
+        if medicao is not None:
+            medicao.json_segundos += time.perf_counter() - inicio
+            medicao.json_bytes += len(texto) if texto.isascii() else len(texto.encode('utf-8'))
+        return texto
+
+
+# ==================== FUNÇÕES DE SCORE ====================
+
+def _cronometrar(nome, funcao):
+    def medida(*args, **kwargs):
+        medicao = medicao_atual()
+        if medicao is None:
+            return funcao(*args, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            total = medicao.scores.setdefault(nome, [0, 0.0])
+            total[0] += 1
+            total[1] += time.perf_counter() - inicio
+
+    medida.__wrapped__ = funcao
+    medida.__name__ = funcao.__name__
+    return medida
+
+
+def _instrumentar_scores():
+    # As chamadas passam pelos globais do módulo, então basta trocar o atributo
+    for nome_modulo, funcoes in FUNCOES_SCORE.items():
+        modulo = importlib.import_module(nome_modulo)
+        for nome in funcoes:
+            funcao = getattr(modulo, nome)
+            if not hasattr(funcao, '__wrapped__'):
+                setattr(modulo, nome, _cronometrar(nome, funcao))
+
+
+# ==================== AGREGAÇÃO POR ROTA ====================
+
+def _novo_total():
+    return {
+        'requisicoes': Counter(),
+        'faixas': [0] * len(FAIXAS_DURACAO),
+        'segundos': 0.0,
+        'quantidade': 0,
+        'consultas': 0,
+        'sqlite_segundos': 0.0,
+        'linhas': 0,
+        'json_bytes': 0,
+        'json_segundos': 0.0,
+        'scores': {},
+    }
+
+
+def _acumular(rota, metodo, status, medicao, duracao):
+    with _lock:
+        total = _por_rota.setdefault(rota, _novo_total())
+        total['requisicoes'][(metodo, status)] += 1
+        total['quantidade'] += 1
+        total['segundos'] += duracao
+        for i, limite in enumerate(FAIXAS_DURACAO):
+            if duracao <= limite:
+                total['faixas'][i] += 1
+        total['consultas'] += medicao.consultas
+        total['sqlite_segundos'] += medicao.sqlite_segundos
+        total['linhas'] += medicao.linhas
+        total['json_bytes'] += medicao.json_bytes
+        total['json_segundos'] += medicao.json_segundos
+        for nome, (chamadas, segundos) in medicao.scores.items():
+            acumulado = total['scores'].setdefault(nome, [0, 0.0])
+            acumulado[0] += chamadas
+            acumulado[1] += segundos
+
+
+def _rota_atual():
+    return request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+
+
+def _iniciar_requisicao():
+    _local.medicao = Medicao()
+    _perfilador.entrar(request.endpoint)
+
+
+def _finalizar_requisicao(resposta):
+    medicao = medicao_atual()
+    if medicao is None:
+        return resposta
+
+    duracao = time.perf_counter() - medicao.inicio
+    _acumular(_rota_atual(), request.method, resposta.status_code, medicao, duracao)
+
+    score_segundos = sum(segundos for _, segundos in medicao.scores.values())
+    resposta.headers['Server-Timing'] = ', '.join([
+        f'db;dur={medicao.sqlite_segundos * 1000:.2f};desc="{medicao.consultas} consultas, {medicao.linhas} linhas"',
+        f'json;dur={medicao.json_segundos * 1000:.2f};desc="{medicao.json_bytes} bytes"',
+        f'score;dur={score_segundos * 1000:.2f}',
+        f'total;dur={duracao * 1000:.2f}',
+    ])
+    return resposta
+
+
+def _encerrar_requisicao(exc=None):
+    _local.medicao = None
+    _perfilador.sair()
+
+
+# ==================== PERFILADOR POR AMOSTRAGEM ====================
+
+class Perfilador:
+    """Amostra periodicamente a pilha das threads que estão atendendo requisições"""
+
+    def __init__(self, endpoints=None):
+        # endpoints: conjunto de nomes, None = todos; vazio = desligado
+        self.endpoints = endpoints
+        self.pilhas = {}
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ligado_para(self, endpoint):
+        if self.endpoints is None:
+            return True
+        return endpoint in self.endpoints
+
+    def entrar(self, endpoint):
+        if endpoint is None or not self.ligado_para(endpoint):
+            return
+        with self._lock:
+            self._em_andamento[threading.get_ident()] = endpoint
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._amostrar, name='perfilador', daemon=True)
+                self._thread.start()
+
+    def sair(self):
+        with self._lock:
+            self._em_andamento.pop(threading.get_ident(), None)
+
+    @staticmethod
+    def _colapsar(quadro):
+        partes = []
+        while quadro is not None:
+            codigo = quadro.f_code
+            partes.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+            quadro = quadro.f_back
+        return ';'.join(reversed(partes))
+
+    def _amostrar(self):
+        while True:
+            time.sleep(INTERVALO_PERFIL)
+            with self._lock:
+                em_andamento = dict(self._em_andamento)
+            if not em_andamento:
+                continue
+
+            quadros = sys._current_frames()
+            for ident, endpoint in em_andamento.items():
+                quadro = quadros.get(ident)
+                if quadro is None:
+                    continue
+                pilha = self._colapsar(quadro)
+                with self._lock:
+                    self.pilhas.setdefault(endpoint, Counter())[pilha] += 1
+
+    def exportar(self, endpoint):
+        """Pilhas colapsadas (uma por linha, com a contagem de amostras)"""
+        with self._lock:
+            pilhas = Counter(self.pilhas.get(endpoint, {}))
+        return ''.join(f"{pilha} {contagem}\n" for pilha, contagem in pilhas.most_common())
+
+    def endpoints_amostrados(self):
+        with self._lock:
+            return sorted(self.pilhas)
+
+
+def _ler_endpoints_perfil(valor):
+    # '1' = todos os endpoints; lista separada por vírgula = só esses; vazio = desligado
+    valor = (valor or '').strip()
+    if valor in ('', '0'):
+        return set()
+    if valor == '1':
+        return None
+    return {parte.strip() for parte in valor.split(',') if parte.strip()}
+
+
+_perfilador = Perfilador(set())
+
+
+# ==================== EXPORTAÇÃO ====================
+
+def _rotulos(**valores):
+    def escapar(texto):
+        return str(texto).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{chave}="{escapar(valor)}"' for chave, valor in valores.items()) + '}'
+
+
+def exportar_prometheus():
+    """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+    import cache
+    import matching_lote
+
+    with _lock:
+        rotas = {rota: {**total, 'requisicoes': Counter(total['requisicoes']),
+                        'faixas': list(total['faixas']),
+                        'scores': {k: list(v) for k, v in total['scores'].items()}}
+                 for rota, total in _por_rota.items()}
+
+    linhas = []
+
+    def metrica(nome, tipo, ajuda, amostras):
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        linhas.extend(amostras)
+
+    metrica('amigo_requisicoes_total', 'counter', 'Requisições atendidas', [
+        f"amigo_requisicoes_total{_rotulos(rota=rota, metodo=metodo, status=status)} {quantidade}"
+        for rota, total in sorted(rotas.items())
+        for (metodo, status), quantidade in sorted(total['requisicoes'].items())
+    ])
+
+    duracao = []
+    for rota, total in sorted(rotas.items()):
+        for limite, quantidade in zip(FAIXAS_DURACAO, total['faixas']):
+            duracao.append(f"amigo_requisicao_segundos_bucket{_rotulos(rota=rota, le=limite)} {quantidade}")
+        duracao.append(f"amigo_requisicao_segundos_bucket{_rotulos(rota=rota, le='+Inf')} {total['quantidade']}")
+        duracao.append(f"amigo_requisicao_segundos_sum{_rotulos(rota=rota)} {total['segundos']:.6f}")
+        duracao.append(f"amigo_requisicao_segundos_count{_rotulos(rota=rota)} {total['quantidade']}")
+    metrica('amigo_requisicao_segundos', 'histogram', 'Duração das requisições', duracao)
+
+    por_rota = [
+        ('amigo_sqlite_consultas_total', 'consultas', 'Consultas SQLite executadas', '{}'),
+        ('amigo_sqlite_segundos_total', 'sqlite_segundos', 'Tempo em consultas SQLite (execução e leitura)', '{:.6f}'),
+        ('amigo_sqlite_linhas_total', 'linhas', 'Linhas lidas do SQLite', '{}'),
+        ('amigo_json_bytes_total', 'json_bytes', 'Bytes de JSON serializados', '{}'),
+        ('amigo_json_segundos_total', 'json_segundos', 'Tempo serializando JSON', '{:.6f}'),
+    ]
+    for nome, campo, ajuda, formato in por_rota:
+        metrica(nome, 'counter', ajuda, [
+            f"{nome}{_rotulos(rota=rota)} {formato.format(total[campo])}"
+            for rota, total in sorted(rotas.items())
+        ])
+
+    metrica('amigo_score_chamadas_total', 'counter', 'Chamadas das funções de score', [
+        f"amigo_score_chamadas_total{_rotulos(rota=rota, funcao=funcao)} {chamadas}"
+        for rota, total in sorted(rotas.items())
+        for funcao, (chamadas, _) in sorted(total['scores'].items())
+    ])
+    metrica('amigo_score_segundos_total', 'counter', 'Tempo nas funções de score', [
+        f"amigo_score_segundos_total{_rotulos(rota=rota, funcao=funcao)} {segundos:.6f}"
+        for rota, total in sorted(rotas.items())
+        for funcao, (_, segundos) in sorted(total['scores'].items())
+    ])
+
+    caches = cache.estatisticas()
+    for nome, campo, ajuda in [('amigo_cache_acertos_total', 'acertos', 'Acertos dos caches de leitura'),
+                               ('amigo_cache_falhas_total', 'falhas', 'Falhas dos caches de leitura'),
+                               ('amigo_cache_invalidacoes_total', 'invalidacoes', 'Invalidações dos caches')]:
+        metrica(nome, 'counter', ajuda, [
+            f"{nome}{_rotulos(cache=cache_nome)} {valores[campo]}"
+            for cache_nome, valores in sorted(caches.items())
+        ])
+    metrica('amigo_cache_itens', 'gauge', 'Entradas em cada cache', [
+        f"amigo_cache_itens{_rotulos(cache=cache_nome)} {valores['tamanho']}"
+        for cache_nome, valores in sorted(caches.items())
+    ])
+
+    lote = matching_lote.estatisticas()
+    metrica('amigo_lote_registros_total', 'counter', 'Registros recebidos pelo cálculo em lote (total e assinaturas distintas)', [
+        f"amigo_lote_registros_total{_rotulos(tipo=tipo, etapa=etapa)} {lote[campo]}"
+        for tipo in ('animais', 'adotantes')
+        for etapa, campo in (('total', tipo), ('distintos', f'{tipo}_distintos'))
+    ])
+    metrica('amigo_lote_pares_total', 'counter', 'Pares do cálculo em lote por etapa', [
+        f"amigo_lote_pares_total{_rotulos(etapa=etapa)} {lote[campo]}"
+        for etapa, campo in (('total', 'pares'), ('calculados', 'pares_calculados'),
+                             ('retornados', 'pares_retornados'), ('montados', 'pares_montados'))
+    ])
+
+    return '\n'.join(linhas) + '\n'
+
+
+def exportar_perfil(endpoint):
+    return _perfilador.exportar(endpoint)
+
+
+def endpoints_perfilados():
+    return _perfilador.endpoints_amostrados()
+
+
+# ==================== ATIVAÇÃO ====================
+
+def ativo():
+    return _ativo
+
+
+def init_app(app, perfil=None):
+    """Liga a instrumentação no app (conexões, JSON, funções de score e hooks)"""
+    global _ativo, _perfilador
+
+    if _ativo:
+        return
+    _ativo = True
+
+    conexao.configurar(fabrica=ConexaoMedida)
+
+    antigo = app.json
+    app.json = JSONMedido(app)
+    for atributo in ('ensure_ascii', 'sort_keys', 'compact', 'mimetype'):
+        setattr(app.json, atributo, getattr(antigo, atributo))
+
+    _instrumentar_scores()
+
+    if perfil is None:
+        perfil = os.environ.get('AMIGO_PERFIL')
+    _perfilador = Perfilador(_ler_endpoints_perfil(perfil))
+
+    app.before_request(_iniciar_requisicao)
+    app.after_request(_finalizar_requisicao)
+    app.teardown_request(_encerrar_requisicao)
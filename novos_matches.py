@@ -0,0 +1,185 @@
+"""
+novos_matches.py - Feed de novos matches por adotante
+
+Quando um animal é cadastrado, editado ou muda de status, os pares dele com
+cada adotante são pontuados pelo caminho em lote e os que atingem MIN_SCORE
+entram na tabela novos_matches (uma vez por par; saem se o par deixar de
+valer). A página de matches busca só essas novidades, por polling ou SSE, em
+vez de recalcular a lista inteira.
+"""
+
+import json
+from conexao import obter_conexao
+from eventos import registrar_ouvinte
+from indice_compatibilidade import indice_pronto, linhas_compatibilidade, ler_por_ids
+from registros import Animal
+import versoes
+
+# Score mínimo para um par entrar no feed (o mesmo padrão da lista de matches)
+MIN_SCORE = 50
+
+# Entradas mais antigas que isso são apagadas na inicialização
+DIAS_RETENCAO = 30
+
+# Animais pontuados por vez numa escrita em lote (importação)
+TAMANHO_LOTE = 500
+
+# O feed só registra escritas depois de criar_tabela(): a regeneração de tags
+# feita na inicialização não vira novidade
+_ativo = False
+
+
+def criar_tabela():
+    global _ativo
+    conn = obter_conexao()
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS novos_matches (
+                id INTEGER PRIMARY KEY,
+                adotante_id INTEGER NOT NULL,
+                animal_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                detalhes TEXT NOT NULL,
+                criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (animal_id, adotante_id)
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_novos_matches_adotante
+            ON novos_matches (adotante_id, id)
+        """)
+        conn.execute(
+            "DELETE FROM novos_matches WHERE criado_em < datetime('now', ?)",
+            (f'-{DIAS_RETENCAO} days',)
+        )
+    _ativo = True
+
+
+# ==================== ATUALIZAÇÃO ====================
+
+def _pares_validos(conn, animal_ids):
+    """Linhas (animal_id, adotante_id, score, detalhes) dos animais disponíveis com score >= MIN_SCORE"""
+    marcadores = ', '.join('?' for _ in animal_ids)
+
+    if indice_pronto():
+        # O índice de compatibilidade já recalculou esses animais (ouvinte registrado antes)
+        cur = conn.execute(f"""
+            SELECT c.animal_id, c.adotante_id, c.score, c.detalhes
+            FROM compatibilidade c
+            JOIN animais a ON a.id = c.animal_id
+            WHERE c.animal_id IN ({marcadores}) AND c.score >= ? AND a.status = 'Disponível'
+        """, [*animal_ids, MIN_SCORE])
+        return [tuple(linha) for linha in cur.fetchall()]
+
+    from adotantes_crud import ler_adotantes_registros
+
+    animais = [a for a in ler_por_ids('animais', Animal, animal_ids) if a.get('status') == 'Disponível']
+    if not animais:
+        return []
+    return [linha for linha in linhas_compatibilidade(animais, ler_adotantes_registros()) if linha[2] >= MIN_SCORE]
+
+
+def atualizar_feed(animal_ids):
+    """Acrescenta ao feed os pares novos dos animais e tira os que deixaram de valer.
+
+    Pares que continuam valendo mantêm o id (não reaparecem como novidade),
+    só o score e os detalhes são atualizados.
+    """
+    conn = obter_conexao()
+    for inicio in range(0, len(animal_ids), TAMANHO_LOTE):
+        lote = animal_ids[inicio:inicio + TAMANHO_LOTE]
+        validos = {(linha[0], linha[1]): linha for linha in _pares_validos(conn, lote)}
+
+        marcadores = ', '.join('?' for _ in lote)
+        existentes = {
+            (linha[0], linha[1])
+            for linha in conn.execute(
+                f"SELECT animal_id, adotante_id FROM novos_matches WHERE animal_id IN ({marcadores})", lote
+            )
+        }
+
+        novos = [validos[par] for par in sorted(validos.keys() - existentes)]
+        mantidos = [(validos[par][2], validos[par][3], *par) for par in validos.keys() & existentes]
+        removidos = list(existentes - validos.keys())
+
+        with conn:
+            conn.executemany(
+                "INSERT INTO novos_matches (animal_id, adotante_id, score, detalhes) VALUES (?, ?, ?, ?)",
+                novos
+            )
+            conn.executemany(
+                "UPDATE novos_matches SET score = ?, detalhes = ? WHERE animal_id = ? AND adotante_id = ?",
+                mantidos
+            )
+            conn.executemany(
+                "DELETE FROM novos_matches WHERE animal_id = ? AND adotante_id = ?",
+                removidos
+            )
+            if novos or removidos:
+                versoes.incrementar(conn, 'novos_matches')
+
+
+def _remover(coluna, registro_id):
+    conn = obter_conexao()
+    with conn:
+        cur = conn.execute(f"DELETE FROM novos_matches WHERE {coluna} = ?", (registro_id,))
+        if cur.rowcount:
+            versoes.incrementar(conn, 'novos_matches')
+
+
+def _ao_escrever_animal(acao, animal_id):
+    if not _ativo:
+        return
+    if acao == 'removido':
+        _remover('animal_id', animal_id)
+    else:
+        atualizar_feed(animal_id if isinstance(animal_id, list) else [animal_id])
+
+
+def _ao_escrever_adotante(acao, adotante_id):
+    if _ativo and acao == 'removido':
+        _remover('adotante_id', adotante_id)
+
+
+registrar_ouvinte('animais', _ao_escrever_animal)
+registrar_ouvinte('adotantes', _ao_escrever_adotante)
+
+
+# ==================== LEITURA ====================
+
+def ultimo_id(adotante_id):
+    """Id da entrada mais recente do adotante (0 se o feed estiver vazio)"""
+    cur = obter_conexao().execute(
+        "SELECT COALESCE(MAX(id), 0) FROM novos_matches WHERE adotante_id = ?", (adotante_id,)
+    )
+    return cur.fetchone()[0]
+
+
+def ler_novos_matches(adotante_id, desde=0, limit=50):
+    """Entradas do adotante com id > desde, em ordem de chegada, no formato compacto dos matches"""
+    from animal_crud import preparar_animal_dict
+
+    cur = obter_conexao().execute("""
+        SELECT n.id AS n_id, n.score AS n_score, n.detalhes AS n_detalhes, n.criado_em AS n_criado_em,
+               n.adotante_id AS n_adotante_id, a.*
+        FROM novos_matches n
+        JOIN animais a ON a.id = n.animal_id
+        WHERE n.adotante_id = ? AND n.id > ?
+        ORDER BY n.id
+        LIMIT ?
+    """, (adotante_id, desde, limit))
+
+    itens = []
+    for linha in cur:
+        animal = dict(linha)
+        compat = {'score': animal.pop('n_score')}
+        compat.update(json.loads(animal.pop('n_detalhes')))
+        compat['animal_id'] = animal['id']
+        compat['adotante_id'] = animal.pop('n_adotante_id')
+        itens.append({
+            'id': animal.pop('n_id'),
+            'criado_em': animal.pop('n_criado_em'),
+            'animal': preparar_animal_dict(animal),
+            'compatibility': compat
+        })
+    return itens
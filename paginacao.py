@@ -0,0 +1,94 @@
+"""
+paginacao.py - Paginação por cursor (keyset) e projeção de colunas
+
+As listas da API aceitam `limit`, `cursor` e `fields`. O cursor guarda os
+valores da chave de ordenação do último item da página, de modo que a
+próxima página é um `WHERE chave > ?` que usa índice, sem OFFSET. A
+projeção vira a lista de colunas do SELECT.
+"""
+
+import base64
+import json
+from conexao import obter_conexao
+
+# Maior página aceita quando o cliente informa `limit`
+LIMITE_MAXIMO = 500
+
+_colunas_por_tabela = {}
+
+
+def colunas_tabela(tabela):
+    """Colunas reais da tabela (consultado uma vez por processo)"""
+    if tabela not in _colunas_por_tabela:
+        cur = obter_conexao().cursor()
+        cur.execute(f"PRAGMA table_info({tabela})")
+        _colunas_por_tabela[tabela] = [row[1] for row in cur.fetchall()]
+    return _colunas_por_tabela[tabela]
+
+
+def ler_campos(texto):
+    """Converte 'id,nome,especie' em lista (None = todos os campos)"""
+    if not texto:
+        return None
+    campos = [c.strip() for c in texto.split(',') if c.strip()]
+    return campos or None
+
+
+def resolver_colunas(tabela, campos, derivados=None, obrigatorias=('id',)):
+    """Colunas do SELECT para atender `campos`.
+
+    `derivados` mapeia campos calculados em Python (ex.: idade_formatada)
+    para as colunas de que dependem. Levanta ValueError para campo desconhecido.
+    """
+    if campos is None:
+        return None
+
+    derivados = derivados or {}
+    existentes = colunas_tabela(tabela)
+    colunas = list(obrigatorias)
+
+    for campo in campos:
+        if campo in existentes:
+            dependencias = [campo]
+        elif campo in derivados:
+            dependencias = derivados[campo]
+        else:
+            raise ValueError(f'Campo desconhecido: {campo}')
+
+        for coluna in dependencias:
+            if coluna not in colunas:
+                colunas.append(coluna)
+    return colunas
+
+
+def projetar(registro, campos):
+    """Mantém só os campos pedidos (na ordem pedida)"""
+    if campos is None:
+        return registro
+    return {campo: registro.get(campo) for campo in campos}
+
+
+def codificar_cursor(valores):
+    texto = json.dumps(list(valores), ensure_ascii=False)
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, quantidade):
+    """Devolve a lista de valores do cursor ou levanta ValueError"""
+    if not cursor:
+        return None
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + preenchimento).decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Cursor inválido')
+
+    if not isinstance(valores, list) or len(valores) != quantidade:
+        raise ValueError('Cursor inválido')
+    return valores
+
+
+def montar_select(tabela, colunas):
+    if colunas is None:
+        return f"SELECT * FROM {tabela}"
+    return f"SELECT {', '.join(colunas)} FROM {tabela}"
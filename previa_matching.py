@@ -0,0 +1,125 @@
+"""
+previa_matching.py - Prévia de matches para um perfil de adotante ainda não salvo
+
+Os animais disponíveis ficam empacotados em memória (arrays do matching_lote,
+agrupados por assinatura), a partir do índice de candidatos. Uma prévia só
+empacota o adotante hipotético e calcula o bloco 1xN, sem ler nem gravar no
+banco; o pacote é refeito quando o índice muda.
+"""
+
+import threading
+import numpy as np
+from indice_candidatos import geracao_indice, animais_disponiveis
+from matching_lote import (
+    agrupar,
+    chave_animal,
+    classes_animais,
+    empacotar_animais,
+    empacotar_adotantes,
+    calcular_scores_lote,
+    montar_compatibilidade
+)
+from registros import Adotante, como_dict
+
+_lock = threading.Lock()
+_pacote = None
+
+
+def empacotar(animais):
+    """Pacote de uma lista de animais em ordem de id (ver obter_pacote)"""
+    representantes, grupo = agrupar(animais, chave_animal)
+    pacote = empacotar_animais(representantes)
+    return {
+        'animais': animais,
+        'representantes': representantes,
+        'grupo': grupo,
+        'especies': np.array([(a.get('especie') or '').lower() for a in animais], dtype=object),
+        'pacote': pacote,
+        'classes': classes_animais(pacote)
+    }
+
+
+def _montar_pacote():
+    geracao, animais = animais_disponiveis()
+    return dict(empacotar(animais), geracao=geracao)
+
+
+def obter_pacote():
+    """Animais disponíveis empacotados, refeitos só se o índice de candidatos mudou"""
+    global _pacote
+    pacote = _pacote
+    if pacote is None or pacote['geracao'] != geracao_indice():
+        with _lock:
+            if _pacote is None or _pacote['geracao'] != geracao_indice():
+                _pacote = _montar_pacote()
+            pacote = _pacote
+    return pacote
+
+
+def adotante_hipotetico(dados):
+    """Registro de adotante montado do payload, como se tivesse sido salvo e lido de volta"""
+    return Adotante.da_linha(dict(dados))
+
+
+def melhores_animais(score, k, min_score, mascara=None):
+    """Para cada linha de um bloco MxN já expandido, as posições dos até k animais de maior score.
+
+    A ordem é a de /api/adotantes/<id>/matches: score arredondado decrescente
+    e, no empate, o menor id (os animais do pacote estão em ordem de id, então
+    é a menor posição). `mascara` restringe as colunas consideradas.
+    """
+    if mascara is not None:
+        score = np.where(mascara, score, -np.inf)
+
+    # Pré-filtro com folga de arredondamento; a comparação final usa round() do Python.
+    # Quem pode empatar (arredondado) com o k-ésimo ainda concorre pela posição.
+    limite = np.full(len(score), min_score - 0.05)
+    if k is not None and score.shape[1] > k:
+        corte = np.partition(score, score.shape[1] - k, axis=1)[:, score.shape[1] - k]
+        limite = np.maximum(limite, corte - 0.1)
+    linhas, colunas = np.nonzero(score >= limite[:, None])
+
+    arredondados = np.array([round(x, 1) for x in score[linhas, colunas].tolist()])
+    ordem = np.lexsort((colunas, -arredondados, linhas))
+    linhas, colunas, arredondados = linhas[ordem], colunas[ordem], arredondados[ordem]
+
+    # Posição de cada candidato dentro da sua linha
+    inicio_linha = np.searchsorted(linhas, np.arange(len(score)))
+    posto = np.arange(len(linhas)) - inicio_linha[linhas]
+    ficam = arredondados >= min_score
+    if k is not None:
+        ficam &= posto < k
+    linhas, colunas = linhas[ficam], colunas[ficam]
+
+    fim = np.searchsorted(linhas, np.arange(len(score)), side='right')
+    inicio = np.searchsorted(linhas, np.arange(len(score)))
+    colunas = colunas.tolist()
+    return [colunas[i:f] for i, f in zip(inicio.tolist(), fim.tolist())]
+
+
+def prever_matches(dados, k=10, min_score=50, especie=None):
+    """Top-K dos animais para um adotante hipotético, no formato compacto dos matches.
+
+    A ordem é a mesma de /api/adotantes/<id>/matches (ver melhores_animais).
+    O adotante não tem id, então a compatibilidade leva só o animal_id.
+    """
+    adotante = adotante_hipotetico(dados)
+    pacote = obter_pacote()
+    animais, representantes, grupo = pacote['animais'], pacote['representantes'], pacote['grupo']
+    if not animais or k == 0:
+        return []
+
+    pd = empacotar_adotantes([adotante], pacote['pacote']['vocabulario'])
+    scores = calcular_scores_lote(pacote['pacote'], pd, pacote['classes'])
+    score = scores['score'][0][grupo]
+
+    mascara = pacote['especies'] == especie.lower() if especie else None
+    ordenados = melhores_animais(score[None, :], k, min_score, mascara)[0]
+
+    itens = []
+    for j in ordenados:
+        compat = montar_compatibilidade(animais[j], adotante, scores, 0, grupo[j])
+        del compat['animal'], compat['adotante']
+        compat['animal_id'] = animais[j].id
+        itens.append({'animal': como_dict(animais[j]), 'compatibility': compat})
+    return itens
@@ -0,0 +1,222 @@
+"""
+registros.py - Registros compactos (__slots__) de animais, adotantes e tarefas
+
+As colunas JSON são decodificadas uma única vez, na leitura do banco, e a
+personalidade fica num vetor fixo de 6 posições (na ordem de TRACOS), que o
+motor de matching usa direto. Os registros aceitam a mesma leitura de um
+dict (get, [] e in) e viram dict com para_dict() na saída da API.
+"""
+
+import json
+
+TRACOS = ('brincalhao', 'afetuoso', 'energetico', 'corajoso', 'obediente', 'sociavel')
+TRACOS_NEUTROS = (50,) * len(TRACOS)
+
+# Marca colunas que não vieram no SELECT
+_AUSENTE = object()
+
+
+def _decodificar_json(valor, tipo_padrao):
+    # Mesmo tratamento de preparar_*_dict: vazio ou inválido vira o tipo padrão
+    if not valor:
+        return tipo_padrao()
+    if isinstance(valor, (dict, list)):
+        return valor
+    try:
+        return json.loads(valor)
+    except (json.JSONDecodeError, TypeError):
+        return tipo_padrao()
+
+
+# Tags e personalidades se repetem muito entre animais: o texto JSON de cada
+# combinação é decodificado uma vez e o resultado é compartilhado entre os
+# registros (somente leitura; para_dict entrega cópias)
+_decodificados = {}
+TAMANHO_CACHE_DECODIFICADOS = 4096
+
+
+def _decodificar_compartilhado(valor, tipo_padrao):
+    if not isinstance(valor, str):
+        return _decodificar_json(valor, tipo_padrao)
+
+    chave = (valor, tipo_padrao)
+    resultado = _decodificados.get(chave)
+    if resultado is None:
+        if len(_decodificados) >= TAMANHO_CACHE_DECODIFICADOS:
+            _decodificados.clear()
+        resultado = _decodificados[chave] = _decodificar_json(valor, tipo_padrao)
+    return resultado
+
+
+def _copiar(valor):
+    # Cópia profunda de um valor vindo de JSON (listas e dicts aninhados)
+    if isinstance(valor, list):
+        return [_copiar(item) for item in valor]
+    if isinstance(valor, dict):
+        return {chave: _copiar(item) for chave, item in valor.items()}
+    return valor
+
+
+def _vetor_tracos(personalidade):
+    """Vetor de 6 valores, na ordem de TRACOS (50 para traço ausente)"""
+    if not isinstance(personalidade, dict):
+        return TRACOS_NEUTROS
+    return tuple(personalidade.get(trait, 50) for trait in TRACOS)
+
+
+class Registro:
+    __slots__ = ()
+
+    # Colunas da tabela, na ordem usada no SELECT
+    COLUNAS = ()
+    # Campos calculados: nome -> método que os produz
+    DERIVADOS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._COLUNAS = frozenset(cls.COLUNAS)
+
+    @classmethod
+    def da_linha(cls, linha):
+        """Cria o registro a partir de uma sqlite3.Row (ou dict)"""
+        valores = linha if isinstance(linha, dict) else dict(zip(linha.keys(), tuple(linha)))
+        return cls._montar([(coluna, valores.get(coluna, _AUSENTE)) for coluna in cls.COLUNAS])
+
+    @classmethod
+    def do_cursor(cls, cur):
+        """Gera registros de um cursor já executado, resolvendo as colunas uma vez só"""
+        nomes = [d[0] for d in cur.description]
+        posicoes = [(coluna, nomes.index(coluna) if coluna in nomes else None) for coluna in cls.COLUNAS]
+        for linha in cur:
+            yield cls._montar([
+                (coluna, _AUSENTE if pos is None else linha[pos]) for coluna, pos in posicoes
+            ])
+
+    @classmethod
+    def _montar(cls, pares):
+        registro = cls.__new__(cls)
+        for coluna, valor in pares:
+            setattr(registro, coluna, valor)
+        registro._decodificar()
+        return registro
+
+    def _decodificar(self):
+        pass
+
+    def __getitem__(self, chave):
+        metodo = self.DERIVADOS.get(chave)
+        if metodo is not None:
+            return getattr(self, metodo)()
+        if chave in self._COLUNAS:
+            valor = getattr(self, chave)
+            if valor is not _AUSENTE:
+                return valor
+        raise KeyError(chave)
+
+    def __contains__(self, chave):
+        try:
+            self[chave]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, chave, padrao=None):
+        try:
+            return self[chave]
+        except KeyError:
+            return padrao
+
+    def keys(self):
+        chaves = [c for c in self.COLUNAS if getattr(self, c) is not _AUSENTE]
+        return chaves + list(self.DERIVADOS)
+
+    def para_dict(self):
+        # Cópias: as colunas JSON decodificadas são compartilhadas entre registros
+        return {chave: _copiar(self[chave]) for chave in self.keys()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)!r})"
+
+
+class Animal(Registro):
+    COLUNAS = ('id', 'nome', 'idade', 'raca', 'especie', 'saude', 'comportamento',
+               'data', 'status', 'tags', 'porte')
+    DERIVADOS = {'personalidade': '_personalidade'}
+
+    __slots__ = COLUNAS + ('tracos', '_comportamento')
+
+    def _decodificar(self):
+        comportamento = self.comportamento if self.comportamento is not _AUSENTE else None
+        self._comportamento = _decodificar_compartilhado(comportamento, dict)
+        self.tracos = _vetor_tracos(self._comportamento)
+        if self.tags is not _AUSENTE:
+            self.tags = _decodificar_compartilhado(self.tags, list)
+
+    def _personalidade(self):
+        # O comportamento decodificado inteiro, como em parsear_comportamento
+        return _copiar(self._comportamento)
+
+
+class Adotante(Registro):
+    COLUNAS = (
+        'id', 'nome', 'email', 'telefone', 'data_cadastro',
+        'idade', 'profissao', 'filhos', 'filhos_faixa_etaria',
+        'tipo_moradia', 'tamanho_moradia', 'tem_quintal', 'tamanho_quintal', 'localizacao', 'aluga_ou_possui',
+        'horas_trabalho_dia', 'horas_sozinho_dia', 'viagens_frequentes', 'dias_viagem_ano',
+        'nivel_atividade', 'hobbies',
+        'experiencia_previa', 'animais_tidos', 'problemas_passados',
+        'tamanho_preferido', 'idade_preferida', 'genero_preferido',
+        'tem_outros_animais', 'quantidade_outros_animais', 'tipo_outros_animais',
+        'orcamento_mensal_min', 'orcamento_mensal_max', 'disponibilidade_tempo_diario', 'comprometimento_texto',
+        'tracos_preferidos', 'tags_ideais', 'tem_preferencia_tracos'
+    )
+    CAMPOS_JSON = {
+        'hobbies': list,
+        'animais_tidos': list,
+        'tipo_outros_animais': list,
+        'tags_ideais': list,
+        'tracos_preferidos': dict
+    }
+    CAMPOS_BOOLEANOS = ('tem_quintal', 'viagens_frequentes', 'tem_outros_animais', 'tem_preferencia_tracos')
+
+    __slots__ = COLUNAS + ('tracos',)
+
+    def _decodificar(self):
+        for campo, tipo_padrao in self.CAMPOS_JSON.items():
+            valor = getattr(self, campo)
+            setattr(self, campo, _decodificar_compartilhado(None if valor is _AUSENTE else valor, tipo_padrao))
+
+        for campo in self.CAMPOS_BOOLEANOS:
+            valor = getattr(self, campo)
+            if valor is not _AUSENTE:
+                setattr(self, campo, bool(valor))
+
+        # Sem preferências definidas = neutro (50 em tudo)
+        self.tracos = _vetor_tracos(self.tracos_preferidos)
+
+
+class Tarefa(Registro):
+    COLUNAS = ('id', 'animal_id', 'nome', 'tarefa', 'data', 'responsavel')
+
+    __slots__ = COLUNAS
+
+
+def tracos_animal(animal):
+    """Vetor de personalidade de um animal (registro ou dict)"""
+    if isinstance(animal, Animal):
+        return animal.tracos
+    return _vetor_tracos(animal.get('personalidade'))
+
+
+def tracos_adotante(adotante):
+    """Vetor de traços preferidos de um adotante (registro ou dict)"""
+    if isinstance(adotante, Adotante):
+        return adotante.tracos
+    return _vetor_tracos(_decodificar_json(adotante.get('tracos_preferidos'), dict))
+
+
+def como_dict(registro):
+    """Converte registros em dict para a saída JSON; dicts passam direto"""
+    if isinstance(registro, Registro):
+        return registro.para_dict()
+    return registro
@@ -0,0 +1,175 @@
+"""
+reprocessamento.py - Recálculo em massa da tabela de compatibilidade
+
+Usado quando os pesos do matching mudam ou depois de importar muitos
+adotantes. Os animais são divididos em blocos de ids e pontuados em
+paralelo por um ProcessPoolExecutor; os adotantes são lidos uma vez no
+processo principal e herdados (somente leitura) pelos processos filhos.
+O processo principal grava cada bloco devolvido numa transação própria.
+
+    python reprocessamento.py [--processos N] [--animais 1,2] [--adotantes 3,4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import conexao
+from conexao import obter_conexao
+from indice_compatibilidade import ler_por_ids, linhas_compatibilidade, gravar_linhas
+from registros import Animal, Adotante
+import versoes
+
+# Pares animal x adotante por tarefa enviada a um processo
+PARES_POR_BLOCO = 200000
+
+# Adotantes do job; preenchido antes de criar o pool (herdado no fork)
+_adotantes = None
+
+
+def _ler_adotantes(adotante_ids):
+    if adotante_ids is not None:
+        return ler_por_ids('adotantes', Adotante, adotante_ids)
+    cur = obter_conexao().cursor()
+    cur.execute("SELECT * FROM adotantes")
+    return list(Adotante.do_cursor(cur))
+
+
+def _ler_ids_animais(animal_ids):
+    if animal_ids is not None:
+        return sorted(set(animal_ids))
+    cur = obter_conexao().cursor()
+    cur.execute("SELECT id FROM animais ORDER BY id")
+    return [row[0] for row in cur.fetchall()]
+
+
+def _iniciar_processo(banco, adotante_ids):
+    global _adotantes
+    conexao.descartar_herdadas()
+    conexao.configurar(banco=banco)
+    # Sem fork (ex.: spawn) o processo não herdou os adotantes e lê do banco
+    if _adotantes is None:
+        _adotantes = _ler_adotantes(adotante_ids)
+
+
+def _pontuar_bloco(animal_ids):
+    animais = ler_por_ids('animais', Animal, animal_ids)
+    return len(animal_ids), linhas_compatibilidade(animais, _adotantes)
+
+
+def _contexto_processos():
+    # fork compartilha os adotantes já carregados sem copiá-los (Linux)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _remover_orfaos(conn):
+    conn.execute("""
+        DELETE FROM compatibilidade
+        WHERE animal_id NOT IN (SELECT id FROM animais)
+           OR adotante_id NOT IN (SELECT id FROM adotantes)
+    """)
+    versoes.incrementar(conn, 'compatibilidade')
+
+
+def reprocessar(animal_ids=None, adotante_ids=None, processos=None, tamanho_bloco=None, ao_progresso=None):
+    """Recalcula os pares dos animais x adotantes indicados (None = todos).
+
+    `ao_progresso(animais_feitos, total_animais, pares_gravados)` é chamado a
+    cada bloco gravado. Retorna o total de pares gravados.
+    """
+    global _adotantes
+
+    processos = processos or os.cpu_count() or 1
+    ids = _ler_ids_animais(animal_ids)
+    _adotantes = _ler_adotantes(adotante_ids)
+    if not ids or not _adotantes:
+        return 0
+
+    tamanho_bloco = tamanho_bloco or max(1, PARES_POR_BLOCO // len(_adotantes))
+    blocos = [ids[i:i + tamanho_bloco] for i in range(0, len(ids), tamanho_bloco)]
+
+    conn = obter_conexao()
+    feitos = 0
+    gravados = 0
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=processos,
+            mp_context=_contexto_processos(),
+            initializer=_iniciar_processo,
+            initargs=(conexao.BANCO, adotante_ids)
+        ) as pool:
+            # Poucos blocos em voo por vez para não acumular resultados na memória
+            pendentes = set()
+            proximo = 0
+            while proximo < len(blocos) or pendentes:
+                while proximo < len(blocos) and len(pendentes) < processos * 2:
+                    pendentes.add(pool.submit(_pontuar_bloco, blocos[proximo]))
+                    proximo += 1
+
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    quantidade, linhas = futuro.result()
+                    with conn:
+                        gravados += gravar_linhas(conn, linhas)
+                    feitos += quantidade
+                    if ao_progresso:
+                        ao_progresso(feitos, len(ids), gravados)
+    finally:
+        _adotantes = None
+
+    if animal_ids is None and adotante_ids is None:
+        with conn:
+            _remover_orfaos(conn)
+    return gravados
+
+
+# ==================== LINHA DE COMANDO ====================
+
+def _ler_ids(texto):
+    if not texto:
+        return None
+    return [int(parte) for parte in texto.split(',') if parte.strip()]
+
+
+def main(argv=None):
+    from animal_crud import criar_tabela as criar_tabela_animais
+    from adotantes_crud import criar_tabela as criar_tabela_adotantes
+    from indice_compatibilidade import criar_tabela as criar_tabela_compatibilidade
+
+    parser = argparse.ArgumentParser(description='Recalcula a tabela de compatibilidade do Amigo+')
+    parser.add_argument('--processos', type=int, help='Processos em paralelo (padrão: núcleos da máquina)')
+    parser.add_argument('--bloco', type=int, help='Animais por tarefa (padrão: automático)')
+    parser.add_argument('--animais', help='Ids dos animais, separados por vírgula (padrão: todos)')
+    parser.add_argument('--adotantes', help='Ids dos adotantes, separados por vírgula (padrão: todos)')
+    args = parser.parse_args(argv)
+
+    criar_tabela_animais()
+    criar_tabela_adotantes()
+    criar_tabela_compatibilidade()
+
+    inicio = time.perf_counter()
+
+    def mostrar_progresso(feitos, total, gravados):
+        decorrido = time.perf_counter() - inicio
+        print(f"{feitos}/{total} animais, {gravados} pares gravados ({decorrido:.1f}s)", file=sys.stderr)
+
+    gravados = reprocessar(
+        animal_ids=_ler_ids(args.animais),
+        adotante_ids=_ler_ids(args.adotantes),
+        processos=args.processos,
+        tamanho_bloco=args.bloco,
+        ao_progresso=mostrar_progresso
+    )
+    decorrido = time.perf_counter() - inicio
+    print(f"{gravados} pares recalculados em {decorrido:.1f}s ({gravados / max(decorrido, 1e-9):.0f} pares/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -57,10 +57,17 @@ async function applyFilterViaAPI(filterType) {
             filtros.status = 'Disponível';
         }
 
-        // Buscar dados via API centralizada
-        const animals = filterType === 'all'
-            ? await AnimalService.getAllAnimals()
-            : await AnimalService.filterAnimals(filtros);
+        // Buscar dados via API centralizada (com o resumo de tarefas dos cards)
+        let animals;
+        if (filterType === 'all') {
+            animals = await AnimalService.getAllAnimals(null, 'tarefas');
+        } else {
+            animals = await AnimalService.filterAnimals(filtros);
+            if (animals.length) {
+                const resumos = await AnimalService.getTaskSummaries(animals.map(animal => animal.id));
+                animals.forEach(animal => { animal.tarefas = resumos[animal.id]; });
+            }
+        }
 
         // Atualizar DOM com resultados
         renderAnimalList(animals, filterType);
@@ -222,8 +222,8 @@ class AnimalDetailPanel {
         const container = document.getElementById('potenciaisAdotantesDetailPanel');
         if (!container) return;
 
-        fetch(`/api/matching/animal/${animalId}`)
-            .then(response => response.json())
+        AnimalService.fetchCached(`/api/matching/animal/${animalId}?min_score=70&limit=3&compacto=1`)
+            .then(resposta => resposta.data)
             .then(matches => {
                 // Filtrar apenas top 3 com score >= 70%
                 const topMatches = matches
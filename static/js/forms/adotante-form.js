@@ -12,6 +12,12 @@ const STORAGE_KEY = 'adotante_form_draft';
 const TOTAL_STEPS = 8;
 let currentStep = 1;
 
+// Prévia de matches: recalculada pouco depois da última mudança no formulário
+const PREVIA_ESPERA_MS = 300;
+const PREVIA_LIMITE = 5;
+let previaTimer = null;
+let previaControle = null;
+
 // ==================== INICIALIZAÇÃO ====================
 
 document.addEventListener('DOMContentLoaded', function() {
@@ -20,6 +26,7 @@ document.addEventListener('DOMContentLoaded', function() {
     setupEventListeners();
     updateProgressBar();
     loadAdotantesList();
+    agendarPrevia();
 });
 
 /**
@@ -44,9 +51,11 @@ function setupEventListeners() {
         field.addEventListener('change', function() {
             saveFormState();
             handleConditionalFields();
+            agendarPrevia();
         });
         field.addEventListener('input', function() {
             saveFormState();
+            agendarPrevia();
         });
     });
 
@@ -325,18 +334,10 @@ function clearFormState() {
 // ==================== SUBMIT ====================
 
 /**
- * Trata submit do formulário
+ * Coleta os dados do formulário no formato da API
+ * @returns {Object} Campos do adotante
  */
-async function handleFormSubmit(e) {
-    e.preventDefault();
-
-    // Validar última seção
-    if (!validateSection(currentStep)) {
-        showMessage('Por favor, preencha todos os campos obrigatórios.', 'error');
-        return;
-    }
-
-    // Coletar dados do formulário
+function coletarDadosFormulario() {
     const form = document.getElementById('adotanteForm');
     const formData = new FormData(form);
     const data = Object.fromEntries(formData);
@@ -356,6 +357,24 @@ async function handleFormSubmit(e) {
     data.tem_outros_animais = data.tem_outros_animais === '1';
     data.tem_preferencia_tracos = data.tem_preferencia_tracos === '1';
 
+    return data;
+}
+
+/**
+ * Trata submit do formulário
+ */
+async function handleFormSubmit(e) {
+    e.preventDefault();
+
+    // Validar última seção
+    if (!validateSection(currentStep)) {
+        showMessage('Por favor, preencha todos os campos obrigatórios.', 'error');
+        return;
+    }
+
+    // Coletar dados do formulário
+    const form = document.getElementById('adotanteForm');
+    const data = coletarDadosFormulario();
 
     try {
         showMessage('Enviando cadastro...', 'info');
@@ -372,6 +391,7 @@ async function handleFormSubmit(e) {
         updateProgressBar();
         updateNavigationButtons();
         handleConditionalFields(); // Resetar campos condicionais
+        agendarPrevia();
 
         // Limpar inputs
         form.querySelectorAll('input, select, textarea').forEach(field => {
@@ -397,10 +417,7 @@ async function loadAdotantesList() {
         const listContainer = document.getElementById('adotanteList');
         if (!listContainer) return;
 
-        const response = await fetch('/api/adotantes');
-        if (!response.ok) throw new Error('Erro ao carregar adotantes');
-
-        const adotantes = await response.json();
+        const adotantes = await AdotanteService.getAllAdotantes();
 
         if (adotantes.length === 0) {
             listContainer.innerHTML = `
@@ -464,6 +481,71 @@ function visualizarAdotante(adotanteId) {
     window.location.href = `/adotantes/${adotanteId}/matches`;
 }
 
+// ==================== PRÉVIA DE MATCHES ====================
+
+/**
+ * Agenda o recálculo da prévia (uma requisição por pausa na digitação)
+ */
+function agendarPrevia() {
+    clearTimeout(previaTimer);
+    previaTimer = setTimeout(atualizarPrevia, PREVIA_ESPERA_MS);
+}
+
+/**
+ * Busca os melhores matches do perfil como está no formulário, sem salvá-lo
+ */
+async function atualizarPrevia() {
+    const lista = document.getElementById('previaLista');
+    if (!lista) return;
+
+    // Uma resposta atrasada não pode sobrescrever a mais nova
+    if (previaControle) previaControle.abort();
+    previaControle = new AbortController();
+
+    try {
+        const matches = await AdotanteService.previewMatches(
+            coletarDadosFormulario(), PREVIA_LIMITE, previaControle.signal
+        );
+        renderizarPrevia(lista, matches);
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Erro ao atualizar prévia de matches:', error);
+        }
+    }
+}
+
+/**
+ * Mostra os matches da prévia
+ * @param {HTMLElement} lista - Elemento da lista
+ * @param {Array} matches - Matches no formato compacto
+ */
+function renderizarPrevia(lista, matches) {
+    lista.innerHTML = '';
+
+    if (matches.length === 0) {
+        const vazio = document.createElement('li');
+        vazio.className = 'previa-vazia';
+        vazio.textContent = 'Nenhum animal compatível com o perfil até agora';
+        lista.appendChild(vazio);
+        return;
+    }
+
+    matches.forEach(match => {
+        const item = document.createElement('li');
+        item.className = 'previa-item';
+
+        const nome = document.createElement('span');
+        nome.textContent = `${match.animal.nome} (${match.animal.especie})`;
+
+        const score = document.createElement('span');
+        score.className = 'previa-score';
+        score.textContent = `${match.compatibility.score}%`;
+
+        item.append(nome, score);
+        lista.appendChild(item);
+    });
+}
+
 // ==================== MENSAGENS ====================
 
 /**
@@ -89,11 +89,27 @@ function renderAnimalList(animals, filterType = 'all') {
                 </div>
             </div>
             <span class="badge ${badgeClass}">● ${statusText}</span>
+            ${formatTaskSummary(animal.tarefas)}
         </div>
     `;
     }).join('');
 }
 
+/**
+ * Formata o resumo de tarefas do card (vem de /api/animals?incluir=tarefas)
+ * @param {Object} resumo - {count, proxima_data, atrasadas}
+ * @returns {string} HTML do resumo ou vazio
+ */
+function formatTaskSummary(resumo) {
+    if (!resumo || !resumo.count) return '';
+
+    let texto = `${resumo.count} ${resumo.count === 1 ? 'tarefa' : 'tarefas'}`;
+    if (resumo.atrasadas) {
+        texto += ` • ${resumo.atrasadas} ${resumo.atrasadas === 1 ? 'atrasada' : 'atrasadas'}`;
+    }
+    return `<span class="tarefas-count">${texto}</span>`;
+}
+
 /**
  * Busca animais por texto
  * @param {string} searchTerm - Termo de busca
@@ -478,8 +494,7 @@ function carregarAnimaisNoDropdown() {
     const select = document.getElementById('animalSelect');
     if (!select) return;
 
-    fetch('/api/animals')
-        .then(response => response.json())
+    AnimalService.getAllAnimals(['id', 'nome', 'especie', 'raca'])
         .then(animais => {
             if (animais.length === 0) {
                 select.innerHTML = '<option value="">Nenhum animal cadastrado</option>';
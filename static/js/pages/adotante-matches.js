@@ -7,6 +7,16 @@ let currentAdotanteId = null;
 let allMatches = [];
 let currentFilter = 'all';
 
+// Paginação: os matches chegam do servidor em páginas já ordenadas
+const MATCHES_POR_PAGINA = 20;
+let matchesOffset = 0;
+let temMaisMatches = false;
+
+// Novos matches: o feed do adotante é consultado periodicamente (com ETag,
+// uma consulta sem novidades volta 304) e só as novidades entram na lista
+const INTERVALO_NOVOS_MATCHES = 15000;
+let ultimoNovoMatch = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Extrair ID do adotante da URL (/adotantes/<id>/matches)
     const pathSegments = window.location.pathname.split('/').filter(s => s);
@@ -26,6 +36,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Carregar dados
     loadAdotanteInfo();
     loadMatches();
+    iniciarNovosMatches();
 });
 
 /**
@@ -164,25 +175,26 @@ function formatarExperiencia(exp) {
 }
 
 /**
- * Carrega animais compatíveis com o adotante
+ * Carrega a próxima página de animais compatíveis com o adotante
  */
 async function loadMatches() {
     try {
-        const url = `/api/adotantes/${currentAdotanteId}/matches`;
-        console.log('Fetching matches:', url);
-        const response = await fetch(url);
-
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-        }
+        console.log('Fetching matches:', currentAdotanteId, matchesOffset);
+        const pagina = await AdotanteService.getMatchesForAdotante(currentAdotanteId, {
+            limit: MATCHES_POR_PAGINA,
+            offset: matchesOffset
+        });
+        console.log('Matches raw:', pagina);
 
-        allMatches = await response.json();
-        console.log('Matches raw:', allMatches);
+        matchesOffset += pagina.length;
+        temMaisMatches = pagina.length === MATCHES_POR_PAGINA;
 
-        // Filtrar apenas matches com score >= 50%
-        allMatches = allMatches.filter(match => {
-            return match && match.compatibility && match.compatibility.score >= 50;
-        });
+        // Filtrar apenas matches com score >= 50% (e os que já vieram pelo feed de novidades)
+        const carregados = new Set(allMatches.map(m => m.animal.id));
+        allMatches = allMatches.concat(pagina.filter(match => {
+            return match && match.compatibility && match.compatibility.score >= 50
+                && !carregados.has(match.animal.id);
+        }));
 
         console.log('Matches filtered (>= 50%):', allMatches);
 
@@ -196,14 +208,47 @@ async function loadMatches() {
 
         console.log('Matches sorted:', allMatches);
 
-        // Renderizar matches
-        renderMatches(allMatches);
+        // Renderizar matches (respeitando o filtro atual)
+        renderMatches(getMatchesFiltrados(currentFilter));
     } catch (error) {
         console.error('Erro ao carregar matches:', error);
         showError('Erro ao carregar animais compatíveis: ' + error.message);
     }
 }
 
+/**
+ * Guarda o cursor atual do feed e começa a consultá-lo
+ */
+async function iniciarNovosMatches() {
+    try {
+        const cursor = await AdotanteService.getNovosMatches(currentAdotanteId);
+        ultimoNovoMatch = cursor.ultimo_id;
+        setInterval(buscarNovosMatches, INTERVALO_NOVOS_MATCHES);
+    } catch (error) {
+        console.error('Erro ao iniciar novos matches:', error);
+    }
+}
+
+/**
+ * Acrescenta à lista os matches surgidos desde a última consulta
+ */
+async function buscarNovosMatches() {
+    try {
+        const resposta = await AdotanteService.getNovosMatches(currentAdotanteId, ultimoNovoMatch);
+        ultimoNovoMatch = resposta.ultimo_id;
+        if (resposta.matches.length === 0) return;
+
+        resposta.matches.forEach(novo => {
+            allMatches = allMatches.filter(m => m.animal.id !== novo.animal.id);
+            allMatches.push({ animal: novo.animal, compatibility: novo.compatibility });
+        });
+        allMatches.sort((a, b) => b.compatibility.score - a.compatibility.score);
+        renderMatches(getMatchesFiltrados(currentFilter));
+    } catch (error) {
+        console.error('Erro ao buscar novos matches:', error);
+    }
+}
+
 /**
  * Renderiza os cards de animais compatíveis
  * @param {Array} matches - Lista de matches a renderizar
@@ -225,6 +270,33 @@ function renderMatches(matches) {
         const card = createAnimalMatchCard(match);
         list.appendChild(card);
     });
+
+    if (temMaisMatches) {
+        const loadMore = document.createElement('button');
+        loadMore.className = 'btn btn-secondary';
+        loadMore.textContent = 'Carregar mais';
+        loadMore.onclick = function() {
+            this.disabled = true;
+            loadMatches();
+        };
+        list.appendChild(loadMore);
+    }
+}
+
+/**
+ * Retorna os matches carregados que pertencem ao nível informado
+ * @param {string} level - Nível de compatibilidade (all, excellent, good)
+ */
+function getMatchesFiltrados(level) {
+    switch(level) {
+        case 'excellent':
+            return allMatches.filter(m => m.compatibility.score >= 80);
+        case 'good':
+            return allMatches.filter(m => m.compatibility.score >= 65 && m.compatibility.score < 80);
+        case 'all':
+        default:
+            return allMatches;
+    }
 }
 
 /**
@@ -241,19 +313,7 @@ function filterMatches(level) {
     event.target.classList.add('active');
 
     // Filtrar
-    let filtered = allMatches;
-
-    switch(level) {
-        case 'excellent':
-            filtered = allMatches.filter(m => m.compatibility.score >= 80);
-            break;
-        case 'good':
-            filtered = allMatches.filter(m => m.compatibility.score >= 65 && m.compatibility.score < 80);
-            break;
-        case 'all':
-        default:
-            filtered = allMatches;
-    }
+    const filtered = getMatchesFiltrados(level);
 
     // Renderizar
     renderMatches(filtered);
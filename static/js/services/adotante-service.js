@@ -5,17 +5,102 @@
  */
 
 class AdotanteService {
+    // Itens por página ao percorrer a lista de adotantes
+    static PAGE_SIZE = 200;
+
+    // ==================== CACHE HTTP ====================
+
+    // Respostas guardadas por URL ({etag, data, nextCursor}); a sessionStorage
+    // mantém o cache entre as páginas da sessão
+    static CACHE_PREFIX = 'amigo-cache:';
+    static cache = new Map();
+
+    /**
+     * GET condicional: envia If-None-Match com a ETag guardada e, se o
+     * servidor responder 304, reaproveita os dados já baixados
+     * @param {string} url - URL completa (com query string)
+     * @param {string} mensagemErro - Mensagem do erro se a resposta falhar
+     * @returns {Promise} {data, nextCursor}
+     */
+    static async fetchCached(url, mensagemErro = 'Erro na requisição') {
+        const chave = AdotanteService.CACHE_PREFIX + url;
+        let guardado = AdotanteService.cache.get(chave);
+        if (!guardado) {
+            try {
+                guardado = JSON.parse(sessionStorage.getItem(chave));
+            } catch (e) {
+                guardado = null;
+            }
+        }
+
+        // no-store: o 304 precisa chegar aqui, e não ser resolvido pelo cache do navegador
+        const response = await fetch(url, {
+            cache: 'no-store',
+            headers: guardado ? { 'If-None-Match': guardado.etag } : {}
+        });
+        if (response.status === 304 && guardado) {
+            AdotanteService.cache.set(chave, guardado);
+            return guardado;
+        }
+        if (!response.ok) throw new Error(mensagemErro);
+
+        const resultado = {
+            data: await response.json(),
+            nextCursor: response.headers.get('X-Next-Cursor')
+        };
+        const etag = response.headers.get('ETag');
+        if (etag) {
+            const entrada = { etag, ...resultado };
+            AdotanteService.cache.set(chave, entrada);
+            try {
+                sessionStorage.setItem(chave, JSON.stringify(entrada));
+            } catch (e) {
+                // Cota da sessionStorage esgotada: fica só o cache em memória
+            }
+        }
+        return resultado;
+    }
+
     // ==================== CRUD BÁSICO ====================
 
     /**
-     * Obtém todos os adotantes
+     * Obtém uma página de adotantes (mais recentes primeiro)
+     * @param {Object} opcoes - {limit, cursor, fields}
+     * @returns {Promise} {items, nextCursor} (nextCursor null na última página)
+     */
+    static async getAdotantesPage(opcoes = {}) {
+        try {
+            const params = new URLSearchParams();
+            params.append('limit', opcoes.limit || AdotanteService.PAGE_SIZE);
+            if (opcoes.cursor) params.append('cursor', opcoes.cursor);
+            if (opcoes.fields) params.append('fields', [].concat(opcoes.fields).join(','));
+
+            const resposta = await AdotanteService.fetchCached(`/api/adotantes?${params.toString()}`, 'Erro ao obter adotantes');
+            return {
+                items: resposta.data,
+                nextCursor: resposta.nextCursor
+            };
+        } catch (error) {
+            console.error('AdotanteService.getAdotantesPage:', error);
+            throw error;
+        }
+    }
+
+    /**
+     * Obtém todos os adotantes, página a página
+     * @param {Array|string} fields - Campos desejados (opcional, padrão: todos)
      * @returns {Promise} Lista de adotantes
      */
-    static async getAllAdotantes() {
+    static async getAllAdotantes(fields = null) {
         try {
-            const response = await fetch('/api/adotantes');
-            if (!response.ok) throw new Error('Erro ao obter adotantes');
-            return await response.json();
+            let adotantes = [];
+            let cursor = null;
+            do {
+                const page = await AdotanteService.getAdotantesPage({ cursor, fields });
+                adotantes = adotantes.concat(page.items);
+                cursor = page.nextCursor;
+            } while (cursor);
+            return adotantes;
         } catch (error) {
             console.error('AdotanteService.getAllAdotantes:', error);
             throw error;
@@ -149,15 +234,22 @@ class AdotanteService {
     }
 
     /**
-     * Obtém todos os animais compatíveis para um adotante (score >= 70%)
+     * Obtém animais compatíveis para um adotante (score >= 50%)
      * @param {number} adotante_id - ID do adotante
+     * @param {Object} paginacao - {limit, offset} (opcional)
      * @returns {Promise} Lista de animais com scores de compatibilidade
      */
-    static async getMatchesForAdotante(adotante_id) {
+    static async getMatchesForAdotante(adotante_id, paginacao = {}) {
         try {
-            const response = await fetch(`/api/adotantes/${adotante_id}/matches`);
-            if (!response.ok) throw new Error('Erro ao buscar matches');
-            return await response.json();
+            const params = new URLSearchParams();
+            if (paginacao.limit != null) params.append('limit', paginacao.limit);
+            if (paginacao.offset) params.append('offset', paginacao.offset);
+            // A compatibilidade vem só com os ids do par (o item já traz a entidade)
+            params.append('compacto', '1');
+
+            const url = `/api/adotantes/${adotante_id}/matches?${params.toString()}`;
+            const resposta = await AdotanteService.fetchCached(url, 'Erro ao buscar matches');
+            return resposta.data;
         } catch (error) {
             console.error('AdotanteService.getMatchesForAdotante:', error);
             throw error;
@@ -165,20 +257,68 @@ class AdotanteService {
     }
 
     /**
-     * Obtém todos os adotantes compatíveis para um animal (score >= 70%)
+     * Obtém adotantes compatíveis para um animal (score >= 50%)
      * @param {number} animal_id - ID do animal
+     * @param {Object} paginacao - {limit, offset} (opcional)
      * @returns {Promise} Lista de adotantes com scores de compatibilidade
      */
-    static async getMatchesForAnimal(animal_id) {
+    static async getMatchesForAnimal(animal_id, paginacao = {}) {
         try {
-            const response = await fetch(`/api/matching/animal/${animal_id}`);
-            if (!response.ok) throw new Error('Erro ao buscar adotantes compatíveis');
-            return await response.json();
+            const params = new URLSearchParams();
+            if (paginacao.limit != null) params.append('limit', paginacao.limit);
+            if (paginacao.offset) params.append('offset', paginacao.offset);
+            // A compatibilidade vem só com os ids do par (o item já traz a entidade)
+            params.append('compacto', '1');
+
+            const url = `/api/matching/animal/${animal_id}?${params.toString()}`;
+            const resposta = await AdotanteService.fetchCached(url, 'Erro ao buscar adotantes compatíveis');
+            return resposta.data;
         } catch (error) {
             console.error('AdotanteService.getMatchesForAnimal:', error);
             throw error;
         }
     }
+
+    /**
+     * Prévia dos matches de um perfil ainda não salvo (nada é gravado)
+     * @param {Object} dados - Campos do adotante, como no cadastro
+     * @param {number} limit - Quantos matches devolver
+     * @param {AbortSignal} signal - Para cancelar uma prévia já obsoleta (opcional)
+     * @returns {Promise} Lista de matches no formato compacto
+     */
+    static async previewMatches(dados, limit = 5, signal = null) {
+        const response = await fetch(`/api/matching/preview?limit=${limit}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(dados),
+            signal
+        });
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.error || 'Erro ao calcular prévia de matches');
+        }
+        return await response.json();
+    }
+
+    /**
+     * Obtém os novos matches do adotante surgidos depois do cursor `desde`
+     * @param {number} adotante_id - ID do adotante
+     * @param {number} desde - Último id já visto (sem ele, só o cursor atual)
+     * @returns {Promise} {matches, ultimo_id}
+     */
+    static async getNovosMatches(adotante_id, desde = null) {
+        try {
+            const params = new URLSearchParams();
+            if (desde != null) params.append('desde', desde);
+
+            const url = `/api/adotantes/${adotante_id}/novos-matches?${params.toString()}`;
+            const resposta = await AdotanteService.fetchCached(url, 'Erro ao buscar novos matches');
+            return resposta.data;
+        } catch (error) {
+            console.error('AdotanteService.getNovosMatches:', error);
+            throw error;
+        }
+    }
 }
 
 // Exportar para uso em módulos
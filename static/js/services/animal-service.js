@@ -5,6 +5,65 @@
  */
 
 class AnimalService {
+    // Itens por página ao percorrer as listas da API
+    static PAGE_SIZE = 200;
+
+    // Máximo de ids por consulta de resumo de tarefas (LIMITE_MAXIMO no servidor)
+    static MAX_IDS = 500;
+
+    // ==================== CACHE HTTP ====================
+
+    // Respostas guardadas por URL ({etag, data, nextCursor}); a sessionStorage
+    // mantém o cache entre as páginas da sessão
+    static CACHE_PREFIX = 'amigo-cache:';
+    static cache = new Map();
+
+    /**
+     * GET condicional: envia If-None-Match com a ETag guardada e, se o
+     * servidor responder 304, reaproveita os dados já baixados
+     * @param {string} url - URL completa (com query string)
+     * @param {string} mensagemErro - Mensagem do erro se a resposta falhar
+     * @returns {Promise} {data, nextCursor}
+     */
+    static async fetchCached(url, mensagemErro = 'Erro na requisição') {
+        const chave = AnimalService.CACHE_PREFIX + url;
+        let guardado = AnimalService.cache.get(chave);
+        if (!guardado) {
+            try {
+                guardado = JSON.parse(sessionStorage.getItem(chave));
+            } catch (e) {
+                guardado = null;
+            }
+        }
+
+        // no-store: o 304 precisa chegar aqui, e não ser resolvido pelo cache do navegador
+        const response = await fetch(url, {
+            cache: 'no-store',
+            headers: guardado ? { 'If-None-Match': guardado.etag } : {}
+        });
+        if (response.status === 304 && guardado) {
+            AnimalService.cache.set(chave, guardado);
+            return guardado;
+        }
+        if (!response.ok) throw new Error(mensagemErro);
+
+        const resultado = {
+            data: await response.json(),
+            nextCursor: response.headers.get('X-Next-Cursor')
+        };
+        const etag = response.headers.get('ETag');
+        if (etag) {
+            const entrada = { etag, ...resultado };
+            AnimalService.cache.set(chave, entrada);
+            try {
+                sessionStorage.setItem(chave, JSON.stringify(entrada));
+            } catch (e) {
+                // Cota da sessionStorage esgotada: fica só o cache em memória
+            }
+        }
+        return resultado;
+    }
+
     // ==================== BÚSQUEDA E FILTROS ====================
 
     /**
@@ -25,7 +84,7 @@ class AnimalService {
 
     /**
      * Filtra animais por múltiplos critérios
-     * @param {Object} filtros - {especie, status, saude}
+     * @param {Object} filtros - {especie, status, porte, saude}
      * @returns {Promise} Lista de animais filtrados
      */
     static async filterAnimals(filtros = {}) {
@@ -33,6 +92,7 @@ class AnimalService {
             const params = new URLSearchParams();
             if (filtros.especie) params.append('especie', filtros.especie);
             if (filtros.status) params.append('status', filtros.status);
+            if (filtros.porte) params.append('porte', filtros.porte);
             if (filtros.saude) params.append('saude', filtros.saude);
 
             const response = await fetch(`/api/animals/filter?${params.toString()}`);
@@ -47,14 +107,66 @@ class AnimalService {
     // ==================== CRUD BÁSICO ====================
 
     /**
-     * Obtém todos os animais
+     * Obtém uma página de uma lista da API (paginação por cursor)
+     * @param {string} url - Endpoint da lista (/api/animals, /api/tasks)
+     * @param {Object} opcoes - {limit, cursor, fields, incluir}
+     * @returns {Promise} {items, nextCursor} (nextCursor null na última página)
+     */
+    static async getPage(url, opcoes = {}) {
+        const params = new URLSearchParams();
+        params.append('limit', opcoes.limit || AnimalService.PAGE_SIZE);
+        if (opcoes.cursor) params.append('cursor', opcoes.cursor);
+        if (opcoes.fields) params.append('fields', [].concat(opcoes.fields).join(','));
+        if (opcoes.incluir) params.append('incluir', [].concat(opcoes.incluir).join(','));
+
+        const resposta = await AnimalService.fetchCached(`${url}?${params.toString()}`, 'Erro ao obter lista');
+        return {
+            items: resposta.data,
+            nextCursor: resposta.nextCursor
+        };
+    }
+
+    /**
+     * Percorre todas as páginas de uma lista da API
+     * @param {string} url - Endpoint da lista
+     * @param {Array|string} fields - Campos desejados (opcional, padrão: todos)
+     * @param {Array|string} incluir - Dados extras (opcional, ex.: 'tarefas')
+     * @returns {Promise} Lista completa
+     */
+    static async getAllPages(url, fields = null, incluir = null) {
+        let items = [];
+        let cursor = null;
+        do {
+            const page = await AnimalService.getPage(url, { cursor, fields, incluir });
+            items = items.concat(page.items);
+            cursor = page.nextCursor;
+        } while (cursor);
+        return items;
+    }
+
+    /**
+     * Obtém uma página de animais
+     * @param {Object} opcoes - {limit, cursor, fields}
+     * @returns {Promise} {items, nextCursor}
+     */
+    static async getAnimalsPage(opcoes = {}) {
+        try {
+            return await AnimalService.getPage('/api/animals', opcoes);
+        } catch (error) {
+            console.error('AnimalService.getAnimalsPage:', error);
+            throw error;
+        }
+    }
+
+    /**
+     * Obtém todos os animais, página a página
+     * @param {Array|string} fields - Campos desejados (opcional, padrão: todos)
+     * @param {Array|string} incluir - Dados extras (opcional, 'tarefas' traz o resumo de tarefas)
      * @returns {Promise} Lista de animais
      */
-    static async getAllAnimals() {
+    static async getAllAnimals(fields = null, incluir = null) {
         try {
-            const response = await fetch('/api/animals');
-            if (!response.ok) throw new Error('Erro ao obter animais');
-            return await response.json();
+            return await AnimalService.getAllPages('/api/animals', fields, incluir);
         } catch (error) {
             console.error('AnimalService.getAllAnimals:', error);
             throw error;
@@ -246,14 +358,13 @@ class AnimalService {
     }
 
     /**
-     * Obtém todas as tarefas
+     * Obtém todas as tarefas, página a página
+     * @param {Array|string} fields - Campos desejados (opcional, padrão: todos)
      * @returns {Promise} Lista de tarefas
      */
-    static async getAllTasks() {
+    static async getAllTasks(fields = null) {
         try {
-            const response = await fetch('/api/tasks');
-            if (!response.ok) throw new Error('Erro ao obter tarefas');
-            return await response.json();
+            return await AnimalService.getAllPages('/api/tasks', fields);
         } catch (error) {
             console.error('AnimalService.getAllTasks:', error);
             throw error;
@@ -336,9 +447,8 @@ class AnimalService {
      */
     static async getDashboardStats() {
         try {
-            const response = await fetch('/api/stats');
-            if (!response.ok) throw new Error('Erro ao obter estatísticas');
-            return await response.json();
+            const resposta = await AnimalService.fetchCached('/api/stats', 'Erro ao obter estatísticas');
+            return resposta.data;
         } catch (error) {
             console.error('AnimalService.getDashboardStats:', error);
             throw error;
@@ -360,6 +470,23 @@ class AnimalService {
             throw error;
         }
     }
+
+    /**
+     * Resume as tarefas de vários animais numa requisição só
+     * @param {Array} ids - IDs dos animais (opcional, padrão: todos)
+     * @returns {Promise} Objeto {animal_id: {count, proxima_data, atrasadas}}
+     */
+    static async getTaskSummaries(ids = null) {
+        try {
+            // Listas maiores que o limite saem mais baratas como "todos os animais"
+            const params = ids && ids.length <= AnimalService.MAX_IDS ? `?ids=${ids.join(',')}` : '';
+            const resposta = await AnimalService.fetchCached(`/api/animals/tarefas-count${params}`, 'Erro ao contar tarefas');
+            return Object.fromEntries(resposta.data.map(resumo => [resumo.animal_id, resumo]));
+        } catch (error) {
+            console.error('AnimalService.getTaskSummaries:', error);
+            throw error;
+        }
+    }
 }
 
 // Exportar para uso em módulos
@@ -0,0 +1,124 @@
+"""
+versoes.py - Contadores de versão por tabela, para ETags e GETs condicionais
+
+Triggers incrementam o contador de animais, adotantes e tarefas na mesma
+transação de cada escrita, venha ela de qualquer processo; a tabela de
+compatibilidade e o feed de novos matches são incrementados por quem grava
+neles (indice_compatibilidade, novos_matches).
+A linha 'banco' guarda um número aleatório, sorteado na criação da tabela,
+que distingue um banco recriado do zero (contadores de volta a 0).
+"""
+
+import os
+import threading
+from conexao import obter_conexao
+from eventos import registrar_ouvinte
+
+TABELAS = ('animais', 'adotantes', 'tarefas', 'compatibilidade', 'novos_matches')
+
+# Tabelas com caches em memória neste processo (ver ler_versoes)
+TABELAS_EM_CACHE = ('animais', 'adotantes', 'tarefas')
+
+# Versões vistas por último neste processo, incluindo as das escritas feitas
+# aqui (ver ler_versoes)
+_vistas = {}
+_lock = threading.Lock()
+
+
+def criar_tabela():
+    conn = obter_conexao()
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS versoes (
+                tabela TEXT PRIMARY KEY,
+                versao INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.executemany(
+            "INSERT OR IGNORE INTO versoes (tabela, versao) VALUES (?, 0)",
+            [(tabela,) for tabela in TABELAS]
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO versoes (tabela, versao) VALUES ('banco', ?)",
+            (int.from_bytes(os.urandom(6), 'big'),)
+        )
+
+
+def versionar(tabela):
+    """Cria os triggers que incrementam a versão de `tabela` a cada INSERT/UPDATE/DELETE"""
+    criar_tabela()
+    conn = obter_conexao()
+    with conn:
+        for evento, sufixo in (('INSERT', 'ai'), ('UPDATE', 'au'), ('DELETE', 'ad')):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS versao_{tabela}_{sufixo} AFTER {evento} ON {tabela} BEGIN
+                    UPDATE versoes SET versao = versao + 1 WHERE tabela = '{tabela}';
+                END
+            """)
+
+
+def incrementar(conn, tabela):
+    # Chamado dentro da transação da escrita
+    conn.execute("UPDATE versoes SET versao = versao + 1 WHERE tabela = ?", (tabela,))
+
+
+def ler_versoes():
+    """Versão atual de cada tabela (e o número do banco).
+
+    Uma versão de animais, adotantes ou tarefas diferente da última vista
+    aqui veio de outro processo, que não passou pelos eventos daqui: só os
+    caches daquela tabela são esvaziados (e o índice de candidatos, se for
+    animais). As escritas deste processo já atualizam `_vistas`.
+    """
+    cur = obter_conexao().cursor()
+    cur.execute("SELECT tabela, versao FROM versoes")
+    versoes = dict(cur.fetchall())
+
+    dados = {t: versoes.get(t) for t in ('banco', *TABELAS_EM_CACHE)}
+    with _lock:
+        mudaram = [t for t in dados if _vistas and _vistas.get(t) != dados[t]]
+        _vistas.clear()
+        _vistas.update(dados)
+
+    if mudaram:
+        from cache import limpar_caches
+        from indice_candidatos import descartar_indice
+        if 'banco' in mudaram:
+            # Banco recriado: nada do que está em memória vale
+            limpar_caches()
+        else:
+            for tabela in mudaram:
+                limpar_caches(tabela)
+        if 'banco' in mudaram or 'animais' in mudaram:
+            descartar_indice()
+    return versoes
+
+
+def _registrar_escrita_local(tabela):
+    # Depois de uma escrita deste processo (caches e índices já atualizados pelos
+    # eventos), a versão nova passa a contar como vista. Uma escrita de outro
+    # processo no mesmo intervalo fica coberta pelo TTL dos caches.
+    def registrar(acao, registro_id):
+        with _lock:
+            if not _vistas:
+                return
+        cur = obter_conexao().execute("SELECT versao FROM versoes WHERE tabela = ?", (tabela,))
+        linha = cur.fetchone()
+        if linha is not None:
+            with _lock:
+                if _vistas:
+                    _vistas[tabela] = linha[0]
+    return registrar
+
+
+for _tabela in TABELAS_EM_CACHE:
+    registrar_ouvinte(_tabela, _registrar_escrita_local(_tabela))
+
+
+def etag(tabelas, extra=None):
+    """ETag (sem aspas) das tabelas indicadas; `extra` entra no valor (ex.: a data de hoje)"""
+    versoes = ler_versoes()
+    valor = f"{versoes.get('banco', 0):x}-" + '.'.join(str(versoes.get(t, 0)) for t in tabelas)
+    if extra:
+        valor += f"-{extra}"
+    return valor
@@ -0,0 +1,45 @@
+"""
+wsgi.py - Ponto de entrada para servidores WSGI (Gunicorn, uWSGI, mod_wsgi)
+
+Importar main cria/migra as tabelas e verifica o índice de compatibilidade;
+aqui também são carregados o índice de candidatos, o pacote da prévia de
+matches e os caches de leitura.
+Com preload (ver gunicorn.conf.py) tudo isso roda uma vez no processo
+mestre, antes do fork, e os workers herdam os dados por copy-on-write.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+
+import conexao
+import versoes
+from main import app
+from animal_crud import ler_animais_registros
+from adotantes_crud import ler_adotantes_registros
+from indice_candidatos import montar_indice
+from previa_matching import obter_pacote
+
+
+def aquecer():
+    """Carrega no processo atual o que os workers vão usar em toda requisição"""
+    try:
+        # Listas lidas pelo matching (as tags já vêm decodificadas nos registros)
+        ler_animais_registros()
+        ler_animais_registros(status='Disponível')
+        ler_adotantes_registros()
+        montar_indice()
+        obter_pacote()
+        versoes.ler_versoes()
+    except Exception as e:
+        print(f"Erro ao aquecer caches: {e}")
+    finally:
+        # Nenhuma conexão SQLite pode atravessar o fork
+        conexao.fechar_pool()
+
+    # Objetos já carregados vão para a geração permanente: o coletor não
+    # os percorre mais e as páginas continuam compartilhadas entre os workers
+    gc.freeze()
+
+
+aquecer()